@@ -2,17 +2,52 @@
 This module contains the FastAPI application and its configuration.
 """
 
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-# from utils.database import engine
+from sqlalchemy.exc import SQLAlchemyError
+from utils.database import async_engine, job_engine
 # import utils.models as models
-# from app.routes import students, mentors, degrees, classrooms, courses, attendances, payments
-from utils.settings import ORIGINS
+from app.routes import students, mentors, degrees, classrooms, courses, attendances, payments, jobs, changes
+from utils.cache import cache_stats
+from utils.changes import feed as change_feed
+from utils.jobs import jobs as job_runner
+from utils.metrics import MetricsMiddleware, registry
+from utils.partitions import keep_partitions
+from utils.settings import ORIGINS, WARMUP_ON_STARTUP
+from utils.warmup import warm_up
+
+logger = logging.getLogger("app")
 
 
 # models.Base.metadata.create_all(bind=engine) 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the connection pool and the hot routes in the background, start the job
+    heartbeat, the attendance partition check and the change feed listener; on shutdown,
+    interrupt the running jobs and close the pools."""
+    logger.info("database: %s", async_engine.url.render_as_string(hide_password=True))
+    app.state.ready = not WARMUP_ON_STARTUP
+    warming = asyncio.create_task(warm_up(app, async_engine)) if WARMUP_ON_STARTUP else None
+    partitioning = asyncio.create_task(keep_partitions())
+    job_runner.start()
+    change_feed.start()
+    yield
+    if warming is not None:
+        warming.cancel()
+    partitioning.cancel()
+    await job_runner.stop()
+    await change_feed.stop()
+    await async_engine.dispose()
+    await job_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,8 +58,19 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-# Include all routes
+# Latency histograms, SQL counters and Server-Timing headers (outermost, to time everything)
+app.add_middleware(MetricsMiddleware)
 
+# Include all routes
+app.include_router(students.router)
+app.include_router(mentors.router)
+app.include_router(degrees.router)
+app.include_router(classrooms.router)
+app.include_router(courses.router)
+app.include_router(attendances.router)
+app.include_router(payments.router)
+app.include_router(jobs.router)
+app.include_router(changes.router)
 
 
 # Root endpoint to verify API connection
@@ -33,3 +79,33 @@ async def root() -> dict[str, str]:
     """Basic root endpoint to verify API connection."""
     return {"Connexion": "ok"}
 
+
+@app.get("/health/live", include_in_schema=False)
+async def live() -> dict[str, str]:
+    """The process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def ready() -> dict[str, str]:
+    """The warm-up has finished and the database answers; 503 otherwise."""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    try:
+        async with async_engine.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+    except (SQLAlchemyError, OSError):
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+
+@app.get("/cache/stats")
+async def get_cache_stats() -> dict[str, dict[str, int]]:
+    """Entries, hits, misses and evictions of each response cache."""
+    return cache_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Prometheus metrics of this process."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
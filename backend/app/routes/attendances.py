@@ -1,9 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from utils.database import get_db
-from utils.models import Attendance
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import dialect_insert, get_async_db
+from utils.serialization import RowSerializer
+from utils.export import ExportFormat, export_response, period_bounds
+from utils.changes import CREATED, feed
+from utils.crud import Crud
+from utils.models import Attendance, AttendanceWeek, Classroom, Course, CourseSession, Student
+from utils.analytics import move_attendance, record_attendances, week_range, week_start
+from utils.settings import BULK_INSERT_CHUNK_SIZE
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime, time
 class AttendanceModel(BaseModel):
     student_id: int
     course_id: int
@@ -15,61 +23,294 @@ class AttendanceResponse(BaseModel):
     course_id: int
     date: date
 
+class RollCallModel(BaseModel):
+    course_id: int
+    date: date
+    student_ids: list[int]
+    classroom_id: int | None = None
+
+class RollCallOutcome(BaseModel):
+    student_id: int
+    course_id: int
+    date: date
+    status: str
+    id: int | None = None
+
+class CourseRate(BaseModel):
+    course_id: int
+    attended: int
+    sessions: int
+    rate: float | None
+
+class StudentAttendanceRates(BaseModel):
+    student_id: int
+    attended: int
+    sessions: int
+    rate: float | None
+    courses: list[CourseRate]
+
+class CourseAttendanceRate(BaseModel):
+    course_id: int
+    sessions: int
+    attendances: int
+    students: int
+    rate: float | None
+
+class ClassroomAttendanceRate(BaseModel):
+    classroom_id: int
+    enrolled: int
+    sessions: int
+    attended: int
+    rate: float | None
+
+class WeeklyAttendanceRate(BaseModel):
+    week_start: date
+    sessions: int
+    attendances: int
+    expected: int
+    rate: float | None
+    cumulative_rate: float | None
+
 router = APIRouter(
     tags=["Attendances"]
 )
 
-db_dependency = Depends(get_db)
-
-@router.get("/attendances")
-async def get_attendances(db: Session = db_dependency) -> list[AttendanceResponse]:
-    """Get all attendances."""
-    attendances = db.query(Attendance).all()
-    if not attendances:
-        raise HTTPException(status_code=404, detail="No attendances found")
-    return attendances
-
-@router.get("/attendances/{attendance_id}")
-async def get_attendance(attendance_id: int, db: Session = db_dependency) -> AttendanceResponse:
-    """Get an attendance by ID."""
-    attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
-    if not attendance:
-        raise HTTPException(status_code=404, detail="Attendance not found")
-    return attendance
-
-@router.post("/attendances")
-async def create_attendance(attendance: AttendanceModel, db: Session = db_dependency) -> AttendanceResponse:
-    """Create a new attendance."""
-    db_attendance = Attendance(
-        student_id=attendance.student_id,
-        course_id=attendance.course_id,
-        date=attendance.date
+db_dependency = Depends(get_async_db)
+attendance_rows = RowSerializer(AttendanceResponse, Attendance)
+
+class AttendanceCrud(Crud):
+    """Attendances are counted in the weekly and per-session summaries."""
+
+    tracked = ("student_id", "course_id", "date")
+    conflict = "Attendance already recorded"
+
+    async def created(self, db: AsyncSession, attendance) -> None:
+        await record_attendances(db, [(attendance.student_id, attendance.course_id, attendance.date)])
+
+    async def updated(self, db: AsyncSession, attendance, old: dict) -> None:
+        await move_attendance(db, (old["student_id"], old["course_id"], old["date"]), (attendance.student_id, attendance.course_id, attendance.date))
+
+    async def deleted(self, db: AsyncSession, attendance) -> None:
+        await record_attendances(db, [(attendance.student_id, attendance.course_id, attendance.date)], -1)
+
+attendances = AttendanceCrud(Attendance, AttendanceModel, AttendanceResponse, "/attendances", keys=(Attendance.date, Attendance.id), rows=attendance_rows)
+
+def _rate(attended, expected) -> float | None:
+    return round(attended / expected, 4) if expected else None
+
+def _in_weeks(query, week, first: int | None, last: int | None):
+    if first is not None:
+        query = query.where(week >= first)
+    if last is not None:
+        query = query.where(week <= last)
+    return query
+
+def _held_sessions(first: int | None, last: int | None):
+    """Sessions held per course in the period: days with at least one attendee."""
+    query = select(CourseSession.course_id, func.count().label("sessions"), func.sum(CourseSession.attendees).label("attendances")).where(CourseSession.attendees > 0)
+    return _in_weeks(query, CourseSession.week, first, last).group_by(CourseSession.course_id)
+
+def _degree_sizes():
+    """Students per degree, from the classroom occupancy counters."""
+    return select(Classroom.degree_id, func.sum(Classroom.enrolled).label("students")).group_by(Classroom.degree_id).subquery()
+
+def export_row(row: tuple) -> tuple:
+    """Exported attendances carry dates, like AttendanceResponse."""
+    attendance_id, student_id, course_id, attendance_date = row
+    return attendance_id, student_id, course_id, attendance_date.date() if attendance_date else None
+
+@router.get("/attendances/export")
+async def export_attendances(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    start: date | None = None,
+    end: date | None = None,
+    quarter: str | None = None,
+    mentor_id: int | None = None,
+    course_id: int | None = None,
+) -> StreamingResponse:
+    """Stream attendances as CSV or NDJSON, filtered by date range, quarter (YYYY-Qn), mentor or course."""
+    return export_response(attendances_export_query(start, end, quarter, mentor_id, course_id), EXPORT_COLUMNS, export_format, "attendances", export_row)
+
+EXPORT_COLUMNS = ["id", "student_id", "course_id", "date"]
+
+def attendances_export_query(start: date | None, end: date | None, quarter: str | None, mentor_id: int | None, course_id: int | None) -> Select:
+    """Attendances exported by ``/attendances/export`` and the attendance export job, in date order."""
+    query = select(Attendance.id, Attendance.student_id, Attendance.course_id, Attendance.date)
+    start_at, end_before = period_bounds(start, end, quarter)
+    if start_at is not None:
+        query = query.where(Attendance.date >= start_at)
+    if end_before is not None:
+        query = query.where(Attendance.date < end_before)
+    if mentor_id is not None:
+        query = query.join(Student, Student.id == Attendance.student_id).where(Student.mentor_id == mentor_id)
+    if course_id is not None:
+        query = query.where(Attendance.course_id == course_id)
+    return query.order_by(Attendance.date, Attendance.id)
+
+@router.get("/attendances/rates/students/{student_id}")
+async def get_student_attendance_rates(student_id: int, start: date | None = None, end: date | None = None, quarter: str | None = None, db: AsyncSession = db_dependency) -> StudentAttendanceRates:
+    """Attendance rate of a student, overall and per course of their degree, over whole weeks."""
+    student = (await db.scalars(select(Student).where(Student.id == student_id))).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    first, last = week_range(*period_bounds(start, end, quarter))
+    attended = select(AttendanceWeek.course_id, func.sum(AttendanceWeek.attended).label("attended")).where(AttendanceWeek.student_id == student_id)
+    attended = _in_weeks(attended, AttendanceWeek.week, first, last).group_by(AttendanceWeek.course_id).subquery()
+    sessions = _in_weeks(
+        select(func.count()).where(CourseSession.course_id == Course.id, CourseSession.attendees > 0),
+        CourseSession.week, first, last,
+    ).scalar_subquery()
+    query = (
+        select(Course.id, func.coalesce(attended.c.attended, 0), sessions)
+        .outerjoin(attended, attended.c.course_id == Course.id)
+        .where(or_(Course.degree_id == student.degree_id, attended.c.course_id.is_not(None)))
+        .order_by(Course.id)
+    )
+    courses = [
+        {"course_id": course_id, "attended": course_attended, "sessions": course_sessions, "rate": _rate(course_attended, course_sessions)}
+        for course_id, course_attended, course_sessions in (await db.execute(query)).all()
+    ]
+    total_attended = sum(course["attended"] for course in courses)
+    total_sessions = sum(course["sessions"] for course in courses)
+    return {"student_id": student_id, "attended": total_attended, "sessions": total_sessions, "rate": _rate(total_attended, total_sessions), "courses": courses}
+
+@router.get("/attendances/rates/courses")
+async def get_course_attendance_rates(degree_id: int | None = None, start: date | None = None, end: date | None = None, quarter: str | None = None, db: AsyncSession = db_dependency) -> list[CourseAttendanceRate]:
+    """Attendance rate per course: attendances over sessions held times students of its degree."""
+    first, last = week_range(*period_bounds(start, end, quarter))
+    held = _held_sessions(first, last).subquery()
+    sizes = _degree_sizes()
+    query = (
+        select(Course.id, func.coalesce(held.c.sessions, 0), func.coalesce(held.c.attendances, 0), func.coalesce(sizes.c.students, 0))
+        .outerjoin(held, held.c.course_id == Course.id)
+        .outerjoin(sizes, sizes.c.degree_id == Course.degree_id)
+        .order_by(Course.id)
+    )
+    if degree_id is not None:
+        query = query.where(Course.degree_id == degree_id)
+    return [
+        {"course_id": course_id, "sessions": sessions, "attendances": attendances, "students": students, "rate": _rate(attendances, sessions * students)}
+        for course_id, sessions, attendances, students in (await db.execute(query)).all()
+    ]
+
+@router.get("/attendances/rates/classrooms")
+async def get_classroom_attendance_rates(degree_id: int | None = None, start: date | None = None, end: date | None = None, quarter: str | None = None, db: AsyncSession = db_dependency) -> list[ClassroomAttendanceRate]:
+    """Attendance rate per classroom: its students' attendances over enrolled students times sessions of its degree's courses."""
+    first, last = week_range(*period_bounds(start, end, quarter))
+    attended = select(Student.classroom_id, func.sum(AttendanceWeek.attended).label("attended")).join(AttendanceWeek, AttendanceWeek.student_id == Student.id)
+    if degree_id is not None:
+        attended = attended.where(Student.classroom_id.in_(select(Classroom.id).where(Classroom.degree_id == degree_id)))
+    attended = _in_weeks(attended, AttendanceWeek.week, first, last).group_by(Student.classroom_id).subquery()
+    held = _held_sessions(first, last).subquery()
+    degree_sessions = select(Course.degree_id, func.sum(held.c.sessions).label("sessions")).join(held, held.c.course_id == Course.id).group_by(Course.degree_id).subquery()
+    query = (
+        select(Classroom.id, Classroom.enrolled, func.coalesce(degree_sessions.c.sessions, 0), func.coalesce(attended.c.attended, 0))
+        .outerjoin(degree_sessions, degree_sessions.c.degree_id == Classroom.degree_id)
+        .outerjoin(attended, attended.c.classroom_id == Classroom.id)
+        .order_by(Classroom.id)
+    )
+    if degree_id is not None:
+        query = query.where(Classroom.degree_id == degree_id)
+    return [
+        {"classroom_id": classroom_id, "enrolled": enrolled, "sessions": sessions, "attended": classroom_attended, "rate": _rate(classroom_attended, enrolled * sessions)}
+        for classroom_id, enrolled, sessions, classroom_attended in (await db.execute(query)).all()
+    ]
+
+@router.get("/attendances/rates/weeks")
+async def get_weekly_attendance_rates(course_id: int | None = None, degree_id: int | None = None, start: date | None = None, end: date | None = None, quarter: str | None = None, db: AsyncSession = db_dependency) -> list[WeeklyAttendanceRate]:
+    """Attendance rate per week, with the running rate since the first week of the period."""
+    first, last = week_range(*period_bounds(start, end, quarter))
+    sizes = _degree_sizes()
+    weekly = (
+        select(
+            CourseSession.week,
+            func.count().label("sessions"),
+            func.sum(CourseSession.attendees).label("attendances"),
+            func.sum(func.coalesce(sizes.c.students, 0)).label("expected"),
+        )
+        .join(Course, Course.id == CourseSession.course_id)
+        .outerjoin(sizes, sizes.c.degree_id == Course.degree_id)
+        .where(CourseSession.attendees > 0)
     )
-    db.add(db_attendance)
-    db.commit()
-    db.refresh(db_attendance)
-    return db_attendance
-
-@router.put("/attendances/{attendance_id}")
-async def update_attendance(attendance_id: int, attendance: AttendanceModel, db: Session = db_dependency) -> AttendanceResponse:
-    """Update an attendance by ID."""
-    db_attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
-    if not db_attendance:
-        raise HTTPException(status_code=404, detail="Attendance not found")
-    db_attendance.student_id = attendance.student_id
-    db_attendance.course_id = attendance.course_id
-    db_attendance.date = attendance.date
-    db.commit()
-    db.refresh(db_attendance)
-    return db_attendance
-
-@router.delete("/attendances/{attendance_id}")
-async def delete_attendance(attendance_id: int, db: Session = db_dependency) -> AttendanceResponse:
-    """Delete an attendance by ID."""
-    db_attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
-    if not db_attendance:
-        raise HTTPException(status_code=404, detail="Attendance not found")
-    db.delete(db_attendance)
-    db.commit()
-    return db_attendance
+    if course_id is not None:
+        weekly = weekly.where(CourseSession.course_id == course_id)
+    if degree_id is not None:
+        weekly = weekly.where(Course.degree_id == degree_id)
+    weekly = _in_weeks(weekly, CourseSession.week, first, last).group_by(CourseSession.week).subquery()
+    query = select(
+        weekly.c.week,
+        weekly.c.sessions,
+        weekly.c.attendances,
+        weekly.c.expected,
+        func.sum(weekly.c.attendances).over(order_by=weekly.c.week),
+        func.sum(weekly.c.expected).over(order_by=weekly.c.week),
+    ).order_by(weekly.c.week)
+    return [
+        {
+            "week_start": week_start(week),
+            "sessions": sessions,
+            "attendances": attendances,
+            "expected": expected,
+            "rate": _rate(attendances, expected),
+            "cumulative_rate": _rate(cumulative_attendances, cumulative_expected),
+        }
+        for week, sessions, attendances, expected, cumulative_attendances, cumulative_expected in (await db.execute(query)).all()
+    ]
+
+@router.post("/attendances/bulk")
+async def create_attendances_bulk(roll_calls: list[RollCallModel], db: AsyncSession = db_dependency) -> list[RollCallOutcome]:
+    """Record one or more roll calls in a single transaction.
+
+    Each row comes back, in request order, with a status: ``created``, ``duplicate``
+    (already recorded, or repeated in the request), ``unknown_student``,
+    ``unknown_course`` or ``not_in_classroom`` (when the roll call names a classroom).
+    """
+    student_ids = {student_id for roll_call in roll_calls for student_id in roll_call.student_ids}
+    course_ids = {roll_call.course_id for roll_call in roll_calls}
+    classrooms = dict((await db.execute(select(Student.id, Student.classroom_id).where(Student.id.in_(student_ids)))).all()) if student_ids else {}
+    known_courses = set((await db.scalars(select(Course.id).where(Course.id.in_(course_ids)))).all()) if course_ids else set()
+
+    outcomes = []
+    pending = {}
+    for roll_call in roll_calls:
+        for student_id in roll_call.student_ids:
+            outcome = RollCallOutcome(student_id=student_id, course_id=roll_call.course_id, date=roll_call.date, status="created")
+            key = (student_id, roll_call.course_id, roll_call.date)
+            if student_id not in classrooms:
+                outcome.status = "unknown_student"
+            elif roll_call.course_id not in known_courses:
+                outcome.status = "unknown_course"
+            elif roll_call.classroom_id is not None and classrooms[student_id] != roll_call.classroom_id:
+                outcome.status = "not_in_classroom"
+            elif key in pending:
+                outcome.status = "duplicate"
+            else:
+                pending[key] = outcome
+            outcomes.append(outcome)
+
+    rows = [
+        {"student_id": student_id, "course_id": course_id, "date": datetime.combine(day, time.min)}
+        for student_id, course_id, day in pending
+    ]
+    created, inserted = [], []
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        statement = (
+            dialect_insert(db, Attendance)
+            .values(rows[start:start + BULK_INSERT_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=["student_id", "course_id", "date"])
+            .returning(Attendance.id, Attendance.student_id, Attendance.course_id, Attendance.date)
+        )
+        for row in (await db.execute(statement)).all():
+            attendance_id, student_id, course_id, attendance_date = row
+            pending.pop((student_id, course_id, attendance_date.date())).id = attendance_id
+            created.append((student_id, course_id, attendance_date))
+            inserted.append(row)
+    await record_attendances(db, created)
+    await feed.emit(db, attendances.plural, CREATED, attendance_rows.items(inserted))
+    await db.commit()
+
+    for outcome in pending.values():
+        outcome.status = "duplicate"
+    return outcomes
 
+attendances.register(router)
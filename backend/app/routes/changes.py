@@ -0,0 +1,96 @@
+import asyncio
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from utils.changes import Subscription, feed
+from utils.settings import CHANGE_FEED_KEEPALIVE_SECONDS
+
+router = APIRouter(
+    tags=["Changes"]
+)
+
+# Resources whose writes emit events (paths of their routers)
+RESOURCES = ("students", "mentors", "degrees", "classrooms", "courses", "attendances", "payments")
+
+RESOURCE_QUERY = Query(None, description="resources to follow (repeat the parameter for several), all by default")
+AFTER_QUERY = Query(None, description="sequence number of the last event received, to get the events since")
+
+def resource_filter(resources: list[str] | None) -> set[str] | None:
+    unknown = sorted(set(resources or ()) - set(RESOURCES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown resources: {', '.join(unknown)}")
+    return set(resources) if resources else None
+
+async def event_stream(resources: set[str] | None, classroom_id: int | None, course_id: int | None, after: int | None):
+    # Subscribed once streaming starts, so that the finally block always unsubscribes
+    subscription = feed.subscribe(resources, classroom_id, course_id, after)
+    try:
+        while True:
+            changes = await subscription.next(CHANGE_FEED_KEEPALIVE_SECONDS)
+            if not changes:
+                yield b": keep-alive\n\n"
+                continue
+            yield b"".join(b"id: %d\ndata: %s\n\n" % (change.seq, change.body) for change in changes)
+    finally:
+        feed.unsubscribe(subscription)
+
+@router.get("/changes", response_class=StreamingResponse)
+async def stream_changes(
+    resource: list[str] | None = RESOURCE_QUERY,
+    classroom_id: int | None = None,
+    course_id: int | None = None,
+    after: int | None = AFTER_QUERY,
+    last_event_id: int | None = Header(None),
+) -> StreamingResponse:
+    """Server-sent events of the creates, updates and deletes, filtered by resource, classroom or course.
+
+    Each event carries its sequence number as its id, so a reconnecting ``EventSource``
+    resumes where it stopped (``Last-Event-ID``); ``after`` does the same for other
+    clients. A ``reset`` event means some events could not be replayed: reload, then
+    carry on.
+    """
+    resources = resource_filter(resource)
+    return StreamingResponse(
+        event_stream(resources, classroom_id, course_id, after if after is not None else last_event_id),
+        media_type="text/event-stream",
+        # Sent as they come, not held by a proxy's buffer
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def disconnected(websocket: WebSocket) -> None:
+    """Wait for the client to go away; what it sends is ignored."""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+async def send_changes(websocket: WebSocket, subscription: Subscription) -> None:
+    while True:
+        for change in await subscription.next(CHANGE_FEED_KEEPALIVE_SECONDS):
+            # Waits while the client reads slowly: its events wait in the subscription meanwhile
+            await websocket.send_text(change.body.decode())
+
+@router.websocket("/changes/ws")
+async def changes_websocket(
+    websocket: WebSocket,
+    resource: list[str] | None = RESOURCE_QUERY,
+    classroom_id: int | None = None,
+    course_id: int | None = None,
+    after: int | None = AFTER_QUERY,
+) -> None:
+    """The events of ``GET /changes`` as WebSocket text messages, one JSON event per message."""
+    try:
+        resources = resource_filter(resource)
+    except HTTPException as error:
+        await websocket.close(code=1008, reason=error.detail)
+        return
+    await websocket.accept()
+    subscription = feed.subscribe(resources, classroom_id, course_id, after)
+    tasks = [asyncio.ensure_future(disconnected(websocket)), asyncio.ensure_future(send_changes(websocket, subscription))]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        feed.unsubscribe(subscription)
+        for task in tasks:
+            task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        # Reading from or sending to a closed connection fails: the client left
+        if isinstance(result, Exception) and not isinstance(result, (WebSocketDisconnect, RuntimeError, OSError)):
+            raise result
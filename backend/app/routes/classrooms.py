@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from utils.database import get_db
-from utils.models import Classroom, Student
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_async_db
+from utils.cache import ResponseCache
+from utils.crud import Crud
+from utils.models import Classroom
+from app.routes.degrees import DegreeResponse
 from pydantic import BaseModel
 
 class ClassroomModel(BaseModel):
@@ -19,75 +23,55 @@ class ClassroomResponse(BaseModel):
     day: str
     time_slot: str
 
+class ClassroomDetails(ClassroomResponse):
+    degree: DegreeResponse | None = None
+
+class ClassroomAvailability(BaseModel):
+    id: int
+    name: str
+    degree_id: int
+    day: str
+    time_slot: str
+    capacity: int
+    enrolled: int
+    available: int
+
 router = APIRouter(
     tags=["Classrooms"]
 )
 
-db_dependency = Depends(get_db)
+db_dependency = Depends(get_async_db)
+classrooms_cache = ResponseCache("classrooms", related=("degrees",))
+classrooms = Crud(Classroom, ClassroomModel, ClassroomResponse, "/classrooms", details=ClassroomDetails, includes=("degree",), cache=classrooms_cache)
+places_query = select(Classroom.capacity - Classroom.enrolled).where(Classroom.id == bindparam("classroom_id"))
 
-@router.get("/classrooms")
-async def get_classrooms(db: Session = db_dependency) -> list[ClassroomResponse]:
-    """Get all classrooms."""
-    classrooms = db.query(Classroom).all()
-    if not classrooms:
-        raise HTTPException(status_code=404, detail="No classrooms found")
-    return classrooms
-
-@router.get("/classrooms/{classroom_id}")
-async def get_classroom(classroom_id: int, db: Session = db_dependency) -> ClassroomResponse:
-    """Get a classroom by ID."""
-    classroom = db.query(Classroom).filter(Classroom.id == classroom_id).first()
-    if not classroom:
-        raise HTTPException(status_code=404, detail="Classroom not found")
-    return classroom
-
-@router.post("/classrooms")
-async def create_classroom(classroom: ClassroomModel, db: Session = db_dependency) -> ClassroomResponse:
-    """Create a new classroom."""
-    db_classroom = Classroom(
-        name=classroom.name,
-        degree_id=classroom.degree_id,
-        capacity=classroom.capacity,
-        day=classroom.day,
-        time_slot=classroom.time_slot
+@router.get("/classrooms/availability")
+async def get_classrooms_availability(day: str | None = None, time_slot: str | None = None, degree_id: int | None = None, db: AsyncSession = db_dependency) -> list[ClassroomAvailability]:
+    """Get capacity, enrolled and available places for every classroom."""
+    query = select(
+        Classroom.id,
+        Classroom.name,
+        Classroom.degree_id,
+        Classroom.day,
+        Classroom.time_slot,
+        Classroom.capacity,
+        Classroom.enrolled,
+        (Classroom.capacity - Classroom.enrolled).label("available"),
     )
-    db.add(db_classroom)
-    db.commit()
-    db.refresh(db_classroom)
-    return db_classroom
-
-@router.put("/classrooms/{classroom_id}")
-async def update_classroom(classroom_id: int, classroom: ClassroomModel, db: Session = db_dependency) -> ClassroomResponse:
-    """Update a classroom by ID."""
-    db_classroom = db.query(Classroom).filter(Classroom.id == classroom_id).first()
-    if not db_classroom:
-        raise HTTPException(status_code=404, detail="Classroom not found")
-    db_classroom.name = classroom.name
-    db_classroom.degree_id = classroom.degree_id
-    db_classroom.capacity = classroom.capacity
-    db_classroom.day = classroom.day
-    db_classroom.time_slot = classroom.time_slot
-    db.commit()
-    db.refresh(db_classroom)
-    return db_classroom
-
-@router.delete("/classrooms/{classroom_id}")
-async def delete_classroom(classroom_id: int, db: Session = db_dependency) -> ClassroomResponse:
-    """Delete a classroom by ID."""
-    db_classroom = db.query(Classroom).filter(Classroom.id == classroom_id).first()
-    if not db_classroom:
-        raise HTTPException(status_code=404, detail="Classroom not found")
-    db.delete(db_classroom)
-    db.commit()
-    return db_classroom
+    if day is not None:
+        query = query.where(Classroom.day == day)
+    if time_slot is not None:
+        query = query.where(Classroom.time_slot == time_slot)
+    if degree_id is not None:
+        query = query.where(Classroom.degree_id == degree_id)
+    return (await db.execute(query.order_by(Classroom.id))).mappings().all()
 
 @router.get("/classrooms/{classroom_id}/places")
-async def get_places_available_in_classroom(classroom_id: int, db: Session = db_dependency) -> int:
+async def get_places_available_in_classroom(classroom_id: int, db: AsyncSession = db_dependency) -> int:
     """Get the number of places available in a classroom."""
-    classroom = db.query(Classroom).filter(Classroom.id == classroom_id).first()
-    if not classroom:
+    places = (await db.scalars(places_query, {"classroom_id": classroom_id})).first()
+    if places is None:
         raise HTTPException(status_code=404, detail="Classroom not found")
-    students = db.query(Student).filter(Student.classroom_id== classroom_id).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this classroom")
-    return classroom.capacity - len(students)
\ No newline at end of file
+    return places
+
+classrooms.register(router)
@@ -0,0 +1,221 @@
+import os
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.routes import attendances, payments
+from app.routes.classrooms import classrooms_cache
+from app.routes.mentors import mentor_import
+from app.routes.students import student_import
+from utils.analytics import rebuild_summaries
+from utils.crud import db_dependency, page_dependency
+from utils.export import MEDIA_TYPES, ExportFormat, stream_rows
+from utils.imports import CSV_BODY
+from utils.jobs import SUCCEEDED, JobContext, get_job, jobs
+from utils.models import Job
+from utils.occupancy import recount_enrolled
+from utils.pagination import Page, PageParams, paginate
+from utils.rollups import rebuild_rollups
+from utils.settings import JOB_RESULTS_DIR, JOB_UPLOAD_MAX_BYTES
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    params: dict[str, Any]
+    done: int
+    total: int | None = None
+    result: Any = None
+    result_name: str | None = None
+    error: str | None = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+router = APIRouter(
+    tags=["Jobs"]
+)
+
+IMPORTS = {"students": student_import, "mentors": mentor_import}
+
+# Bytes of an uploaded CSV read at a time by the import jobs
+READ_SIZE = 1 << 16
+
+# Job kinds
+
+async def export_job(job: JobContext, query, columns: list[str], export_format: str, name: str, convert=None) -> dict:
+    """Write ``query`` to the job's result file, reporting rows exported out of the total."""
+    export_format = ExportFormat(export_format)
+    async with job.session() as db:
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    await job.progress(0, total)
+    path = job.result_file(f"{name}.{export_format.value}", MEDIA_TYPES[export_format])
+    with open(path, "w", newline="") as file:
+        async for text in stream_rows(query, columns, export_format, convert, sessions=job.session, progress=lambda done: job.progress(done, total)):
+            file.write(text)
+    return {"rows": total}
+
+@jobs.kind("export_payments")
+async def export_payments_job(job: JobContext, export_format: str, start: str | None, end: str | None, quarter: str | None, mentor_id: int | None) -> dict:
+    query = payments.payments_export_query(_day(start), _day(end), quarter, mentor_id)
+    return await export_job(job, query, payments.EXPORT_COLUMNS, export_format, "payments")
+
+@jobs.kind("export_attendances")
+async def export_attendances_job(job: JobContext, export_format: str, start: str | None, end: str | None, quarter: str | None, mentor_id: int | None, course_id: int | None) -> dict:
+    query = attendances.attendances_export_query(_day(start), _day(end), quarter, mentor_id, course_id)
+    return await export_job(job, query, attendances.EXPORT_COLUMNS, export_format, "attendances", attendances.export_row)
+
+@jobs.kind("rebuild_reports")
+async def rebuild_reports_job(job: JobContext) -> dict:
+    """Rebuild the payment rollups, the attendance summaries and the classroom counters in one transaction."""
+    steps = (("payment_rollups", rebuild_rollups), ("attendance_summaries", rebuild_summaries), ("classroom_enrolled", recount_enrolled))
+    async with job.session() as db:
+        for done, (_, rebuild) in enumerate(steps):
+            # On SQLite, the transaction holds the write lock after the first step: the
+            # progress would wait for it until the busy timeout
+            if done == 0 or db.bind.dialect.name == "postgresql":
+                await job.progress(done, len(steps))
+            await rebuild(db)
+        await db.commit()
+    classrooms_cache.invalidate()
+    return {"rebuilt": [name for name, _ in steps]}
+
+def upload_path(upload_id: str) -> str:
+    """Where the CSV of an import job waits; only its id is stored with the job."""
+    return os.path.join(JOB_RESULTS_DIR, f"upload-{upload_id}.csv")
+
+@jobs.kind("import")
+async def import_job(job: JobContext, resource: str, upload_id: str) -> dict:
+    """Import the uploaded CSV, reporting bytes read out of the file size."""
+    upload = upload_path(upload_id)
+    total = os.path.getsize(upload)
+
+    async def read():
+        done = 0
+        file = await run_in_threadpool(open, upload, "rb")
+        try:
+            while chunk := await run_in_threadpool(file.read, READ_SIZE):
+                done += len(chunk)
+                await job.progress(done, total)
+                yield chunk
+        finally:
+            file.close()
+
+    try:
+        async with job.session() as db:
+            report = await IMPORTS[resource].run(db, read())
+    finally:
+        os.remove(upload)
+    return report.model_dump()
+
+def _day(value: str | None) -> date | None:
+    # Job parameters are stored as JSON
+    return date.fromisoformat(value) if value is not None else None
+
+# Submission
+
+@router.post("/jobs/exports/payments", status_code=202)
+async def submit_payments_export(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    start: date | None = None,
+    end: date | None = None,
+    quarter: str | None = None,
+    mentor_id: int | None = None,
+    db: AsyncSession = db_dependency,
+) -> JobResponse:
+    """Export payments in the background, with the filters of ``GET /payments/export``."""
+    params = {"export_format": export_format.value, "start": _iso(start), "end": _iso(end), "quarter": quarter, "mentor_id": mentor_id}
+    return await jobs.submit(db, "export_payments", params)
+
+@router.post("/jobs/exports/attendances", status_code=202)
+async def submit_attendances_export(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    start: date | None = None,
+    end: date | None = None,
+    quarter: str | None = None,
+    mentor_id: int | None = None,
+    course_id: int | None = None,
+    db: AsyncSession = db_dependency,
+) -> JobResponse:
+    """Export attendances in the background, with the filters of ``GET /attendances/export``."""
+    # Build the query once here so that an invalid quarter is rejected before the job starts
+    attendances.attendances_export_query(start, end, quarter, mentor_id, course_id)
+    params = {"export_format": export_format.value, "start": _iso(start), "end": _iso(end), "quarter": quarter, "mentor_id": mentor_id, "course_id": course_id}
+    return await jobs.submit(db, "export_attendances", params)
+
+@router.post("/jobs/reports/rebuild", status_code=202)
+async def submit_reports_rebuild(db: AsyncSession = db_dependency) -> JobResponse:
+    """Rebuild the payment rollups, attendance summaries and classroom counters from the base tables."""
+    return await jobs.submit(db, "rebuild_reports")
+
+@router.post("/jobs/imports/{resource}", status_code=202, openapi_extra=CSV_BODY)
+async def submit_import(resource: str, request: Request, db: AsyncSession = db_dependency) -> JobResponse:
+    """Import students or mentors from a CSV upload in the background, as ``POST /{resource}/import`` does."""
+    if resource not in IMPORTS:
+        raise HTTPException(status_code=404, detail=f"No import for {resource}")
+    too_large = HTTPException(status_code=413, detail=f"Uploads are limited to {JOB_UPLOAD_MAX_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > JOB_UPLOAD_MAX_BYTES:
+        raise too_large
+    os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    upload = upload_path(upload_id)
+    # Written off the event loop, which keeps serving requests meanwhile
+    file = await run_in_threadpool(open, upload, "wb")
+    try:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > JOB_UPLOAD_MAX_BYTES:
+                raise too_large
+            await run_in_threadpool(file.write, chunk)
+    except BaseException:
+        file.close()
+        os.remove(upload)
+        raise
+    file.close()
+    return await jobs.submit(db, "import", {"resource": resource, "upload_id": upload_id})
+
+def _iso(value: date | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+# Follow-up
+
+@router.get("/jobs")
+async def get_jobs(status: str | None = None, kind: str | None = None, page: PageParams = page_dependency, db: AsyncSession = db_dependency) -> Page[JobResponse]:
+    """Jobs in submission order, optionally of one status or kind."""
+    query = select(Job)
+    if status is not None:
+        query = query.where(Job.status == status)
+    if kind is not None:
+        query = query.where(Job.kind == kind)
+    return await paginate(db, query, page, (Job.id,))
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: int, db: AsyncSession = db_dependency) -> JobResponse:
+    """Status and progress (``done`` out of ``total``) of a job."""
+    return await get_job(db, job_id)
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: int, db: AsyncSession = db_dependency) -> Response:
+    """Download the file a job produced, or its JSON result; 409 until it has succeeded."""
+    job = await get_job(db, job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if job.media_type is None:
+        return JSONResponse(job.result)
+    if job.result_file is None or not os.path.exists(job.result_file):
+        raise HTTPException(status_code=410, detail="Job result expired")
+    return FileResponse(job.result_file, media_type=job.media_type, filename=job.result_name)
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int, db: AsyncSession = db_dependency) -> JobResponse:
+    """Cancel a queued or running job; 409 once it has finished."""
+    return await jobs.cancel(db, job_id)
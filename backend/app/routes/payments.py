@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from utils.database import get_db
-from utils.models import Payment
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_async_db
+from utils.pagination import Page, PageParams, paginate
+from utils.serialization import RowSerializer
+from utils.export import ExportFormat, export_response, period_bounds
+from utils.crud import Crud
+from utils.models import Payment, PaymentRollup, StudentPaymentBalance
+from utils.rollups import ROLLUP_COLUMNS, apply_payment, move_payment, payment_values, quarter_of
+from utils.settings import OUTSTANDING_PAYMENT_STATES
+from app.routes.mentors import MentorResponse
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+from enum import Enum
 
 class PaymentModel(BaseModel):
     amount: float
     date: datetime = datetime.now()
     mentor_id: int  
+    method: str | None = None
+    state: str | None = None
+    student_id: int | None = None
 
 class PaymentResponse(BaseModel):
     id: int
@@ -16,78 +29,147 @@ class PaymentResponse(BaseModel):
     date: datetime 
     mentor_id: int
 
+class PaymentDetails(PaymentResponse):
+    mentor: MentorResponse | None = None
+
+class PaymentDimension(str, Enum):
+    quarter = "quarter"
+    mentor = "mentor"
+    method = "method"
+    state = "state"
+
+class PaymentTotals(BaseModel):
+    quarter: str | None = None
+    mentor_id: int | None = None
+    method: str | None = None
+    state: str | None = None
+    total_amount: float
+    payment_count: int
+
+class StudentOutstanding(BaseModel):
+    student_id: int
+    outstanding_amount: float
+    payment_count: int
+
+# Rollup column behind each dimension, and the value it stores for "unknown"
+DIMENSIONS = {
+    PaymentDimension.quarter: (PaymentRollup.quarter, ""),
+    PaymentDimension.mentor: (PaymentRollup.mentor_id, 0),
+    PaymentDimension.method: (PaymentRollup.method, ""),
+    PaymentDimension.state: (PaymentRollup.state, ""),
+}
+
 router = APIRouter(
     tags=["Payments"]
 )
 
-db_dependency = Depends(get_db)
-
-@router.get("/payments")
-async def get_payments(db: Session = db_dependency) -> list[PaymentResponse]:
-    """Get all payments."""
-    payments = db.query(Payment).all()
-    if not payments:
-        raise HTTPException(status_code=404, detail="No payments found")
-    return payments
-
-@router.get("/payments/{payment_id}")
-async def get_payment(payment_id: int, db: Session = db_dependency) -> PaymentResponse:
-    """Get a payment by ID."""
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    return payment
-
-@router.post("/payments/{mentor_id}")
-async def create_payment(payment: PaymentModel, db: Session = db_dependency) -> PaymentResponse:
-    """Create a new payment."""
-    db_payment = Payment(
-        amount=payment.amount,
-        date=payment.date,
-        user_id=payment.mentor_id
+db_dependency = Depends(get_async_db)
+page_dependency = Depends(PageParams)
+payment_rows = RowSerializer(PaymentResponse, Payment)
+
+class PaymentCrud(Crud):
+    """Payments are counted in the rollups, under the quarter of their date."""
+
+    tracked = ROLLUP_COLUMNS
+
+    def prepare(self, values: dict) -> dict:
+        if "date" in values:
+            values["quarter"] = quarter_of(values["date"])
+        return values
+
+    def put_values(self, payment: PaymentModel) -> dict:
+        # Optional fields left out of the body keep their stored value
+        return payment.model_dump(include={"amount", "date", "mentor_id"} | payment.model_fields_set)
+
+    async def created(self, db: AsyncSession, payment) -> None:
+        await apply_payment(db, payment_values(payment), 1)
+
+    async def updated(self, db: AsyncSession, payment, old: dict) -> None:
+        await move_payment(db, old, payment_values(payment))
+
+    async def deleted(self, db: AsyncSession, payment) -> None:
+        await apply_payment(db, payment_values(payment), -1)
+
+# Paged on id alone: payments.date is nullable, and a row-value seek past a date never
+# reaches the rows without one
+payments = PaymentCrud(Payment, PaymentModel, PaymentResponse, "/payments", details=PaymentDetails, includes=("mentor",), rows=payment_rows, create_path="/payments/{mentor_id}")
+include_dependency = payments.include_dependency
+
+@router.get("/payments/export")
+async def export_payments(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    start: date | None = None,
+    end: date | None = None,
+    quarter: str | None = None,
+    mentor_id: int | None = None,
+) -> StreamingResponse:
+    """Stream payments as CSV or NDJSON, filtered by date range, quarter or mentor."""
+    return export_response(payments_export_query(start, end, quarter, mentor_id), EXPORT_COLUMNS, export_format, "payments")
+
+EXPORT_COLUMNS = ["id", "amount", "date", "method", "state", "quarter", "mentor_id", "student_id"]
+
+def payments_export_query(start: date | None, end: date | None, quarter: str | None, mentor_id: int | None) -> Select:
+    """Payments exported by ``/payments/export`` and the payment export job, in date order."""
+    query = select(Payment.id, Payment.amount, Payment.date, Payment.method, Payment.state, Payment.quarter, Payment.mentor_id, Payment.student_id)
+    start_at, end_before = period_bounds(start, end)
+    if start_at is not None:
+        query = query.where(Payment.date >= start_at)
+    if end_before is not None:
+        query = query.where(Payment.date < end_before)
+    if quarter is not None:
+        query = query.where(Payment.quarter == quarter)
+    if mentor_id is not None:
+        query = query.where(Payment.mentor_id == mentor_id)
+    return query.order_by(Payment.date, Payment.id)
+
+@router.get("/payments/report")
+async def get_payments_report(
+    group_by: list[PaymentDimension] = Query([]),
+    quarter: str | None = None,
+    mentor_id: int | None = None,
+    method: str | None = None,
+    state: str | None = None,
+    db: AsyncSession = db_dependency,
+) -> list[PaymentTotals]:
+    """Total amount and count of payments grouped by quarter, mentor, method and/or state."""
+    group_by = list(dict.fromkeys(group_by))
+    columns = [DIMENSIONS[dimension][0] for dimension in group_by]
+    query = select(*columns, func.sum(PaymentRollup.total_amount).label("total_amount"), func.sum(PaymentRollup.payment_count).label("payment_count"))
+    for column, value in ((PaymentRollup.quarter, quarter), (PaymentRollup.mentor_id, mentor_id), (PaymentRollup.method, method), (PaymentRollup.state, state)):
+        if value is not None:
+            query = query.where(column == value)
+    query = query.group_by(*columns).having(func.sum(PaymentRollup.payment_count) > 0).order_by(*columns)
+    totals = []
+    for row in (await db.execute(query)).mappings():
+        group = {"total_amount": row["total_amount"] or 0, "payment_count": row["payment_count"]}
+        for column, unknown in (DIMENSIONS[dimension] for dimension in group_by):
+            group[column.key] = None if row[column.key] == unknown else row[column.key]
+        totals.append(group)
+    return totals
+
+@router.get("/payments/outstanding")
+async def get_outstanding_payments(student_id: int | None = None, page: PageParams = page_dependency, db: AsyncSession = db_dependency) -> Page[StudentOutstanding]:
+    """Amount still owed per student (pending or late payments)."""
+    outstanding = func.sum(StudentPaymentBalance.total_amount)
+    count = func.sum(StudentPaymentBalance.payment_count)
+    query = (
+        select(StudentPaymentBalance.student_id, outstanding.label("outstanding_amount"), count.label("payment_count"))
+        .where(StudentPaymentBalance.state.in_(OUTSTANDING_PAYMENT_STATES))
+        .group_by(StudentPaymentBalance.student_id)
+        .having(count > 0)
     )
-    db.add(db_payment)
-    db.commit()
-    db.refresh(db_payment)
-    return db_payment   
-
-@router.put("/payments/{payment_id}")
-async def update_payment(payment_id: int, payment: PaymentModel, db: Session = db_dependency) -> PaymentResponse:
-    """Update a payment by ID."""
-    db_payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    if not db_payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    db_payment.amount = payment.amount
-    db_payment.date = payment.date
-    db_payment.user_id = payment.mentor_id
-    db.commit()
-    db.refresh(db_payment)
-    return db_payment
-
-@router.delete("/payments/{payment_id}")
-async def delete_payment(payment_id: int, db: Session = db_dependency) -> PaymentResponse:
-    """Delete a payment by ID."""
-    db_payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    if not db_payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    db.delete(db_payment)
-    db.commit()
-    return db_payment
-
-@router.get("/payments/mentors/{mentor_id}")
-async def get_payments_by_mentor(mentor_id: int, db: Session = db_dependency) -> list[PaymentResponse]:
+    if student_id is not None:
+        query = query.where(StudentPaymentBalance.student_id == student_id)
+    return await paginate(db, query, page, (StudentPaymentBalance.student_id,), rows=True)
+
+@router.get("/payments/mentors/{mentor_id}", response_model=Page[PaymentDetails])
+async def get_payments_by_mentor(mentor_id: int, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all payments by mentor ID."""
-    payments = db.query(Payment).filter(Payment.mentor_id == mentor_id).all()
-    if not payments:
-        raise HTTPException(status_code=404, detail="No payments found for this mentor")
-    return payments
+    return await payments.page_response(db, page, includes, "No payments found for this mentor", mentor_id=mentor_id)
 
-@router.get("/payments/students/{student_id}")
-async def get_payments_by_student(student_id: int, db: Session = db_dependency) -> list[PaymentResponse]:
+@router.get("/payments/students/{student_id}", response_model=Page[PaymentDetails])
+async def get_payments_by_student(student_id: int, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all payments by student ID."""
-    payments = db.query(Payment).filter(Payment.student_id == student_id).all()
-    if not payments:
-        raise HTTPException(status_code=404, detail="No payments found for this student")
-    return payments
-
+    return await payments.page_response(db, page, includes, "No payments found for this student", student_id=student_id)
 
+payments.register(router)
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from utils.database import get_db
-from utils.models import Student
-from pydantic import BaseModel
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_async_db
+from utils.pagination import Page, PageParams
+from utils.serialization import RowSerializer
+from utils.crud import Crud
+from utils.occupancy import adjust_enrolled, adjust_enrolled_many, move_enrolment
+from utils.imports import CSV_BODY, CsvImport, ImportReport
+from utils.placement import place_students
+from utils import search
+from utils.settings import MAX_PLACEMENT_STUDENTS, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from utils.models import Degree, Student
+from app.routes.classrooms import ClassroomResponse
+from app.routes.degrees import DegreeResponse
+from app.routes.mentors import MentorResponse
+from pydantic import BaseModel, Field
 from datetime import date
 
 class StudentModel(BaseModel):
@@ -24,125 +36,132 @@ class StudentResponse(BaseModel):
     mentor_id: int
     state: str
 
+class StudentDetails(StudentResponse):
+    degree: DegreeResponse | None = None
+    classroom: ClassroomResponse | None = None
+    mentor: MentorResponse | None = None
+
+class PlacementStudent(BaseModel):
+    student_id: int
+    day: str | None = None
+    time_slot: str | None = None
+
+class PlacementModel(BaseModel):
+    degree_id: int
+    students: list[PlacementStudent] = Field(max_length=MAX_PLACEMENT_STUDENTS)
+
+class PlacementOutcome(BaseModel):
+    student_id: int
+    status: str
+    classroom_id: int | None = None
+    previous_classroom_id: int | None = None
+
+class StudentSearchHit(BaseModel):
+    student: StudentResponse
+    score: float
+
 router = APIRouter(
     tags=["Students"]
 )
 
-db_dependency = Depends(get_db)
-
-@router.get("/students")
-async def get_students(db: Session = db_dependency) -> list[StudentResponse]:
-    """Get all students."""
-    students = db.query(Student).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found")
-    return students
-
-@router.get("/students/{student_id}")
-async def get_student(student_id: int, db: Session = db_dependency) -> StudentResponse:
-    """Get a student by ID."""
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return student
-
-@router.post("/students")
-async def create_student(student: StudentModel, db: Session = db_dependency) -> StudentResponse:
-    """Create a new student."""
-    db_student = Student(
-        first_name=student.first_name,
-        last_name=student.last_name,
-        birth_date=student.birth_date,
-        degree_id=student.degree_id,
-        classroom_id=student.classroom_id,
-        mentor_id=student.mentor_id,
-        state=student.state
-    )
-    db.add(db_student)
-    db.commit()
-    db.refresh(db_student)
-    return db_student
-
-@router.put("/students/{student_id}")
-async def update_student(student_id: int, student: StudentModel, db: Session = db_dependency) -> StudentResponse:
-    """Update a student by ID."""
-    db_student = db.query(Student).filter(Student.id == student_id).first()
-    if not db_student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    db_student.first_name = student.first_name
-    db_student.last_name = student.last_name
-    db_student.birth_date = student.birth_date
-    db_student.degree_id = student.degree_id
-    db_student.classroom_id = student.classroom_id
-    db_student.mentor_id = student.mentor_id
-    db_student.state = student.state
-    db.commit()
-    db.refresh(db_student)
-    return db_student
-
-@router.delete("/students/{student_id}")
-async def delete_student(student_id: int, db: Session = db_dependency) -> StudentResponse:
-    """Delete a student by ID."""
-    db_student = db.query(Student).filter(Student.id == student_id).first()
-    if not db_student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    db.delete(db_student)
-    db.commit()
-    return db_student
-
-@router.get("/students/degree/{degree_id}")
-async def get_students_by_degree(degree_id: int, db: Session = db_dependency) -> list[StudentResponse]:
+db_dependency = Depends(get_async_db)
+page_dependency = Depends(PageParams)
+student_rows = RowSerializer(StudentResponse, Student)
+
+class StudentCrud(Crud):
+    """Students hold a seat in their classroom and are indexed for search."""
+
+    tracked = ("classroom_id",)
+    conflict = "A student with this name and birth date already exists"
+
+    async def created(self, db: AsyncSession, student) -> None:
+        await adjust_enrolled(db, student.classroom_id, 1)
+
+    async def updated(self, db: AsyncSession, student, old: dict) -> None:
+        await move_enrolment(db, old["classroom_id"], student.classroom_id)
+
+    async def deleted(self, db: AsyncSession, student) -> None:
+        await adjust_enrolled(db, student.classroom_id, -1)
+
+    def committed(self, student, deleted: bool = False) -> None:
+        if deleted:
+            search.unindex_student(student.id)
+        else:
+            search.index_student(student)
+
+students = StudentCrud(Student, StudentModel, StudentResponse, "/students", details=StudentDetails, includes=("degree", "classroom", "mentor"), rows=student_rows)
+include_dependency = students.include_dependency
+
+class StudentImport(CsvImport):
+    """Imported students take or move their seat and are indexed for search."""
+
+    tracked = ("classroom_id",)
+
+    async def written(self, db: AsyncSession, rows, previous: dict) -> None:
+        deltas = Counter()
+        for student in rows:
+            old = previous.get((student.first_name, student.last_name, student.birth_date))
+            if old is not None:
+                deltas[old.classroom_id] -= 1
+            deltas[student.classroom_id] += 1
+        await adjust_enrolled_many(db, deltas)
+
+    def committed(self, rows) -> None:
+        for student in rows:
+            search.index_student(student)
+
+student_import = StudentImport(Student, StudentModel, StudentResponse, ("first_name", "last_name", "birth_date"))
+
+@router.get("/students/filter", response_model=Page[StudentDetails])
+async def filter_students_by_criteria(degree_id: int = None, classroom_id: int = None, mentor_id: int = None, state: str = None, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
+    """Get all students by criteria."""
+    return await students.page_response(db, page, includes, "No students found for these criteria", degree_id=degree_id, classroom_id=classroom_id, mentor_id=mentor_id, state=state)
+
+@router.get("/students/search")
+async def search_students(query: str, limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT), db: AsyncSession = db_dependency) -> list[StudentSearchHit]:
+    """Search students by name, best matches first (prefixes and typos included)."""
+    hits = await search.search_students(db, query, limit)
+    if not hits:
+        raise HTTPException(status_code=404, detail="No students found for this query")
+    return [{"student": student, "score": score} for student, score in hits]
+
+@router.get("/students/degree/{degree_id}", response_model=Page[StudentDetails])
+async def get_students_by_degree(degree_id: int, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all students by degree."""
-    students = db.query(Student).filter(Student.degree_id == degree_id).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this degree")
-    return students
+    return await students.page_response(db, page, includes, "No students found for this degree", degree_id=degree_id)
 
-@router.get("/students/classroom/{classroom_id}")
-async def get_students_by_classroom(classroom_id: int, db: Session = db_dependency) -> list[StudentResponse]:
+@router.get("/students/classroom/{classroom_id}", response_model=Page[StudentDetails])
+async def get_students_by_classroom(classroom_id: int, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all students by classroom."""
-    students = db.query(Student).filter(Student.classroom_id == classroom_id).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this classroom")
-    return students
+    return await students.page_response(db, page, includes, "No students found for this classroom", classroom_id=classroom_id)
 
-@router.get("/students/mentor/{mentor_id}")
-async def get_students_by_mentor(mentor_id: int, db: Session = db_dependency) -> list[StudentResponse]:
+@router.get("/students/mentor/{mentor_id}", response_model=Page[StudentDetails])
+async def get_students_by_mentor(mentor_id: int, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all students by mentor."""
-    students = db.query(Student).filter(Student.mentor_id == mentor_id).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this mentor")
-    return students
+    return await students.page_response(db, page, includes, "No students found for this mentor", mentor_id=mentor_id)
 
-@router.get("/students/state/{state}")
-async def get_students_by_state(state: str, db: Session = db_dependency) -> list[StudentResponse]:
+@router.get("/students/state/{state}", response_model=Page[StudentDetails])
+async def get_students_by_state(state: str, page: PageParams = page_dependency, includes: tuple[str, ...] = include_dependency, db: AsyncSession = db_dependency) -> Response:
     """Get all students by state."""
-    students = db.query(Student).filter(Student.state == state).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this state")
-    return students
+    return await students.page_response(db, page, includes, "No students found for this state", state=state)
 
-@router.get("/students/filter")
-async def filter_students_by_criteria(degree_id: int = None, classroom_id: int = None, mentor_id: int = None, state: str = None, db: Session = db_dependency) -> list[StudentResponse]:
-    """Get all students by criteria."""
-    students = db.query(Student)
-    if degree_id is not None:
-        students = students.filter(Student.degree_id == degree_id)
-    if classroom_id is not None:
-        students = students.filter(Student.classroom_id == classroom_id)
-    if mentor_id is not None:
-        students = students.filter(Student.mentor_id == mentor_id)
-    if state is not None:
-        students = students.filter(Student.state == state)
-    students = students.all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for these criteria")
-    return students
+@router.post("/students/import", openapi_extra=CSV_BODY)
+async def import_students(request: Request, db: AsyncSession = db_dependency) -> ImportReport:
+    """Create or update students from a CSV upload (header row of StudentModel fields), matched on first name, last name and birth date."""
+    return await student_import.run(db, request.stream())
 
-@router.get("/students/search")
-async def search_students(query: str, db: Session = db_dependency) -> list[StudentResponse]:
-    """Search students by query."""
-    students = db.query(Student).filter(Student.first_name.ilike(f"%{query}%") | Student.last_name.ilike(f"%{query}%")).all()
-    if not students:
-        raise HTTPException(status_code=404, detail="No students found for this query")
-    return students 
\ No newline at end of file
+@router.post("/students/placement")
+async def place_students_in_classrooms(placement: PlacementModel, db: AsyncSession = db_dependency) -> list[PlacementOutcome]:
+    """Place a batch of students in the classrooms of their degree, in a single transaction.
+
+    Each student can ask for a ``day``, a ``time_slot`` or both, and goes to the matching
+    classroom with the most free seats; no classroom is filled beyond its capacity, even
+    under concurrent placements. Each student comes back, in request order, with a status:
+    ``placed``, ``unchanged`` (already in a matching classroom), ``no_seat`` (left where it
+    was), ``unknown_student``, ``other_degree`` or ``duplicate`` (repeated in the request).
+    """
+    if await db.get(Degree, placement.degree_id) is None:
+        raise HTTPException(status_code=404, detail="Degree not found")
+    return await place_students(db, placement.degree_id, placement.students, student_rows)
+
+students.register(router)
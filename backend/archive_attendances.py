@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import sys
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from utils.database import JobSessionLocal
+from utils.models import AttendanceArchive
+from utils.partitions import archive_term, ensure_partitions, is_partitioned, partitions, restore_term
+from utils.settings import ATTENDANCE_ARCHIVE_DIR
+
+
+async def show(db) -> None:
+    if await is_partitioned(db):
+        for name, rows in (await partitions(db)).items():
+            print(f"partition  {name:<24} ~{rows} rows")
+    else:
+        print("attendances is not partitioned")
+    for archive in (await db.scalars(select(AttendanceArchive).order_by(AttendanceArchive.term))).all():
+        print(f"archived   {archive.term:<24} {archive.rows} rows in {archive.path} ({archive.archived_at:%Y-%m-%d})")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the term partitions of attendances and the archives of past terms.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="partitions and archived terms")
+    commands.add_parser("ensure", help="create the partitions of the upcoming terms now")
+    archive = commands.add_parser("archive", help="move past terms to compressed CSV files and out of the database")
+    archive.add_argument("terms", nargs="+", help="terms as YYYY-Qn")
+    archive.add_argument("--directory", default=ATTENDANCE_ARCHIVE_DIR)
+    restore = commands.add_parser("restore", help="load archived terms back into the database")
+    restore.add_argument("terms", nargs="+", help="terms as YYYY-Qn")
+    args = parser.parse_args()
+
+    async with JobSessionLocal() as db:
+        try:
+            if args.command == "list":
+                await show(db)
+            elif args.command == "ensure":
+                created = await ensure_partitions(db)
+                print(f"created: {', '.join(created) or 'none'}")
+            elif args.command == "archive":
+                for term in args.terms:
+                    done = await archive_term(db, term, args.directory)
+                    print(f"{done.term}: {done.rows} rows archived to {done.path}")
+            else:
+                for term in args.terms:
+                    done = await restore_term(db, term)
+                    print(f"{done.term}: {done.rows} rows restored")
+        except HTTPException as error:
+            print(error.detail, file=sys.stderr)
+            return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
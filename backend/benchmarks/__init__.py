@@ -0,0 +1,4 @@
+"""
+Benchmarks for the backend. Each module can be run with ``python -m benchmarks.<name>``
+from the ``backend`` directory, against the database configured by ``DATABASE_URL``.
+"""
@@ -0,0 +1,110 @@
+"""
+Concurrent-request throughput of the synchronous vs asynchronous database path.
+
+The "sync" app reproduces the previous handlers (an ``async def`` route calling the
+blocking ``Session`` from ``get_db``), the "async" app mounts the real students router
+backed by ``get_async_db``. Both are driven in-process through ``httpx.ASGITransport``.
+
+With a concurrency above the pool size (5 + 10 overflow by default) the sync app can
+stall for ``pool_timeout`` seconds: the blocked event loop never gets to run the
+dependency cleanup that would return connections to the pool.
+
+    python -m benchmarks.async_db --requests 2000 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+
+from app.routes import students
+from app.routes.students import StudentResponse
+from utils.database import Base, SessionLocal, engine, get_db
+from utils.models import Classroom, Degree, Mentor, Student
+
+
+def seed(count: int) -> None:
+    """Create the schema and insert ``count`` students if the table is empty."""
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(Student).first() is not None:
+            return
+        degree = Degree(name="Bench", level="1")
+        mentor = Mentor(first_name="Bench", last_name="Mentor", email="bench@example.com", phone="0")
+        db.add_all([degree, mentor])
+        db.flush()
+        classroom = Classroom(name="Bench", degree_id=degree.id, capacity=count, day="monday", time_slot="morning")
+        db.add(classroom)
+        db.flush()
+        db.add_all(
+            Student(
+                first_name=f"First{i}",
+                last_name=f"Last{i}",
+                birth_date=datetime(2010, 1, 1),
+                degree_id=degree.id,
+                classroom_id=classroom.id,
+                mentor_id=mentor.id,
+                state="active",
+            )
+            for i in range(count)
+        )
+        db.commit()
+
+
+def build_sync_app() -> FastAPI:
+    """App reproducing the blocking handlers that ran before the async data path."""
+    app = FastAPI()
+
+    @app.get("/students/{student_id}")
+    async def get_student(student_id: int, db: Session = Depends(get_db)) -> StudentResponse:
+        return db.query(Student).filter(Student.id == student_id).first()
+
+    return app
+
+
+def build_async_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(students.router)
+    return app
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int, ids: int) -> tuple[float, int]:
+    """Send ``requests`` GETs with at most ``concurrency`` in flight, return (requests/second, errors)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                try:
+                    response = await client.get(f"/students/{i % ids + 1}")
+                    response.raise_for_status()
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - start), errors
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--students", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed(args.students)
+    for name, app in (("sync", build_sync_app()), ("async", build_async_app())):
+        throughput, errors = await drive(app, args.requests, args.concurrency, args.students)
+        print(f"{name:>5}: {throughput:8.1f} req/s, {errors} errors ({args.requests} requests, concurrency {args.concurrency})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
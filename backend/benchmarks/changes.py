@@ -0,0 +1,230 @@
+"""
+Check the change feed (``/changes`` and ``/changes/ws``) end to end.
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``; on
+PostgreSQL, run ``alembic upgrade head`` first for ``change_seq``), starts
+``main.py --production`` with ``--workers`` workers (events written on one worker reach
+the subscribers of all of them through NOTIFY; use 1 on SQLite), then, over HTTP and
+WebSocket:
+
+- follows one classroom over a WebSocket and every resource over server-sent events,
+  creates a student in that classroom, moves it to another one, deletes it and updates
+  a course and the classroom; checks the events each subscriber receives, their order,
+  and how long they take to arrive;
+- reconnects the event stream with ``Last-Event-ID`` and checks that it replays the
+  events after it;
+- sends ``--concurrent`` course updates at once, which commit in any order on the
+  workers: the event stream must get them all, in sequence order, without a reset;
+- imports ``--rows`` students while a WebSocket subscriber does not read, then reads:
+  it must get every event, in order (caught up from the worker's buffer once its queue
+  was full), or a ``reset`` when the buffer holds fewer events than the import.
+
+Exits with status 1 when a check fails.
+
+    python -m benchmarks.changes --workers 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+from sqlalchemy import delete, select
+
+from benchmarks.dataset import SMALL, seed
+from benchmarks.imports import students_csv
+from benchmarks.workers import BACKEND, wait_until_up
+from utils.database import AsyncSessionLocal, engine
+from utils.models import Classroom, Student
+from utils.occupancy import recount_enrolled
+
+# Seconds left to subscriptions to register, and to events to arrive
+SETTLE = 0.3
+TIMEOUT = 10
+
+
+def report(ok: bool, message: str) -> int:
+    print(f"{'ok' if ok else 'FAIL':>4}  {message}", flush=True)
+    return not ok
+
+
+async def follow_stream(client: httpx.AsyncClient, received: list, headers: dict | None = None) -> None:
+    """Append (arrival time, event) for each server-sent event, until cancelled."""
+    async with client.stream("GET", "/changes", headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                received.append((time.perf_counter(), json.loads(line[6:])))
+
+
+async def follow_socket(url: str, received: list) -> None:
+    async with websockets.connect(url) as socket:
+        async for message in socket:
+            received.append((time.perf_counter(), json.loads(message)))
+
+
+async def until(condition, timeout: float = TIMEOUT) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+def actions(received: list) -> list[tuple[str, str]]:
+    return [(event.get("resource", ""), event["action"]) for _, event in received]
+
+
+def ordered(received: list) -> bool:
+    seqs = [event["seq"] for _, event in received]
+    return all(a < b for a, b in zip(seqs, seqs[1:]))
+
+
+async def writes(client: httpx.AsyncClient, base_url: str) -> tuple[int, int]:
+    """Check the events of a few writes; return the failures and the first event's number."""
+    failures = 0
+    async with AsyncSessionLocal() as db:
+        first, second = (await db.execute(select(Classroom.id, Classroom.degree_id, Classroom.capacity).order_by(Classroom.id).limit(2))).all()
+    everything, classroom = [], []
+    tasks = [
+        asyncio.create_task(follow_stream(client, everything)),
+        asyncio.create_task(follow_socket(f"{base_url.replace('http', 'ws')}/changes/ws?classroom_id={first.id}", classroom)),
+    ]
+    await asyncio.sleep(SETTLE)
+
+    sent = []
+    student = {"first_name": "Feed", "last_name": str(random.randrange(10**9)), "birth_date": "2010-01-01", "degree_id": first.degree_id, "classroom_id": first.id, "mentor_id": 1, "state": "active"}
+    for method, path, body in [
+        ("POST", "/students", student),
+        ("PATCH", "/students/{id}", {"classroom_id": second.id}),
+        ("DELETE", "/students/{id}", None),
+        ("PATCH", "/courses/1", {}),
+        ("PATCH", f"/classrooms/{first.id}", {"capacity": first.capacity}),
+    ]:
+        sent.append(time.perf_counter())
+        response = (await client.request(method, path.format(id=student.get("id")), json=body)).raise_for_status()
+        student.setdefault("id", response.json()["id"])
+    arrived = await until(lambda: len(everything) >= 5 and len(classroom) >= 3)
+    await asyncio.sleep(SETTLE)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    expected = [("students", "created"), ("students", "updated"), ("students", "deleted"), ("courses", "updated"), ("classrooms", "updated")]
+    failures += report(arrived and actions(everything) == expected and ordered(everything),
+                       f"event stream: {', '.join(f'{resource} {action}' for resource, action in actions(everything))}")
+    moved = classroom[1][1].get("previous", {}) if len(classroom) > 1 else {}
+    failures += report(actions(classroom) == [expected[0], expected[1], expected[4]] and moved.get("classroom_id") == first.id,
+                       f"WebSocket of classroom {first.id}: {', '.join(f'{resource} {action}' for resource, action in actions(classroom))} (the student moved out from {moved.get('classroom_id')})")
+    if len(everything) == len(sent):
+        delays = [(arrival - start) * 1000 for (arrival, _), start in zip(everything, sent)]
+        print(f"      write to event: p50 {statistics.median(delays):.1f} ms, max {max(delays):.1f} ms", flush=True)
+    return failures, everything[0][1]["seq"] if everything else 0
+
+
+async def resume(client: httpx.AsyncClient, after: int) -> int:
+    replayed = []
+    task = asyncio.create_task(follow_stream(client, replayed, {"Last-Event-ID": str(after)}))
+    await until(lambda: len(replayed) >= 4)
+    await asyncio.sleep(SETTLE)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    seqs = [event["seq"] for _, event in replayed]
+    return report(len(replayed) == 4 and ordered(replayed) and seqs[0] > after, f"resumed after {after}: replayed {seqs}")
+
+
+async def concurrent_writes(client: httpx.AsyncClient, count: int) -> int:
+    received = []
+    task = asyncio.create_task(follow_stream(client, received))
+    await asyncio.sleep(SETTLE)
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.patch(f"/courses/{1 + n % SMALL.courses}", json={}) for n in range(count)))
+    elapsed = time.perf_counter() - start
+    await until(lambda: len(received) >= count)
+    await asyncio.sleep(SETTLE)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    written = sum(response.status_code == 200 for response in responses)
+    return report(written == count and actions(received) == [("courses", "updated")] * count and ordered(received),
+                  f"{written} concurrent course updates in {elapsed:.2f} s: {len(received)} events in order, "
+                  f"{sum(event['action'] == 'reset' for _, event in received)} resets")
+
+
+async def slow_subscriber(client: httpx.AsyncClient, base_url: str, rows: int) -> int:
+    tag = f"Feed{random.randrange(10**9)}"
+    body, invalid = students_csv(rows, tag, random.Random(0))
+    async with websockets.connect(f"{base_url.replace('http', 'ws')}/changes/ws?resource=students", max_queue=1) as socket:
+        await asyncio.sleep(SETTLE)
+        start = time.perf_counter()
+        imported = (await client.post("/students/import", content=body, headers={"Content-Type": "text/csv"}, timeout=None)).raise_for_status().json()
+        written = imported["created"] + imported["updated"]
+        events = []
+        try:
+            while len(events) < written and (not events or events[-1]["action"] != "reset"):
+                events.append(json.loads(await asyncio.wait_for(socket.recv(), TIMEOUT)))
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Student).where(Student.last_name.startswith(f"{tag} ")))
+        await recount_enrolled(db)
+        await db.commit()
+    seqs = [event["seq"] for event in events]
+    complete = len(events) == written and all(event["action"] == "created" for event in events)
+    reset = bool(events) and events[-1]["action"] == "reset"
+    return report((complete or reset) and all(a < b for a, b in zip(seqs, seqs[1:])),
+                  f"unread WebSocket during an import of {written} students: {len(events)} events in order"
+                  f"{', ending with a reset' if reset else ''}, read {elapsed:.2f} s after the import started")
+
+
+async def warmed_up(client: httpx.AsyncClient) -> None:
+    """Wait until the workers finished their warm-up, which would weigh on the timings."""
+    answers = 0
+    while answers < 10:
+        answers = answers + 1 if (await client.get("/health/ready")).status_code == 200 else 0
+        await asyncio.sleep(0.05)
+
+
+async def run(base_url: str, rows: int, concurrent: int) -> int:
+    async with httpx.AsyncClient(base_url=base_url, timeout=TIMEOUT) as client:
+        await warmed_up(client)
+        failures, first = await writes(client, base_url)
+        failures += await resume(client, first)
+        failures += await concurrent_writes(client, concurrent)
+        failures += await slow_subscriber(client, base_url, rows)
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrent", type=int, default=50, help="course updates sent at once")
+    parser.add_argument("--rows", type=int, default=5_000, help="students imported while a subscriber does not read")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "--production", "--workers", str(args.workers), "--port", str(args.port)], cwd=BACKEND,
+        env={**os.environ, "SLOW_QUERY_MS": "0"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(base_url, server)
+        failures = asyncio.run(run(base_url, args.rows, args.concurrent))
+    finally:
+        server.terminate()
+        server.wait()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
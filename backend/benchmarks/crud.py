@@ -0,0 +1,110 @@
+"""
+Per-request Python overhead of the generic CRUD routes.
+
+First times what SQLAlchemy does before it reaches its compiled cache, for statements
+built on each request as the routes used to (``select(Mentor).where(Mentor.id == 5)``)
+and for the statements ``utils.crud.Crud`` builds once: constructing the statement and
+computing its cache key, which a reused statement object keeps memoized.
+
+Then seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), then
+sends each route ``--requests`` times, one request at a time, through
+``httpx.ASGITransport``. For each route it reports the wall time and the CPU time of
+this process per request: with PostgreSQL the database works in another process, so the
+CPU time is what the app spends building, compiling and binding statements, running
+dependencies and serializing responses.
+
+    python -m benchmarks.crud --requests 2000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from sqlalchemy import bindparam, select, tuple_, update
+
+from app.api import app
+from app.routes.mentors import mentors
+from app.routes.students import students
+from benchmarks.dataset import SMALL, seed
+from utils.database import engine
+from utils.models import Mentor, Student
+
+# Route -> (method, url, JSON body) built from a random generator
+ROUTES = {
+    "GET /mentors/{mentor_id}": lambda rng: ("GET", f"/mentors/{rng.randint(1, SMALL.mentors)}", None),
+    "GET /students/{student_id}": lambda rng: ("GET", f"/students/{rng.randint(1, SMALL.students)}", None),
+    "GET /students/{student_id}?include": lambda rng: ("GET", f"/students/{rng.randint(1, SMALL.students)}?include=degree,classroom,mentor", None),
+    "GET /attendances/{attendance_id}": lambda rng: ("GET", f"/attendances/{rng.randint(1, SMALL.attendances)}", None),
+    "GET /mentors": lambda rng: ("GET", "/mentors?limit=20", None),
+    "GET /students/degree/{degree_id}": lambda rng: ("GET", f"/students/degree/{rng.randint(1, SMALL.degrees)}?limit=20", None),
+    "GET /payments/mentors/{mentor_id}": lambda rng: ("GET", f"/payments/mentors/{rng.randint(1, SMALL.mentors)}?limit=20", None),
+    "PATCH /mentors/{mentor_id}": lambda rng: ("PATCH", f"/mentors/{rng.randint(1, SMALL.mentors)}", {"phone": f"06{rng.randrange(10**8):08d}"}),
+    "PUT /courses/{course_id}": lambda rng: ("PUT", f"/courses/{rng.randint(1, SMALL.courses)}", None),
+}
+
+
+mentor_table = Mentor.__table__
+mentor_update = update(mentor_table).where(mentor_table.c.id == bindparam("row_id")).returning(*mentor_table.c)
+
+# Statement -> (built on each request, built once), as the routes run them
+STATEMENTS = {
+    "mentor by id": (lambda: select(Mentor).where(Mentor.id == 5), lambda: mentors.select_by_id()),
+    "students page of a degree": (
+        lambda: students.rows.select().where(Student.degree_id == 3).where(tuple_(Student.id) > tuple_(100)).order_by(Student.id).limit(21),
+        lambda: students.keyset((), ("degree_id",)).after,
+    ),
+    "mentor update": (lambda: update(mentor_table).where(mentor_table.c.id == 5).values(phone="0600000000").returning(*mentor_table.c), lambda: mentor_update),
+}
+
+
+def time_statements(iterations: int) -> None:
+    for name, (rebuilt, prebuilt) in STATEMENTS.items():
+        timings = []
+        for build in (rebuilt, prebuilt):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                build()._generate_cache_key()
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+        print(f"{name:<40} {timings[0]:8.1f} us built per request  {timings[1]:8.1f} us built once", flush=True)
+
+
+async def measure(client: httpx.AsyncClient, route: str, requests: int, rng: random.Random) -> tuple[float, float, int]:
+    """Mean wall and CPU microseconds per request of ``route``, and its number of failures."""
+    build = ROUTES[route]
+    calls = [build(rng) for _ in range(requests)]
+    if route.startswith("PUT"):
+        # PUT needs the full body: write back what is stored, so the data is left unchanged
+        calls = [(method, url, (await client.get(url)).json()) for method, url, _ in calls]
+    failures = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    for method, url, body in calls:
+        response = await client.request(method, url, json=body)
+        failures += response.status_code not in (200, 404)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return wall / requests * 1e6, cpu / requests * 1e6, failures
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per route")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per route, the best one is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    time_statements(10_000)
+
+    seed(engine, SMALL)
+    rng = random.Random(args.seed)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        for route in ROUTES:
+            await measure(client, route, 50, rng)
+            runs = [await measure(client, route, args.requests, rng) for _ in range(args.rounds)]
+            wall, cpu, failures = min(runs, key=lambda run: run[1])
+            print(f"{route:<40} {wall:8.0f} us/request  {cpu:8.0f} us CPU/request  {failures} failures", flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
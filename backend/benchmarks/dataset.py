@@ -0,0 +1,188 @@
+"""
+Deterministic seed dataset shared by the benchmarks and plan checks.
+
+``seed`` creates the schema and fills an empty database with generated rows: the same
+``Volumes`` and random seed always produce the same data, so timings and plans can be
+compared between runs. Rows are streamed in chunks, with ``COPY`` on PostgreSQL, so
+``LARGE`` (5M attendances) loads in minutes and in bounded memory.
+
+    python -m benchmarks.dataset --volumes large
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import Connection, Engine, func, insert, select
+
+from utils.database import Base, engine
+from utils.models import Attendance, Classroom, Course, Degree, Mentor, Payment, Student
+from utils import analytics, rollups
+
+FIRST_NAMES = ["Adam", "Aicha", "Ali", "Amina", "Bilal", "Camille", "Fatima", "Hamza", "Ibrahim", "Ines", "Karim", "Khadija", "Lina", "Louis", "Maryam", "Mohamed", "Nour", "Omar", "Sarah", "Yasmine", "Youssef", "Zakaria"]
+LAST_NAMES = ["Benali", "Bernard", "Bouzid", "Chevalier", "Dubois", "Durand", "El Amrani", "Fontaine", "Haddad", "Lefebvre", "Mansouri", "Martin", "Mercier", "Moreau", "Petit", "Rahmani", "Richard", "Robert", "Saidi", "Thomas", "Touati", "Ziani"]
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+TIME_SLOTS = ["morning", "afternoon", "evening"]
+STATES = ["active", "active", "active", "active", "pending", "left"]
+PAYMENT_METHODS = ["card", "cash", "transfer", "check"]
+PAYMENT_STATES = ["paid", "paid", "paid", "pending", "late"]
+FIRST_DAY = datetime(2024, 9, 2)
+
+
+@dataclass(frozen=True)
+class Volumes:
+    degrees: int
+    mentors: int
+    classrooms: int
+    courses: int
+    students: int
+    attendances: int
+    payments: int
+
+
+SMALL = Volumes(degrees=10, mentors=500, classrooms=200, courses=100, students=20_000, attendances=200_000, payments=50_000)
+LARGE = Volumes(degrees=20, mentors=2_000, classrooms=500, courses=200, students=50_000, attendances=5_000_000, payments=200_000)
+VOLUMES = {"small": SMALL, "large": LARGE}
+
+
+def _chunks(rows, size: int = 10_000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _load(conn: Connection, model, rows) -> None:
+    """Insert dict rows chunk by chunk, with ``COPY`` on PostgreSQL."""
+    for chunk in _chunks(rows, 50_000):
+        if conn.dialect.name != "postgresql":
+            conn.execute(insert(model), chunk)
+            continue
+        columns = list(chunk[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in chunk:
+            writer.writerow(["\\N" if row[column] is None else row[column] for column in columns])
+        buffer.seek(0)
+        with conn.connection.dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def seed(engine: Engine, volumes: Volumes = SMALL, random_seed: int = 42) -> bool:
+    """Create the schema and load ``volumes`` rows if the students table is empty.
+
+    Returns False when the database already holds data and was left untouched.
+    """
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if conn.scalar(select(func.count(Student.id))):
+            return False
+        rng = random.Random(random_seed)
+
+        conn.execute(insert(Degree), [{"id": i, "name": f"Degree {i}", "level": str(1 + i % 5)} for i in range(1, volumes.degrees + 1)])
+        _load(conn, Mentor, [
+            {"id": i, "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES), "email": f"mentor{i}@example.com", "phone": f"06{i:08d}"}
+            for i in range(1, volumes.mentors + 1)
+        ])
+        classroom_degree = {i: 1 + i % volumes.degrees for i in range(1, volumes.classrooms + 1)}
+        conn.execute(insert(Classroom), [
+            {"id": i, "name": f"Room {i}", "degree_id": degree_id, "capacity": 30, "day": DAYS[i % len(DAYS)], "time_slot": TIME_SLOTS[i % len(TIME_SLOTS)]}
+            for i, degree_id in classroom_degree.items()
+        ])
+        courses_by_degree = {}
+        for i in range(1, volumes.courses + 1):
+            courses_by_degree.setdefault(1 + i % volumes.degrees, []).append(i)
+        conn.execute(insert(Course), [
+            {"id": i, "name": f"Course {i}", "description": "", "duration": 30, "degree_id": 1 + i % volumes.degrees}
+            for i in range(1, volumes.courses + 1)
+        ])
+
+        student_degree = {}
+        enrolled = {}
+        students = []
+        names = set()
+        for i in range(1, volumes.students + 1):
+            classroom_id = 1 + i % volumes.classrooms
+            student_degree[i] = classroom_degree[classroom_id]
+            enrolled[classroom_id] = enrolled.get(classroom_id, 0) + 1
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            birth_date = datetime(2005 + rng.randrange(12), 1 + rng.randrange(12), 1 + rng.randrange(28))
+            # (first name, last name, birth date) is unique
+            while (first_name, last_name, birth_date) in names:
+                birth_date += timedelta(days=1)
+            names.add((first_name, last_name, birth_date))
+            students.append({
+                "id": i,
+                "first_name": first_name,
+                "last_name": last_name,
+                "birth_date": birth_date,
+                "degree_id": classroom_degree[classroom_id],
+                "classroom_id": classroom_id,
+                "mentor_id": 1 + rng.randrange(volumes.mentors),
+                "state": rng.choice(STATES),
+            })
+        _load(conn, Student, students)
+        for classroom_id, count in enrolled.items():
+            conn.execute(Classroom.__table__.update().where(Classroom.id == classroom_id).values(enrolled=count))
+
+        def attendances():
+            # (student, day) is unique per row, so (student, course, date) is too
+            for i in range(volumes.attendances):
+                student_id = 1 + i % volumes.students
+                courses = courses_by_degree.get(student_degree[student_id]) or [1]
+                yield {"id": i + 1, "student_id": student_id, "course_id": courses[i % len(courses)], "date": FIRST_DAY + timedelta(days=i // volumes.students)}
+
+        _load(conn, Attendance, attendances())
+
+        def payments():
+            for i in range(1, volumes.payments + 1):
+                date = FIRST_DAY + timedelta(days=rng.randrange(365), minutes=rng.randrange(600))
+                yield {
+                    "id": i,
+                    "amount": rng.choice([50, 100, 150, 200, 300]),
+                    "date": date,
+                    "method": rng.choice(PAYMENT_METHODS),
+                    "state": rng.choice(PAYMENT_STATES),
+                    "quarter": f"{date.year}-Q{(date.month - 1) // 3 + 1}",
+                    "mentor_id": 1 + rng.randrange(volumes.mentors),
+                    "student_id": 1 + rng.randrange(volumes.students),
+                }
+
+        _load(conn, Payment, payments())
+        for statement in rollups.rebuild_statements() + analytics.rebuild_statements(engine.dialect.name):
+            conn.execute(statement)
+
+        if engine.dialect.name == "postgresql":
+            # Explicit ids were inserted: move the sequences past them
+            for table in (Degree, Mentor, Classroom, Course, Student, Attendance, Payment):
+                name = table.__tablename__
+                conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))")
+    # Fresh planner statistics, so plans reflect the seeded volumes
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", choices=VOLUMES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if seed(engine, VOLUMES[args.volumes], args.seed):
+        print(f"seeded {VOLUMES[args.volumes]} in {time.perf_counter() - start:.1f}s")
+    else:
+        print("the database already holds students, left untouched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Check that every route query is served by an index on a seeded dataset.
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), calls
+each route through the ASGI app while recording the SELECT statements it issues, then
+EXPLAINs them. Exits with status 1 if any plan falls back to a sequential scan of a
+table holding at least ``--min-rows`` rows, so it can gate CI like a test.
+
+    python -m benchmarks.explain_plans
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import warnings
+
+import httpx
+from sqlalchemy import Select, event, func, select, text
+from sqlalchemy.exc import SAWarning
+
+from app.api import app
+from benchmarks.dataset import SMALL, seed
+from utils.database import async_engine, engine
+from utils.models import Attendance, Payment, Student
+
+# Whole-table reads by design (exports without filters) are not listed here.
+ROUTES = [
+    "/students",
+    "/students?cursor={student_cursor}",
+    "/students/degree/1",
+    "/students/classroom/7",
+    "/students/mentor/42",
+    "/students/state/left",
+    "/students/filter?degree_id=3&state=pending",
+    "/students/{student_id}",
+    "/mentors",
+    "/mentors/42",
+    "/degrees",
+    "/degrees/1",
+    "/classrooms",
+    "/classrooms/7",
+    "/classrooms/availability?day=monday",
+    "/classrooms/7/places",
+    "/courses",
+    "/courses/7",
+    "/attendances",
+    "/attendances/{attendance_id}",
+    "/attendances/export?course_id=7&quarter=2024-Q4",
+    "/attendances/rates/students/{student_id}?quarter=2024-Q3",
+    "/attendances/rates/courses?degree_id=3",
+    "/attendances/rates/classrooms?degree_id=3",
+    "/attendances/rates/weeks?course_id=7",
+    "/payments",
+    "/payments/{payment_id}",
+    "/payments/mentors/42",
+    "/payments/students/{student_id}",
+    "/payments/export?mentor_id=42",
+    "/payments/report?group_by=mentor&quarter=2024-Q4",
+    "/payments/outstanding?student_id={student_id}",
+]
+POSTGRESQL_ONLY_ROUTES = [
+    # On SQLite, search runs on the in-process index built from a full read
+    "/students/search?query=moham",
+]
+
+
+class StatementRecorder:
+    """Collect the SELECT statements executed on the async engine, with their parameters.
+
+    Route queries are built once with ``bindparam`` filters, cursors and ids, whose values
+    only come with each execution: without them every filter would be explained as NULL.
+    """
+
+    def __init__(self):
+        self.statements: list[tuple[Select, dict]] = []
+        event.listen(async_engine.sync_engine, "before_execute", self.record)
+
+    def record(self, conn, clauseelement, multiparams, params, execution_options):
+        if isinstance(clauseelement, Select):
+            # Route reads run one set of parameters, given either way
+            values = dict(multiparams[0]) if multiparams else {}
+            values.update(params or {})
+            self.statements.append((clauseelement, values))
+
+    def take(self) -> list[tuple[Select, dict]]:
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def explain(statement: Select, params: dict) -> list[str]:
+    """Return the tables the plan of ``statement``, run with ``params``, reads with a sequential scan."""
+    with warnings.catch_warnings():
+        # A parameter left without a value would render as NULL and plan as an empty result
+        warnings.simplefilter("error", SAWarning)
+        sql = str(statement.params(params).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+            return _postgresql_seq_scans(plan[0]["Plan"])
+        if not re.search(r"\bWHERE\b", sql):
+            # An unfiltered, ordered LIMIT read walks the index it is ordered by
+            return []
+        # SQLite reports "SCAN table [USING INDEX ...]" for full scans, "SEARCH ..." for index lookups
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        return [match.group(1) for *_, detail in rows if (match := re.match(r"SCAN (\w+)", detail))]
+
+
+def _postgresql_seq_scans(node: dict) -> list[str]:
+    tables = [node["Relation Name"]] if node.get("Node Type") == "Seq Scan" else []
+    for child in node.get("Plans", []):
+        tables += _postgresql_seq_scans(child)
+    return tables
+
+
+def table_sizes() -> dict[str, int]:
+    with engine.connect() as conn:
+        return {
+            model.__tablename__: conn.scalar(select(func.count()).select_from(model))
+            for model in (Student, Attendance, Payment)
+        }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore sequential scans of smaller tables")
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    large = {table for table, rows in table_sizes().items() if rows >= args.min_rows}
+    values = {"student_id": 1234, "attendance_id": 4321, "payment_id": 321}
+    routes = ROUTES + (POSTGRESQL_ONLY_ROUTES if engine.dialect.name == "postgresql" else [])
+
+    recorder = StatementRecorder()
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://plans") as client:
+        values["student_cursor"] = (await client.get("/students", params={"limit": 50})).json()["next_cursor"]
+        recorder.take()
+        for route in routes:
+            url = route.format(**values)
+            response = await client.get(url)
+            response.raise_for_status()
+            for statement, params in recorder.take():
+                scans = sorted(set(explain(statement, params)) & large)
+                status = "SEQ SCAN " + ", ".join(scans) if scans else "ok"
+                failures += bool(scans)
+                print(f"{status:<28} {url}")
+    print(f"{failures} route queries fall back to a sequential scan" if failures else "all route queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
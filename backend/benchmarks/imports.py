@@ -0,0 +1,134 @@
+"""
+Throughput of the CSV imports (``POST /students/import`` and ``/mentors/import``).
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), then
+uploads a generated CSV of ``--rows`` rows of each resource twice through
+``httpx.ASGITransport``, streamed in 64 KiB pieces: the first upload creates every row,
+the second updates them all (students change classroom). One row in a hundred is
+invalid and must be reported. Prints the rows written per second of each upload, checks
+the reports and the classroom occupancy counters, then deletes the imported rows.
+Exits with status 1 when an upload is slower than ``--min-rate`` rows per second or a
+check fails.
+
+    python -m benchmarks.imports --rows 50000
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+from sqlalchemy import delete, func, select
+
+from app.api import app
+from benchmarks.dataset import FIRST_NAMES, SMALL, STATES, seed
+from utils.database import AsyncSessionLocal, engine
+from utils.models import Classroom, Mentor, Student
+from utils.occupancy import recount_enrolled
+
+# Size of the pieces the upload is sent in
+PIECE_SIZE = 1 << 16
+# One row in INVALID_EVERY is invalid
+INVALID_EVERY = 100
+
+
+def students_csv(rows: int, tag: str, rng: random.Random) -> tuple[bytes, int]:
+    """A students CSV and its number of invalid rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["first_name", "last_name", "birth_date", "degree_id", "classroom_id", "mentor_id", "state"])
+    invalid = 0
+    for n in range(rows):
+        classroom_id = rng.randint(1, SMALL.classrooms)
+        # The key (names and birth date) depends on n only, so both uploads match the same rows
+        birth_date = date(2005, 1, 1) + timedelta(days=n % 4000)
+        row = [FIRST_NAMES[n % len(FIRST_NAMES)], f"{tag} {n}", birth_date.isoformat(),
+               1 + classroom_id % SMALL.degrees, classroom_id, rng.randint(1, SMALL.mentors), rng.choice(STATES)]
+        if n % INVALID_EVERY == INVALID_EVERY - 1:
+            invalid += 1
+            # Alternately a value the Model rejects and a classroom that does not exist
+            row[2 if n // INVALID_EVERY % 2 else 4] = "not a date" if n // INVALID_EVERY % 2 else SMALL.classrooms + 1000
+        writer.writerow(row)
+    return buffer.getvalue().encode(), invalid
+
+
+def mentors_csv(rows: int, tag: str, rng: random.Random) -> tuple[bytes, int]:
+    """A mentors CSV and its number of invalid rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["first_name", "last_name", "email", "phone"])
+    invalid = 0
+    for n in range(rows):
+        row = [rng.choice(FIRST_NAMES), f"Import {n}", f"import.{tag}.{n}@example.com", f"06{rng.randrange(10**8):08d}"]
+        if n % INVALID_EVERY == INVALID_EVERY - 1:
+            invalid += 1
+            row = row[:2]
+        writer.writerow(row)
+    return buffer.getvalue().encode(), invalid
+
+
+async def upload(client: httpx.AsyncClient, path: str, body: bytes) -> tuple[dict, float]:
+    async def pieces():
+        for start in range(0, len(body), PIECE_SIZE):
+            yield body[start:start + PIECE_SIZE]
+
+    start = time.perf_counter()
+    response = await client.post(path, content=pieces(), headers={"Content-Type": "text/csv"})
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return response.json(), elapsed
+
+
+async def enrolment_mismatches() -> int:
+    """Classrooms whose ``enrolled`` counter differs from their number of students."""
+    counted = select(func.count(Student.id)).where(Student.classroom_id == Classroom.id).scalar_subquery()
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count(Classroom.id)).where(Classroom.enrolled != counted))
+
+
+async def run(rows: int, min_rate: float, random_seed: int) -> int:
+    rng = random.Random(random_seed)
+    tag = f"Import{rng.randrange(10**9)}"
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+        for path, build in (("/mentors/import", mentors_csv), ("/students/import", students_csv)):
+            for upload_number, expected in enumerate(("created", "updated")):
+                # The same keys each time, with other values (a new rng state)
+                body, invalid = build(rows, tag, random.Random(random_seed + upload_number))
+                report, elapsed = await upload(client, path, body)
+                rate = rows / elapsed
+                ok = (report["rows"] == rows and report["failed"] == invalid and report[expected] == rows - invalid and rate >= min_rate)
+                failures += not ok
+                print(f"{'ok' if ok else 'FAIL':>4}  {path:<18} {expected:<8} {rows} rows in {elapsed:6.2f} s  {rate:9.0f} rows/s  "
+                      f"{report['created']} created, {report['updated']} updated, {report['failed']} failed", flush=True)
+
+    mismatches = await enrolment_mismatches()
+    failures += bool(mismatches)
+    print(f"{'ok' if not mismatches else 'FAIL':>4}  {mismatches} classrooms with a wrong enrolled counter", flush=True)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Student).where(Student.last_name.startswith(f"{tag} ")))
+        await db.execute(delete(Mentor).where(Mentor.email.startswith(f"import.{tag}.")))
+        await recount_enrolled(db)
+        await db.commit()
+    return failures
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows of each CSV")
+    parser.add_argument("--min-rate", type=float, default=10_000, help="rows per second each upload must reach")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    return 1 if await run(args.rows, args.min_rate, args.seed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
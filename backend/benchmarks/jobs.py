@@ -0,0 +1,172 @@
+"""
+Check the background jobs (``/jobs``) end to end.
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), starts
+the job runner and, through ``httpx.ASGITransport``:
+
+- submits the full attendance export (CSV) and payment export (NDJSON), polls them to
+  completion and checks that the downloaded files hold every row;
+- while the attendance export runs, requests ``--probe`` in a loop and prints its
+  latency, which must stay under ``--max-p95-ms`` at the 95th percentile;
+- submits a rebuild of the summary tables and a students CSV import, and checks their
+  results;
+- cancels a running export, and checks that the job of a worker that stopped
+  heartbeating is marked failed.
+
+Exits with status 1 when a check fails.
+
+    python -m benchmarks.jobs
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import delete, func, select
+
+from app.api import app
+from benchmarks.dataset import SMALL, seed
+from benchmarks.imports import students_csv
+from utils.database import AsyncSessionLocal, engine
+from utils.jobs import RUNNING, jobs
+from utils.models import Attendance, Job, Payment, Student
+from utils.occupancy import recount_enrolled
+from utils.settings import JOB_HEARTBEAT_MISSES, JOB_HEARTBEAT_SECONDS
+
+# Seconds between two polls of a job
+POLL_INTERVAL = 0.05
+
+
+async def wait(client: httpx.AsyncClient, job: dict) -> tuple[dict, float]:
+    """Poll ``job`` until it finishes; return it and the seconds it took."""
+    start = time.perf_counter()
+    while job["status"] in ("queued", "running"):
+        await asyncio.sleep(POLL_INTERVAL)
+        job = (await client.get(f"/jobs/{job['id']}")).raise_for_status().json()
+    return job, time.perf_counter() - start
+
+
+async def probe(client: httpx.AsyncClient, path: str, running: asyncio.Event) -> list[float]:
+    """Latencies (ms) of ``path`` requested back to back until ``running`` is cleared."""
+    latencies = []
+    while running.is_set():
+        start = time.perf_counter()
+        (await client.get(path)).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(ok: bool, message: str) -> int:
+    print(f"{'ok' if ok else 'FAIL':>4}  {message}", flush=True)
+    return not ok
+
+
+async def count(model) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count(model.id)))
+
+
+async def exports(client: httpx.AsyncClient, probe_path: str, max_p95_ms: float) -> int:
+    failures = 0
+    attendances = (await client.post("/jobs/exports/attendances")).raise_for_status().json()
+    running = asyncio.Event()
+    running.set()
+    probing = asyncio.create_task(probe(client, probe_path, running))
+    attendances, elapsed = await wait(client, attendances)
+    running.clear()
+    latencies = await probing
+    body = (await client.get(f"/jobs/{attendances['id']}/result")).content
+    rows = body.count(b"\n") - 1
+    expected = await count(Attendance)
+    failures += report(attendances["status"] == "succeeded" and rows == expected,
+                       f"attendance export: {rows} rows in {elapsed:.2f} s ({expected} expected), progress {attendances['done']}/{attendances['total']}")
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0.0
+    failures += report(p95 <= max_p95_ms,
+                       f"{probe_path} during the export: {len(latencies)} requests, p50 {statistics.median(latencies or [0]):.1f} ms, p95 {p95:.1f} ms")
+
+    payments = (await client.post("/jobs/exports/payments", params={"format": "ndjson"})).raise_for_status().json()
+    payments, elapsed = await wait(client, payments)
+    lines = (await client.get(f"/jobs/{payments['id']}/result")).content.splitlines()
+    expected = await count(Payment)
+    failures += report(payments["status"] == "succeeded" and len(lines) == expected and "amount" in json.loads(lines[0]),
+                       f"payment export: {len(lines)} rows in {elapsed:.2f} s ({expected} expected)")
+    return failures
+
+
+async def rebuild_and_import(client: httpx.AsyncClient, rows: int) -> int:
+    failures = 0
+    rebuild = (await client.post("/jobs/reports/rebuild")).raise_for_status().json()
+    rebuild, elapsed = await wait(client, rebuild)
+    result = (await client.get(f"/jobs/{rebuild['id']}/result")).json()
+    failures += report(rebuild["status"] == "succeeded" and len(result["rebuilt"]) == 3, f"report rebuild in {elapsed:.2f} s: {result}")
+
+    tag = f"Job{random.randrange(10**9)}"
+    body, invalid = students_csv(rows, tag, random.Random(0))
+    imported = (await client.post("/jobs/imports/students", content=body, headers={"Content-Type": "text/csv"})).raise_for_status().json()
+    imported, elapsed = await wait(client, imported)
+    result = imported["result"] or {}
+    failures += report(imported["status"] == "succeeded" and result.get("created") == rows - invalid and result.get("failed") == invalid,
+                       f"students import of {rows} rows in {elapsed:.2f} s: {result.get('created')} created, {result.get('failed')} failed")
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Student).where(Student.last_name.startswith(f"{tag} ")))
+        await recount_enrolled(db)
+        await db.commit()
+    return failures
+
+
+async def cancellations(client: httpx.AsyncClient) -> int:
+    failures = 0
+    export = (await client.post("/jobs/exports/attendances")).raise_for_status().json()
+    while export["status"] == "queued":
+        await asyncio.sleep(POLL_INTERVAL)
+        export = (await client.get(f"/jobs/{export['id']}")).json()
+    cancelled = (await client.post(f"/jobs/{export['id']}/cancel")).raise_for_status().json()
+    export, elapsed = await wait(client, cancelled)
+    result = await client.get(f"/jobs/{export['id']}/result")
+    again = await client.post(f"/jobs/{export['id']}/cancel")
+    failures += report(export["status"] == "cancelled" and result.status_code == 409 and again.status_code == 409,
+                       f"running export cancelled in {elapsed * 1000:.0f} ms, then result {result.status_code}, cancel again {again.status_code}")
+
+    # A job left running by a worker that no longer heartbeats
+    stale = datetime.now() - timedelta(seconds=JOB_HEARTBEAT_SECONDS * (JOB_HEARTBEAT_MISSES + 1))
+    async with AsyncSessionLocal() as db:
+        orphan = Job(kind="rebuild_reports", status=RUNNING, params={}, done=0, cancel_requested=False, owner="stopped:1", created_at=stale, heartbeat_at=stale)
+        db.add(orphan)
+        await db.commit()
+    await jobs.check()
+    orphan = (await client.get(f"/jobs/{orphan.id}")).json()
+    failures += report(orphan["status"] == "failed", f"job of a stopped worker: {orphan['status']} ({orphan['error']})")
+    return failures
+
+
+async def run(rows: int, probe_path: str, max_p95_ms: float) -> int:
+    jobs.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+            failures = await exports(client, probe_path, max_p95_ms)
+            failures += await rebuild_and_import(client, rows)
+            failures += await cancellations(client)
+    finally:
+        await jobs.stop()
+    return failures
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000, help="rows of the imported CSV")
+    parser.add_argument("--probe", default="/students?limit=20", help="route requested while the export runs")
+    parser.add_argument("--max-p95-ms", type=float, default=250, help="p95 latency the probed route must stay under")
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    return 1 if await run(args.rows, args.probe, args.max_p95_ms) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,311 @@
+"""
+Latency and throughput of every API route under concurrent load.
+
+Seeds the database configured by ``DATABASE_URL`` with ``benchmarks.dataset`` if it is
+empty, then drives the ASGI app in-process through ``httpx.ASGITransport``. Each read
+route gets its own phase of ``--requests`` requests, spread over random ids of the
+dataset with at most ``--concurrency`` in flight. Writes run as create, update, patch
+and delete lifecycles on new rows, so a run leaves the dataset as it found it. Each route
+reports its p50/p95/p99 latency and its throughput over its phase.
+
+``--save`` writes the results to a JSON baseline; ``--compare`` checks a run against
+one and exits with status 1 when a route's p95 grew, or its throughput dropped, by
+more than ``--tolerance``. Baselines are only comparable on the same machine, database
+and volumes.
+
+    python -m benchmarks.load --volumes large --concurrency 20 --save baseline.json
+    python -m benchmarks.load --volumes large --concurrency 20 --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+import httpx
+
+from app.api import app
+from app.routes import attendances, classrooms, courses, degrees, mentors, payments, students
+from benchmarks.dataset import DAYS, FIRST_DAY, FIRST_NAMES, LAST_NAMES, PAYMENT_METHODS, PAYMENT_STATES, TIME_SLOTS, VOLUMES, Volumes, seed
+from utils.database import engine
+
+# (method, url, JSON body) of one request
+Request = tuple[str, str, dict | list | None]
+
+
+def _ids(rng: random.Random, count: int, size: int = 50) -> str:
+    return ",".join(str(rng.randint(1, count)) for _ in range(size))
+
+
+def _period(rng: random.Random, days: int = 28) -> str:
+    start = FIRST_DAY.date() + timedelta(days=rng.randrange(60))
+    return f"start={start}&end={start + timedelta(days=days)}"
+
+
+# Read routes: route template -> request built from a random generator and the dataset volumes
+READS: dict[str, Callable[[random.Random, Volumes], Request]] = {
+    "GET /students": lambda rng, v: ("GET", "/students?limit=50", None),
+    "GET /students/filter": lambda rng, v: ("GET", f"/students/filter?degree_id={rng.randint(1, v.degrees)}&state=active&limit=50&include=classroom", None),
+    "GET /students/search": lambda rng, v: ("GET", f"/students/search?query={rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:4]}", None),
+    "GET /students/batch": lambda rng, v: ("GET", f"/students/batch?ids={_ids(rng, v.students)}", None),
+    "POST /students/batch": lambda rng, v: ("POST", "/students/batch", {"ids": [rng.randint(1, v.students) for _ in range(200)]}),
+    "GET /students/{student_id}": lambda rng, v: ("GET", f"/students/{rng.randint(1, v.students)}?include=degree,classroom,mentor", None),
+    "GET /students/degree/{degree_id}": lambda rng, v: ("GET", f"/students/degree/{rng.randint(1, v.degrees)}?limit=50", None),
+    "GET /students/classroom/{classroom_id}": lambda rng, v: ("GET", f"/students/classroom/{rng.randint(1, v.classrooms)}", None),
+    "GET /students/mentor/{mentor_id}": lambda rng, v: ("GET", f"/students/mentor/{rng.randint(1, v.mentors)}", None),
+    "GET /students/state/{state}": lambda rng, v: ("GET", f"/students/state/{rng.choice(['active', 'pending', 'left'])}?limit=50", None),
+    "GET /mentors": lambda rng, v: ("GET", "/mentors?limit=50", None),
+    "GET /mentors/batch": lambda rng, v: ("GET", f"/mentors/batch?ids={_ids(rng, v.mentors)}", None),
+    "POST /mentors/batch": lambda rng, v: ("POST", "/mentors/batch", {"ids": [rng.randint(1, v.mentors) for _ in range(200)]}),
+    "GET /mentors/{mentor_id}": lambda rng, v: ("GET", f"/mentors/{rng.randint(1, v.mentors)}", None),
+    "GET /degrees": lambda rng, v: ("GET", "/degrees", None),
+    "GET /degrees/batch": lambda rng, v: ("GET", f"/degrees/batch?ids={_ids(rng, v.degrees, 5)}", None),
+    "POST /degrees/batch": lambda rng, v: ("POST", "/degrees/batch", {"ids": [rng.randint(1, v.degrees) for _ in range(5)]}),
+    "GET /degrees/{degree_id}": lambda rng, v: ("GET", f"/degrees/{rng.randint(1, v.degrees)}", None),
+    "GET /classrooms": lambda rng, v: ("GET", "/classrooms?limit=50&include=degree", None),
+    "GET /classrooms/availability": lambda rng, v: ("GET", f"/classrooms/availability?day={rng.choice(DAYS)}&time_slot={rng.choice(TIME_SLOTS)}", None),
+    "GET /classrooms/batch": lambda rng, v: ("GET", f"/classrooms/batch?ids={_ids(rng, v.classrooms)}", None),
+    "POST /classrooms/batch": lambda rng, v: ("POST", "/classrooms/batch", {"ids": [rng.randint(1, v.classrooms) for _ in range(200)]}),
+    "GET /classrooms/{classroom_id}": lambda rng, v: ("GET", f"/classrooms/{rng.randint(1, v.classrooms)}?include=degree", None),
+    "GET /classrooms/{classroom_id}/places": lambda rng, v: ("GET", f"/classrooms/{rng.randint(1, v.classrooms)}/places", None),
+    "GET /courses": lambda rng, v: ("GET", "/courses?limit=50&include=degree", None),
+    "GET /courses/batch": lambda rng, v: ("GET", f"/courses/batch?ids={_ids(rng, v.courses)}", None),
+    "POST /courses/batch": lambda rng, v: ("POST", "/courses/batch", {"ids": [rng.randint(1, v.courses) for _ in range(200)]}),
+    "GET /courses/{course_id}": lambda rng, v: ("GET", f"/courses/{rng.randint(1, v.courses)}?include=degree", None),
+    "GET /attendances": lambda rng, v: ("GET", "/attendances?limit=100", None),
+    "GET /attendances/export": lambda rng, v: ("GET", f"/attendances/export?{_period(rng, 1)}", None),
+    "GET /attendances/rates/students/{student_id}": lambda rng, v: ("GET", f"/attendances/rates/students/{rng.randint(1, v.students)}", None),
+    "GET /attendances/rates/courses": lambda rng, v: ("GET", f"/attendances/rates/courses?{_period(rng)}", None),
+    "GET /attendances/rates/classrooms": lambda rng, v: ("GET", f"/attendances/rates/classrooms?degree_id={rng.randint(1, v.degrees)}&{_period(rng)}", None),
+    "GET /attendances/rates/weeks": lambda rng, v: ("GET", f"/attendances/rates/weeks?course_id={rng.randint(1, v.courses)}", None),
+    "GET /attendances/batch": lambda rng, v: ("GET", f"/attendances/batch?ids={_ids(rng, v.attendances)}", None),
+    "POST /attendances/batch": lambda rng, v: ("POST", "/attendances/batch", {"ids": [rng.randint(1, v.attendances) for _ in range(200)]}),
+    "GET /attendances/{attendance_id}": lambda rng, v: ("GET", f"/attendances/{rng.randint(1, v.attendances)}", None),
+    "GET /payments": lambda rng, v: ("GET", "/payments?limit=50&include=mentor", None),
+    "GET /payments/export": lambda rng, v: ("GET", f"/payments/export?{_period(rng, 7)}", None),
+    "GET /payments/report": lambda rng, v: ("GET", f"/payments/report?group_by={rng.choice(['quarter', 'mentor', 'method', 'state'])}", None),
+    "GET /payments/outstanding": lambda rng, v: ("GET", "/payments/outstanding?limit=50", None),
+    "GET /payments/batch": lambda rng, v: ("GET", f"/payments/batch?ids={_ids(rng, v.payments)}", None),
+    "POST /payments/batch": lambda rng, v: ("POST", "/payments/batch", {"ids": [rng.randint(1, v.payments) for _ in range(200)]}),
+    "GET /payments/{payment_id}": lambda rng, v: ("GET", f"/payments/{rng.randint(1, v.payments)}?include=mentor", None),
+    "GET /payments/mentors/{mentor_id}": lambda rng, v: ("GET", f"/payments/mentors/{rng.randint(1, v.mentors)}", None),
+    "GET /payments/students/{student_id}": lambda rng, v: ("GET", f"/payments/students/{rng.randint(1, v.students)}", None),
+}
+
+
+@dataclass(frozen=True)
+class Lifecycle:
+    """Create, update, partially update then delete one row of a resource, ``body(rng, volumes, n)`` giving its fields."""
+    resource: str
+    body: Callable[[random.Random, Volumes, int], dict]
+    # POST path when it is not the resource itself, formatted with the body
+    create_path: str | None = None
+
+    @property
+    def item_path(self) -> str:
+        return f"{self.resource}/{{{self.resource.strip('/').removesuffix('s')}_id}}"
+
+
+def _student(rng: random.Random, v: Volumes, n: int) -> dict:
+    return {
+        # n in the last name keeps (first name, last name, birth date) unique
+        "first_name": rng.choice(FIRST_NAMES), "last_name": f"{rng.choice(LAST_NAMES)} {n}", "birth_date": str(date(2010, 1, 1) + timedelta(days=rng.randrange(3000))),
+        "degree_id": rng.randint(1, v.degrees), "classroom_id": rng.randint(1, v.classrooms), "mentor_id": rng.randint(1, v.mentors), "state": "active",
+    }
+
+
+def _payment(rng: random.Random, v: Volumes, n: int) -> dict:
+    return {
+        "amount": rng.choice([50, 100, 150]), "date": (FIRST_DAY + timedelta(days=rng.randrange(365))).isoformat(), "mentor_id": rng.randint(1, v.mentors),
+        "method": rng.choice(PAYMENT_METHODS), "state": rng.choice(PAYMENT_STATES), "student_id": rng.randint(1, v.students),
+    }
+
+
+WRITES = [
+    Lifecycle("/degrees", lambda rng, v, n: {"name": f"Load degree {n}", "level": "1"}),
+    Lifecycle("/mentors", lambda rng, v, n: {"first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES), "email": f"load{n}@example.com", "phone": "0600000000"}),
+    Lifecycle("/classrooms", lambda rng, v, n: {"name": f"Load room {n}", "degree_id": rng.randint(1, v.degrees), "capacity": 30, "day": rng.choice(DAYS), "time_slot": rng.choice(TIME_SLOTS)}),
+    Lifecycle("/courses", lambda rng, v, n: {"name": f"Load course {n}", "description": "", "duration": 30, "degree_id": rng.randint(1, v.degrees)}),
+    Lifecycle("/students", _student),
+    # Dates after the dataset's, one per lifecycle, so (student, course, date) is new
+    Lifecycle("/attendances", lambda rng, v, n: {"student_id": rng.randint(1, v.students), "course_id": rng.randint(1, v.courses), "date": str(date(2030, 1, 1) + timedelta(days=n))}),
+    Lifecycle("/payments", _payment, create_path="/payments/{mentor_id}"),
+]
+
+
+def _roll_call(rng: random.Random, v: Volumes, n: int) -> Request:
+    return ("POST", "/attendances/bulk", [
+        {"course_id": rng.randint(1, v.courses), "date": str(date(2035, 1, 1) + timedelta(days=n)), "student_ids": [rng.randint(1, v.students) for _ in range(30)]}
+    ])
+
+
+class Recorder:
+    """Latencies and errors per route template.
+
+    A 404 is not an error: the list routes answer it when nothing matches a random id.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def send(self, client: httpx.AsyncClient, route: str, request) -> httpx.Response:
+        method, url, body = request
+        start = time.perf_counter()
+        response = await client.request(method, url, json=body)
+        self.latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if response.status_code >= 400 and response.status_code != 404:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+
+def summary(latencies: list[float], errors: int, elapsed: float) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+    }
+
+
+async def phase(client: httpx.AsyncClient, count: int, concurrency: int, step) -> float:
+    """Run ``step(n)`` for n in 0..count-1 with at most ``concurrency`` in flight, return the elapsed seconds."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(n: int) -> None:
+        async with semaphore:
+            await step(n)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(count)))
+    return time.perf_counter() - start
+
+
+async def run(volumes: Volumes, requests: int, concurrency: int, random_seed: int, only: str | None) -> dict[str, dict]:
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://load", timeout=None) as client:
+
+        async def measure(routes: list[str], step) -> None:
+            recorder = Recorder()
+            elapsed = await phase(client, requests, concurrency, lambda n: step(recorder, n))
+            for route in routes:
+                results[route] = summary(recorder.latencies[route], recorder.errors.get(route, 0), elapsed)
+                print(f"{route:<50} " + "  ".join(f"{key} {value}" for key, value in results[route].items()), flush=True)
+
+        for route, build in READS.items():
+            if only and only not in route:
+                continue
+            rng = random.Random(f"{random_seed}:{route}")
+            await measure([route], lambda recorder, n, route=route, build=build: recorder.send(client, route, build(rng, volumes)))
+
+        for lifecycle in WRITES:
+            routes = [f"POST {lifecycle.create_path or lifecycle.resource}", f"PUT {lifecycle.item_path}", f"PATCH {lifecycle.item_path}", f"DELETE {lifecycle.item_path}"]
+            if only and not any(only in route for route in routes):
+                continue
+            rng = random.Random(f"{random_seed}:{lifecycle.resource}")
+
+            async def step(recorder: Recorder, n: int, lifecycle=lifecycle, routes=routes, rng=rng) -> None:
+                body = lifecycle.body(rng, volumes, n)
+                created = await recorder.send(client, routes[0], ("POST", (lifecycle.create_path or lifecycle.resource).format(**body), body))
+                if created.status_code >= 400:
+                    return
+                item = f"{lifecycle.resource}/{created.json()['id']}"
+                await recorder.send(client, routes[1], ("PUT", item, lifecycle.body(rng, volumes, n)))
+                # The first field alone, as a partial update
+                field, value = next(iter(lifecycle.body(rng, volumes, n).items()))
+                await recorder.send(client, routes[2], ("PATCH", item, {field: value}))
+                await recorder.send(client, routes[3], ("DELETE", item, None))
+
+            await measure(routes, step)
+
+        if not only or only in "POST /attendances/bulk":
+            rng = random.Random(f"{random_seed}:bulk")
+
+            async def roll_call(recorder: Recorder, n: int) -> None:
+                response = await recorder.send(client, "POST /attendances/bulk", _roll_call(rng, volumes, n))
+                # Remove the attendances the roll call created, leaving the dataset unchanged
+                for outcome in response.json() if response.status_code < 400 else []:
+                    if outcome["status"] == "created":
+                        await client.delete(f"/attendances/{outcome['id']}")
+
+            await measure(["POST /attendances/bulk"], roll_call)
+    return results
+
+
+def uncovered(results: dict[str, dict]) -> list[str]:
+    """Routes of the seven routers that the run did not exercise."""
+    routers = (attendances, classrooms, courses, degrees, mentors, payments, students)
+    routes = {f"{method} {route.path}" for module in routers for route in module.router.routes for method in route.methods}
+    return sorted(routes - results.keys())
+
+
+def regressions(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    found = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{route}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(f"{route}: throughput {before['throughput']} -> {result['throughput']} req/s")
+    return found
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", choices=VOLUMES, default="small")
+    parser.add_argument("--requests", type=int, default=200, help="requests (or write lifecycles) per route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="only the routes containing this text, e.g. /payments")
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="flag regressions against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95 growth and throughput drop")
+    args = parser.parse_args()
+
+    volumes = VOLUMES[args.volumes]
+    seed(engine, volumes, args.seed)
+    results = await run(volumes, args.requests, args.concurrency, args.seed, args.only)
+
+    missing = [] if args.only else uncovered(results)
+    if missing:
+        print(f"not exercised: {', '.join(missing)}")
+    errors = sum(result["errors"] for result in results.values())
+    if errors:
+        print(f"{errors} requests failed")
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "dialect": engine.dialect.name,
+                "volumes": args.volumes,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "routes": results,
+            }, file, indent=2)
+        print(f"baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if (baseline["dialect"], baseline["volumes"], baseline["concurrency"]) != (engine.dialect.name, args.volumes, args.concurrency):
+            print(f"warning: baseline ran on {baseline['dialect']} with {baseline['volumes']} volumes at concurrency {baseline['concurrency']}")
+        found = regressions(results, baseline["routes"], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        print(f"{len(found)} regressions beyond {args.tolerance:.0%}" if found else f"no regression beyond {args.tolerance:.0%}")
+        return 1 if found else 0
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
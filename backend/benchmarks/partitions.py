@@ -0,0 +1,148 @@
+"""
+Check the term partitions and archives of attendances (``utils.partitions``).
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``; on
+PostgreSQL, run ``alembic upgrade head`` first so that attendances is partitioned),
+then:
+
+- on a partitioned table, EXPLAINs the attendance export of one term and checks that
+  only that term's partition is read, and records an attendance in a far-off term
+  without a partition, then checks that ``ensure_partitions`` moves it from the default
+  partition into the partition it creates;
+- archives the oldest term through ``archive_attendances.py``, checks that its rows left
+  the table for the archive file and that the attendance rates of that term did not
+  change, even after a rebuild of the summaries, then restores it.
+
+Exits with status 1 when a check fails.
+
+    python -m benchmarks.partitions
+"""
+
+import asyncio
+import gzip
+import subprocess
+import sys
+import tempfile
+from datetime import date
+
+import httpx
+from sqlalchemy import func, select, text
+
+from app.api import app
+from app.routes.attendances import attendances_export_query
+from benchmarks.dataset import SMALL, seed
+from utils.analytics import rebuild_summaries
+from utils.database import AsyncSessionLocal, engine
+from utils.models import Attendance, Student
+from utils.partitions import DEFAULT_PARTITION, ensure_partitions, is_partitioned, partition_name
+from utils.rollups import quarter_of
+
+# A term far enough ahead to have no partition yet
+FAR_TERM = date(2090, 2, 1)
+
+
+def report(ok: bool, message: str) -> int:
+    print(f"{'ok' if ok else 'FAIL':>4}  {message}", flush=True)
+    return not ok
+
+
+def relations(plan: dict) -> set[str]:
+    """Tables read by a JSON plan."""
+    found = {plan["Relation Name"]} if "Relation Name" in plan else set()
+    for child in plan.get("Plans", []):
+        found |= relations(child)
+    return found
+
+
+async def pruning(term: str) -> int:
+    query = attendances_export_query(None, None, term, None, None)
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    async with AsyncSessionLocal() as db:
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+    read = relations(plan[0]["Plan"])
+    return report(read == {partition_name(term)}, f"export of {term} reads {', '.join(sorted(read))}")
+
+
+async def default_partition(client: httpx.AsyncClient) -> int:
+    async with AsyncSessionLocal() as db:
+        student_id = await db.scalar(select(func.min(Student.id)))
+    created = (await client.post("/attendances", json={"student_id": student_id, "course_id": 1, "date": FAR_TERM.isoformat()})).raise_for_status().json()
+    async with AsyncSessionLocal() as db:
+        before = await db.scalar(text("SELECT tableoid::regclass::text FROM attendances WHERE id = :id"), {"id": created["id"]})
+        terms = await ensure_partitions(db, FAR_TERM)
+        after = await db.scalar(text("SELECT tableoid::regclass::text FROM attendances WHERE id = :id"), {"id": created["id"]})
+    (await client.delete(f"/attendances/{created['id']}")).raise_for_status()
+    async with AsyncSessionLocal() as db:
+        for term in terms:
+            await db.execute(text(f"DROP TABLE {partition_name(term)}"))
+        await db.commit()
+    term = quarter_of(FAR_TERM)
+    return report(before == DEFAULT_PARTITION and after == partition_name(term),
+                  f"attendance of {term} moved from {before} to {after} by ensure_partitions (created {', '.join(terms)})")
+
+
+async def rates(client: httpx.AsyncClient, student_id: int, term: str) -> tuple:
+    student = (await client.get(f"/attendances/rates/students/{student_id}", params={"quarter": term})).raise_for_status().json()
+    weeks = (await client.get("/attendances/rates/weeks", params={"quarter": term})).raise_for_status().json()
+    return student, weeks
+
+
+def archive_command(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "archive_attendances.py", *args], capture_output=True, text=True)
+
+
+async def archival(client: httpx.AsyncClient) -> int:
+    failures = 0
+    async with AsyncSessionLocal() as db:
+        first = await db.scalar(select(func.min(Attendance.date)))
+        term = quarter_of(first)
+        stored = await db.scalar(select(func.count(Attendance.id)).where(Attendance.date >= first))
+        student_id = await db.scalar(select(Attendance.student_id).where(Attendance.date == first).limit(1))
+    before = await rates(client, student_id, term)
+
+    with tempfile.TemporaryDirectory() as directory:
+        archived = archive_command("archive", term, "--directory", directory)
+        async with AsyncSessionLocal() as db:
+            left = await db.scalar(select(func.count(Attendance.id)).where(Attendance.date >= first))
+        path = f"{directory}/{partition_name(term)}.csv.gz"
+        with gzip.open(path, "rt") as file:
+            written = sum(1 for _ in file) - 1
+        failures += report(archived.returncode == 0 and left == 0 and written > 0,
+                           f"{archived.stdout.strip() or archived.stderr.strip()}; {left} rows of {term} left in the table")
+        failures += report(await rates(client, student_id, term) == before, f"rates of {term} unchanged once archived")
+        async with AsyncSessionLocal() as db:
+            await rebuild_summaries(db)
+            await db.commit()
+        failures += report(await rates(client, student_id, term) == before, f"rates of {term} unchanged after a rebuild of the summaries")
+
+        again = archive_command("archive", term, "--directory", directory)
+        failures += report(again.returncode == 2, f"archiving {term} again: {again.stderr.strip()}")
+        restored = archive_command("restore", term)
+        async with AsyncSessionLocal() as db:
+            count = await db.scalar(select(func.count(Attendance.id)).where(Attendance.date >= first))
+        failures += report(restored.returncode == 0 and count == stored,
+                           f"{restored.stdout.strip() or restored.stderr.strip()}; {count} rows from {term} on ({stored} before)")
+    return failures
+
+
+async def run() -> int:
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        async with AsyncSessionLocal() as db:
+            partitioned = await is_partitioned(db)
+            first = await db.scalar(select(func.min(Attendance.date)))
+        print(f"      {engine.dialect.name}, attendances {'partitioned' if partitioned else 'not partitioned'}", flush=True)
+        if partitioned:
+            failures += await pruning(quarter_of(first))
+            failures += await default_partition(client)
+        failures += await archival(client)
+    return failures
+
+
+async def main() -> int:
+    seed(engine, SMALL)
+    return 1 if await run() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,185 @@
+"""
+Speed and capacity checks of the bulk placement (``POST /students/placement``).
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), then adds
+a degree whose classrooms cover every ``(day, time_slot)``, with seats for nine in ten of
+``--students`` students, and the students, all waiting in an extra classroom of the
+degree. Through ``httpx.ASGITransport``:
+
+- places every student in one request, each asking for a time slot, a day and a time
+  slot, or neither (which leaves it where it is), and checks the time taken and the
+  outcomes: students find no seat only when their slots are full;
+- frees the classrooms, then places the students again as ``--concurrent`` requests of
+  interleaved students sent at once, asking for the same slots;
+- after each, checks that no classroom of the degree is over its capacity, that every
+  ``enrolled`` counter matches its students, and that the students placed are the ones
+  in their classroom.
+
+Deletes what it added and exits with status 1 when a check fails or the single request
+takes more than ``--max-seconds``.
+
+    python -m benchmarks.placement --students 10000
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date
+
+import httpx
+from sqlalchemy import delete, func, insert, select, update
+
+from app.api import app
+from benchmarks.dataset import DAYS, SMALL, TIME_SLOTS, seed
+from utils.database import AsyncSessionLocal, engine
+from utils.models import Classroom, Degree, Student
+from utils.occupancy import recount_enrolled
+
+# Classrooms of the degree per (day, time_slot)
+CLASSROOMS_PER_SLOT = 4
+# Seats of the classrooms for this share of the students
+SEATS_SHARE = 0.9
+WAITING = "waiting"
+
+
+def report(ok: bool, message: str) -> int:
+    print(f"{'ok' if ok else 'FAIL':>4}  {message}", flush=True)
+    return not ok
+
+
+async def create_degree(students: int, tag: str, rng: random.Random) -> tuple[int, int, list[int]]:
+    """The degree, its waiting classroom and its students' ids."""
+    slots = [(day, time_slot) for day in DAYS for time_slot in TIME_SLOTS]
+    seats = int(students * SEATS_SHARE)
+    count = len(slots) * CLASSROOMS_PER_SLOT
+    async with AsyncSessionLocal() as db:
+        degree = Degree(name=tag, level="placement")
+        db.add(degree)
+        await db.flush()
+        await db.execute(insert(Classroom), [
+            {"name": f"{tag} {n}", "degree_id": degree.id, "capacity": seats // count + (n < seats % count), "enrolled": 0, "day": day, "time_slot": time_slot}
+            for n, (day, time_slot) in enumerate(slot for slot in slots for _ in range(CLASSROOMS_PER_SLOT))
+        ])
+        waiting = Classroom(name=f"{tag} {WAITING}", degree_id=degree.id, capacity=students, enrolled=students, day=WAITING, time_slot=WAITING)
+        db.add(waiting)
+        await db.flush()
+        await db.execute(insert(Student), [
+            {"first_name": "Placement", "last_name": f"{tag} {n}", "birth_date": date(2012, 1, 1), "degree_id": degree.id,
+             "classroom_id": waiting.id, "mentor_id": rng.randint(1, SMALL.mentors), "state": "pending"}
+            for n in range(students)
+        ])
+        ids = list((await db.scalars(select(Student.id).where(Student.degree_id == degree.id).order_by(Student.id))).all())
+        await db.commit()
+        return degree.id, waiting.id, ids
+
+
+def requests(ids: list[int], rng: random.Random) -> list[dict]:
+    """Each student asks for a time slot, a day and a time slot, or neither (one in twenty)."""
+    wanted = []
+    for student_id in ids:
+        kind = rng.random()
+        request = {"student_id": student_id}
+        if kind >= 0.05:
+            request["time_slot"] = rng.choice(TIME_SLOTS)
+        if kind >= 0.6:
+            request["day"] = rng.choice(DAYS)
+        wanted.append(request)
+    return wanted
+
+
+async def check_classrooms(degree_id: int, wanted: list[dict], outcomes: list[dict]) -> int:
+    """Check the degree's classrooms against their capacity, their counters and the outcomes.
+
+    A student left without a seat must have found every classroom of its slots full.
+    """
+    async with AsyncSessionLocal() as db:
+        counted = select(func.count(Student.id)).where(Student.classroom_id == Classroom.id).scalar_subquery()
+        classrooms = (await db.execute(
+            select(Classroom.id, Classroom.day, Classroom.time_slot, Classroom.capacity, Classroom.enrolled, counted.label("students")).where(Classroom.degree_id == degree_id)
+        )).all()
+        placed = {outcome["student_id"]: outcome["classroom_id"] for outcome in outcomes if outcome["status"] == "placed"}
+        where = dict((await db.execute(select(Student.id, Student.classroom_id).where(Student.id.in_(placed)))).all()) if placed else {}
+    over = [classroom.id for classroom in classrooms if classroom.students > classroom.capacity]
+    wrong = [classroom.id for classroom in classrooms if classroom.enrolled != classroom.students]
+    misplaced = sum(where.get(student_id) != classroom_id for student_id, classroom_id in placed.items())
+    free = Counter()
+    for classroom in classrooms:
+        free[classroom.day, classroom.time_slot] += classroom.capacity - classroom.students
+    requests_by_id = {request["student_id"]: request for request in wanted}
+    seatless = [requests_by_id[outcome["student_id"]] for outcome in outcomes if outcome["status"] == "no_seat"]
+    overlooked = sum(
+        any(free[day, time_slot] for day, time_slot in free if request.get("day", day) == day and request.get("time_slot", time_slot) == time_slot)
+        for request in seatless
+    )
+    return report(not over and not wrong and not misplaced and not overlooked,
+                  f"{len(over)} classrooms over capacity, {len(wrong)} wrong counters, {misplaced} students not where placed, "
+                  f"{overlooked} left without a seat while one was free")
+
+
+def summary(outcomes: list[dict]) -> str:
+    return ", ".join(f"{count} {status}" for status, count in sorted(Counter(outcome["status"] for outcome in outcomes).items()))
+
+
+async def run(students: int, concurrent: int, max_seconds: float, random_seed: int) -> int:
+    rng = random.Random(random_seed)
+    tag = f"Placement{rng.randrange(10**9)}"
+    degree_id, waiting_id, ids = await create_degree(students, tag, rng)
+    seats = int(students * SEATS_SHARE)
+    failures = 0
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+            wanted = requests(ids, rng)
+            start = time.perf_counter()
+            response = await client.post("/students/placement", json={"degree_id": degree_id, "students": wanted})
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            outcomes = response.json()
+            statuses = Counter(outcome["status"] for outcome in outcomes)
+            staying = sum("time_slot" not in request for request in wanted)
+            failures += report(
+                elapsed <= max_seconds and statuses["placed"] <= seats and statuses["unchanged"] == staying
+                and [outcome["student_id"] for outcome in outcomes] == ids,
+                f"one request of {students} students in {elapsed:.2f} s: {summary(outcomes)}",
+            )
+            failures += await check_classrooms(degree_id, wanted, outcomes)
+
+            # Back to the waiting classroom, and placed again by concurrent requests
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Student).where(Student.degree_id == degree_id).values(classroom_id=waiting_id))
+                await recount_enrolled(db)
+                await db.commit()
+            batches = [wanted[n::concurrent] for n in range(concurrent)]
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(client.post("/students/placement", json={"degree_id": degree_id, "students": batch}) for batch in batches))
+            elapsed = time.perf_counter() - start
+            outcomes = [outcome for response in responses for outcome in response.raise_for_status().json()]
+            statuses = Counter(outcome["status"] for outcome in outcomes)
+            failures += report(statuses["placed"] <= seats and statuses["unchanged"] == staying,
+                               f"{concurrent} concurrent requests of {len(batches[0])} students in {elapsed:.2f} s: {summary(outcomes)}")
+            failures += await check_classrooms(degree_id, wanted, outcomes)
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Student).where(Student.degree_id == degree_id))
+            await db.execute(delete(Classroom).where(Classroom.degree_id == degree_id))
+            await db.execute(delete(Degree).where(Degree.id == degree_id))
+            await db.commit()
+    return failures
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--concurrent", type=int, default=4, help="requests of the concurrent placement")
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="longest time the single request may take")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    return 1 if await run(args.students, args.concurrent, args.max_seconds, args.seed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
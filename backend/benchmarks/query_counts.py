@@ -0,0 +1,87 @@
+"""
+Check the SQL statement budget of the routes.
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), then
+requests each paginated list with growing ``limit`` values, and each other route once,
+under ``utils.testing.assert_max_queries``. Exits with status 1 if a route goes over
+its budget or if its count grows with the page size, which is the signature of an N+1
+fetch, so it can gate CI like a test.
+
+    python -m benchmarks.query_counts
+"""
+
+import argparse
+import asyncio
+import sys
+
+import httpx
+
+from app.api import app
+from benchmarks.dataset import SMALL, seed
+from utils.database import engine
+from utils.testing import QueryBudgetExceeded, assert_max_queries
+
+# Paginated routes, requested with each --limits value, and their statement budget
+ROUTES = {
+    "/students?include=degree,classroom,mentor": 1,
+    "/students/filter?state=active&include=degree,classroom,mentor": 1,
+    "/students/degree/3?include=classroom": 1,
+    "/courses?include=degree": 1,
+    "/classrooms?include=degree": 1,
+    "/degrees": 1,
+    "/mentors": 1,
+    "/attendances": 1,
+    "/payments?include=mentor": 1,
+    "/payments/mentors/42?include=mentor": 1,
+    "/payments/outstanding": 1,
+}
+
+# Other routes, requested once
+SINGLE_ROUTES = {
+    "/students/42?include=degree,classroom,mentor": 1,
+    "/students/batch?ids=1,2,3,4,5": 1,
+    "/classrooms/availability": 1,
+    "/payments/report?group_by=mentor": 1,
+    "/attendances/rates/students/42": 2,
+    "/attendances/rates/courses": 1,
+    "/attendances/rates/classrooms": 1,
+    "/attendances/rates/weeks": 1,
+}
+
+
+async def count(client: httpx.AsyncClient, route: str, budget: int, **params) -> tuple[int, bool]:
+    """Statements executed by one request, and whether they fit in ``budget``."""
+    try:
+        with assert_max_queries(budget) as statements:
+            response = await client.get(route, params=params or None)
+            response.raise_for_status()
+    except QueryBudgetExceeded:
+        return len(statements), False
+    return len(statements), True
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://counts") as client:
+        for route, budget in ROUTES.items():
+            results = [await count(client, route, budget, limit=limit) for limit in args.limits]
+            counts = [statements for statements, _ in results]
+            within = all(fits for _, fits in results)
+            status = "OVER" if not within else "GROWS" if len(set(counts)) > 1 else "ok"
+            failures += status != "ok"
+            print(f"{status:<6} {' '.join(f'{statements:>3}' for statements in counts)}  (budget {budget})  {route}")
+        for route, budget in SINGLE_ROUTES.items():
+            statements, within = await count(client, route, budget)
+            failures += not within
+            print(f"{'ok' if within else 'OVER':<6} {statements:>3}  (budget {budget})  {route}")
+    print(f"{failures} routes over budget or issuing more statements for larger pages" if failures else f"all routes within budget, counts constant for limits {args.limits}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
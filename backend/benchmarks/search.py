@@ -0,0 +1,92 @@
+"""
+Student search on a large table: the previous ``ILIKE '%q%'`` scan vs ``utils.search``.
+
+Seeds ``--students`` deterministic names (100k by default) if the table is empty, then
+times both paths over a fixed mix of full names, prefixes and typos. On PostgreSQL the
+new path uses the pg_trgm index; on SQLite it uses the in-process trigram index, whose
+one-off build time is reported separately.
+
+    python -m benchmarks.search --students 100000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_, select
+
+from utils import search
+from utils.database import AsyncSessionLocal, Base, SessionLocal, engine
+from utils.models import Student
+
+FIRST_NAMES = ["Adam", "Aicha", "Ali", "Amina", "Bilal", "Camille", "Fatima", "Hamza", "Ibrahim", "Ines", "Karim", "Khadija", "Lina", "Louis", "Maryam", "Mohamed", "Nour", "Omar", "Sarah", "Yasmine", "Youssef", "Zakaria"]
+LAST_NAMES = ["Benali", "Bernard", "Bouzid", "Chevalier", "Dubois", "Durand", "El Amrani", "Fontaine", "Haddad", "Lefebvre", "Mansouri", "Martin", "Mercier", "Moreau", "Petit", "Rahmani", "Richard", "Robert", "Saidi", "Thomas", "Touati", "Ziani"]
+QUERIES = ["Mohamed", "moh", "Mohamad", "Benali", "benal", "Bouzidd", "Yasmine Haddad", "dub", "El Amrani", "Chevallier"]
+
+
+def seed(count: int) -> None:
+    """Insert ``count`` students with deterministic names if the table is empty."""
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.scalar(select(func.count(Student.id))) >= count:
+            return
+        rng = random.Random(42)
+        rows, names = [], set()
+        for _ in range(count):
+            row = {
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": f"{rng.choice(LAST_NAMES)}{rng.randrange(1000) if rng.random() < 0.5 else ''}",
+                "birth_date": datetime(2005 + rng.randrange(10), 1 + rng.randrange(12), 1 + rng.randrange(28)),
+                "state": "active",
+            }
+            # (first name, last name, birth date) is unique
+            while (row["first_name"], row["last_name"], row["birth_date"]) in names:
+                row["birth_date"] += timedelta(days=1)
+            names.add((row["first_name"], row["last_name"], row["birth_date"]))
+            rows.append(row)
+        for start in range(0, count, 10000):
+            db.execute(insert(Student), rows[start:start + 10000])
+        db.commit()
+
+
+async def time_queries(run, repeat: int) -> float:
+    """Average milliseconds per query of ``run`` over ``repeat`` passes of QUERIES."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            await run(query)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(QUERIES))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.students)
+    async with AsyncSessionLocal() as db:
+
+        async def legacy(query: str):
+            pattern = f"%{query}%"
+            return (await db.scalars(select(Student).where(or_(Student.first_name.ilike(pattern), Student.last_name.ilike(pattern))))).all()
+
+        async def indexed(query: str):
+            return await search.search_students(db, query, args.limit)
+
+        if db.bind.dialect.name != "postgresql":
+            start = time.perf_counter()
+            await search.trigram_index.load(db)
+            print(f"in-process index build: {(time.perf_counter() - start) * 1000:8.1f} ms")
+        print(f"ilike scan:             {await time_queries(legacy, args.repeat):8.2f} ms/query")
+        print(f"trigram search:         {await time_queries(indexed, args.repeat):8.2f} ms/query")
+        for query in ("Mohamad", "benal"):
+            hits = await search.search_students(db, query, 3)
+            print(f"  {query!r}: " + ", ".join(f"{s.first_name} {s.last_name} ({score:.2f})" for s, score in hits))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
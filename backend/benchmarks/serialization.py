@@ -0,0 +1,105 @@
+"""
+List responses through Pydantic models vs the ``utils.serialization`` fast path.
+
+Seeds the dataset (see ``benchmarks.dataset``) if needed, then for students, attendances
+and payments compares, on pages of ``--limit`` rows:
+
+- encode: ORM objects validated and dumped through ``Page[XResponse]`` as FastAPI does,
+  vs column rows encoded by ``RowSerializer``;
+- route: a copy of the previous ORM-returning route vs the current one, called through
+  the ASGI app. Both bodies are compared byte for byte before timing.
+
+    python -m benchmarks.serialization --limit 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app.api import app
+from app.routes.attendances import AttendanceResponse, attendance_rows
+from app.routes.payments import PaymentResponse, payment_rows
+from app.routes.students import StudentResponse, student_rows
+from benchmarks.dataset import SMALL, seed
+from utils.database import AsyncSessionLocal, engine, get_async_db
+from utils.models import Attendance, Payment, Student
+from utils.pagination import Page, PageParams, paginate
+
+CASES = [
+    ("students", Student, StudentResponse, student_rows, (Student.id,)),
+    ("attendances", Attendance, AttendanceResponse, attendance_rows, (Attendance.date, Attendance.id)),
+    ("payments", Payment, PaymentResponse, payment_rows, (Payment.id,)),
+]
+
+
+def model_route_app() -> FastAPI:
+    """The list routes as they were before the fast path: ORM objects returned as Page[XResponse]."""
+    legacy = FastAPI()
+    for name, entity, response, _, keys in CASES:
+        def route(entity=entity, keys=keys):
+            async def list_rows(page: PageParams = Depends(PageParams), db=Depends(get_async_db)):
+                return await paginate(db, select(entity), page, keys)
+            return list_rows
+        legacy.get(f"/{name}", response_model=Page[response])(route())
+    return legacy
+
+
+def per_call(run, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+async def per_request(client: httpx.AsyncClient, url: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        (await client.get(url)).raise_for_status()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    page = PageParams(limit=args.limit, cursor=None)
+    print(f"{'':<12} {'model ms':>9} {'fast ms':>9} {'speedup':>8}")
+    async with AsyncSessionLocal() as db:
+        for name, entity, response, rows, keys in CASES:
+            objects = await paginate(db, select(entity), page, keys)
+            columns = await paginate(db, rows.select(), page, keys, rows=True)
+            adapter = TypeAdapter(Page[response])
+
+            def model_path():
+                payload = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+                return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+            model_ms = per_call(model_path, args.repeat)
+            fast_ms = per_call(lambda: rows.encode_page(columns), args.repeat)
+            print(f"{'encode ' + name:<20} {model_ms:9.2f} {fast_ms:9.2f} {model_ms / fast_ms:7.1f}x")
+
+    legacy = httpx.AsyncClient(transport=httpx.ASGITransport(app=model_route_app()), base_url="http://model")
+    current = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fast")
+    async with legacy, current:
+        for name, *_ in CASES:
+            url = f"/{name}?limit={args.limit}"
+            expected, actual = (await legacy.get(url)).content, (await current.get(url)).content
+            if expected != actual:
+                raise SystemExit(f"/{name}: fast path body differs from the model path")
+            model_ms = await per_request(legacy, url, args.repeat)
+            fast_ms = await per_request(current, url, args.repeat)
+            print(f"{'route ' + name:<20} {model_ms:9.2f} {fast_ms:9.2f} {model_ms / fast_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
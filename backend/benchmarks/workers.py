@@ -0,0 +1,115 @@
+"""
+Throughput of the production server as the number of worker processes grows.
+
+For each ``--workers`` count, starts ``main.py --production`` on a local port against
+the database configured by ``DATABASE_URL`` (seeded with ``benchmarks.dataset`` if
+empty), waits for it to answer, then sends ``--requests`` requests over real HTTP from
+``--clients`` load-generating processes with ``--concurrency`` requests in flight each.
+The route mix is read-heavy: students by id with their relations, student and payment
+pages, classroom availability and attendance rates. Each worker sizes its connection
+pool for the worker count (see ``utils.database.pool_sizes``).
+
+    python -m benchmarks.workers --workers 1 2 4 8 --requests 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.dataset import SMALL, seed
+from utils.database import engine, pool_sizes
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = [
+    lambda rng: f"/students/{rng.randint(1, SMALL.students)}?include=degree,classroom,mentor",
+    lambda rng: f"/students/degree/{rng.randint(1, SMALL.degrees)}?limit=50",
+    lambda rng: f"/payments/mentors/{rng.randint(1, SMALL.mentors)}?limit=20",
+    lambda rng: "/classrooms/availability",
+    lambda rng: f"/attendances/rates/students/{rng.randint(1, SMALL.students)}",
+]
+
+
+async def drive(base_url: str, requests: int, concurrency: int, random_seed: int) -> int:
+    """Send ``requests`` GETs with ``concurrency`` in flight, return the number of failures."""
+    rng = random.Random(random_seed)
+    paths = [rng.choice(PATHS)(rng) for _ in range(requests)]
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        queue = iter(paths)
+
+        async def worker() -> None:
+            nonlocal errors
+            for path in queue:
+                try:
+                    response = await client.get(path)
+                    errors += response.status_code >= 500
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return errors
+
+
+def client_process(base_url: str, requests: int, concurrency: int, random_seed: int) -> int:
+    return asyncio.run(drive(base_url, requests, concurrency, random_seed))
+
+
+def wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"the server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"the server did not answer within {timeout:.0f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=4, help="load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per client")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, "main.py", "--production", "--workers", str(workers), "--port", str(args.port)], cwd=BACKEND,
+            env={**os.environ, "SLOW_QUERY_MS": "0"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(base_url, server)
+            # Warm up each worker's pool and caches before timing
+            client_process(base_url, 50 * workers, args.concurrency, 0)
+            per_client = args.requests // args.clients
+            start = time.perf_counter()
+            with ProcessPoolExecutor(args.clients) as pool:
+                errors = sum(pool.map(client_process, [base_url] * args.clients, [per_client] * args.clients, [args.concurrency] * args.clients, range(1, args.clients + 1)))
+            throughput = per_client * args.clients / (time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or throughput
+        pool_size, max_overflow = pool_sizes(workers)
+        print(f"{workers:>3} workers: {throughput:8.1f} req/s  x{throughput / baseline:.2f}  {errors} errors  (pool {pool_size} + {max_overflow} overflow per worker)", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Latency and SQL statements of the PUT, PATCH and DELETE routes.
+
+Seeds the database configured by ``DATABASE_URL`` (see ``benchmarks.dataset``), creates
+``--rows`` rows of each resource, then updates and deletes them one request at a time
+through ``httpx.ASGITransport``. Each route reports its p50/p95 latency and the
+statements it ran per request, against its budget (see ``utils.writes``: one
+``UPDATE``/``DELETE ... RETURNING`` plus the side effects on counters and rollups, and
+the change feed event on PostgreSQL).
+Exits with status 1 when a route goes over its budget.
+
+    python -m benchmarks.writes --rows 500
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.api import app
+from benchmarks.dataset import SMALL, seed
+from utils.database import engine
+from utils.testing import count_queries
+
+# Statement budget per request of each write route. SQLite reads the previous values
+# with a SELECT of their own, so the routes with side effects get one more there;
+# PostgreSQL sends the change feed NOTIFY (utils.changes), one more on every route.
+BUDGETS = {
+    "PATCH /degrees/{degree_id}": 1,
+    "PUT /degrees/{degree_id}": 1,
+    "PATCH /mentors/{mentor_id}": 1,
+    "PATCH /courses/{course_id}": 1,
+    "PATCH /classrooms/{classroom_id}": 1,
+    "PATCH /students/{student_id}": 3,
+    "PUT /students/{student_id}": 3,
+    "PATCH /attendances/{attendance_id}": 6,
+    "PATCH /payments/{payment_id}": 6,
+    "PUT /payments/{payment_id}": 6,
+    "DELETE /payments/{payment_id}": 3,
+    "DELETE /attendances/{attendance_id}": 3,
+    "DELETE /students/{student_id}": 3,
+    "DELETE /courses/{course_id}": 2,
+    "DELETE /mentors/{mentor_id}": 3,
+}
+
+
+async def create(client: httpx.AsyncClient, path: str, body: dict) -> dict:
+    response = await client.post(path, json=body)
+    response.raise_for_status()
+    return response.json()
+
+
+async def measure(client: httpx.AsyncClient, route: str, requests: list[tuple[str, dict | None]]) -> dict:
+    """Send ``requests`` (url, body) one by one with the method of ``route``; time and count them."""
+    method = route.split()[0]
+    latencies, statements, errors = [], [], 0
+    for url, body in requests:
+        with count_queries() as queries:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+        statements.append(len(queries))
+        errors += response.status_code != 200
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p95": statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+        "statements": max(statements),
+        "errors": errors,
+    }
+
+
+async def run(rows: int, random_seed: int) -> dict[str, dict]:
+    rng = random.Random(random_seed)
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        tag = rng.randrange(10**9)
+        degree = await create(client, "/degrees", {"name": f"bench {tag}", "level": "1"})
+        classrooms = [await create(client, "/classrooms", {"name": f"bench {tag} {n}", "degree_id": degree["id"], "capacity": rows, "day": "monday", "time_slot": "morning"}) for n in range(2)]
+        mentors, courses, students, attendances, payments = [], [], [], [], []
+        for n in range(rows):
+            mentors.append(await create(client, "/mentors", {"first_name": "Bench", "last_name": str(n), "email": f"bench{tag}.{n}@example.com", "phone": "0600000000"}))
+            courses.append(await create(client, "/courses", {"name": f"bench {n}", "description": "", "duration": 1, "degree_id": degree["id"]}))
+            students.append(await create(client, "/students", {"first_name": "Bench", "last_name": str(n), "birth_date": "2010-01-01", "degree_id": degree["id"], "classroom_id": classrooms[0]["id"], "mentor_id": mentors[n]["id"], "state": "active"}))
+            attendances.append(await create(client, "/attendances", {"student_id": students[n]["id"], "course_id": courses[n]["id"], "date": "2030-01-07"}))
+            payments.append(await create(client, f"/payments/{mentors[n]['id']}", {"amount": 10, "date": "2030-01-07T10:00:00", "mentor_id": mentors[n]["id"], "state": "pending", "student_id": students[n]["id"]}))
+
+        results["PATCH /degrees/{degree_id}"] = await measure(client, "PATCH /degrees/{degree_id}", [(f"/degrees/{degree['id']}", {"level": str(n % 5 + 1)}) for n in range(rows)])
+        results["PUT /degrees/{degree_id}"] = await measure(client, "PUT /degrees/{degree_id}", [(f"/degrees/{degree['id']}", {"name": f"bench {tag}", "level": str(n % 5 + 1)}) for n in range(rows)])
+        results["PATCH /mentors/{mentor_id}"] = await measure(client, "PATCH /mentors/{mentor_id}", [(f"/mentors/{m['id']}", {"phone": "0611111111"}) for m in mentors])
+        results["PATCH /courses/{course_id}"] = await measure(client, "PATCH /courses/{course_id}", [(f"/courses/{c['id']}", {"duration": 2}) for c in courses])
+        results["PATCH /classrooms/{classroom_id}"] = await measure(client, "PATCH /classrooms/{classroom_id}", [(f"/classrooms/{c['id']}", {"capacity": rows + 1}) for c in classrooms])
+        results["PATCH /students/{student_id}"] = await measure(client, "PATCH /students/{student_id}", [(f"/students/{s['id']}", {"classroom_id": classrooms[1]["id"]}) for s in students])
+        results["PUT /students/{student_id}"] = await measure(client, "PUT /students/{student_id}", [(f"/students/{s['id']}", {**s, "classroom_id": classrooms[0]["id"], "first_name": "Benched"}) for s in students])
+        results["PATCH /attendances/{attendance_id}"] = await measure(client, "PATCH /attendances/{attendance_id}", [(f"/attendances/{a['id']}", {"date": "2030-01-14"}) for a in attendances])
+        results["PATCH /payments/{payment_id}"] = await measure(client, "PATCH /payments/{payment_id}", [(f"/payments/{p['id']}", {"state": "paid", "date": "2030-04-07T10:00:00"}) for p in payments])
+        results["PUT /payments/{payment_id}"] = await measure(client, "PUT /payments/{payment_id}", [(f"/payments/{p['id']}", {"amount": 20, "date": "2030-07-07T10:00:00", "mentor_id": p["mentor_id"]}) for p in payments])
+
+        results["DELETE /payments/{payment_id}"] = await measure(client, "DELETE /payments/{payment_id}", [(f"/payments/{p['id']}", None) for p in payments])
+        results["DELETE /attendances/{attendance_id}"] = await measure(client, "DELETE /attendances/{attendance_id}", [(f"/attendances/{a['id']}", None) for a in attendances])
+        results["DELETE /students/{student_id}"] = await measure(client, "DELETE /students/{student_id}", [(f"/students/{s['id']}", None) for s in students])
+        results["DELETE /courses/{course_id}"] = await measure(client, "DELETE /courses/{course_id}", [(f"/courses/{c['id']}", None) for c in courses])
+        results["DELETE /mentors/{mentor_id}"] = await measure(client, "DELETE /mentors/{mentor_id}", [(f"/mentors/{m['id']}", None) for m in mentors])
+        for classroom in classrooms:
+            await client.delete(f"/classrooms/{classroom['id']}")
+        await client.delete(f"/degrees/{degree['id']}")
+    return results
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="rows of each resource to update and delete")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seed(engine, SMALL)
+    results = await run(args.rows, args.seed)
+    failures = 0
+    for route, result in results.items():
+        budget = BUDGETS[route] + (engine.dialect.name == "postgresql")
+        over = result["statements"] > budget or result["errors"]
+        failures += bool(over)
+        print(f"{'OVER' if over else 'ok':>4}  {route:<36} p50 {result['p50']:6.2f} ms  p95 {result['p95']:6.2f} ms  "
+              f"{result['statements']}/{budget} statements  {result['errors']} errors", flush=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import sys
+
+from fastapi import HTTPException
+
+from app.routes.mentors import mentor_import
+from app.routes.students import student_import
+from utils.database import AsyncSessionLocal
+
+IMPORTS = {"students": student_import, "mentors": mentor_import}
+
+# Bytes read from the file at a time
+READ_SIZE = 1 << 16
+
+
+async def read(path: str):
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_SIZE):
+            yield chunk
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Create or update students or mentors from a CSV file, as POST /students/import and /mentors/import do.")
+    parser.add_argument("resource", choices=IMPORTS)
+    parser.add_argument("path", help="CSV file with a header row of the resource's fields")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            report = await IMPORTS[args.resource].run(db, read(args.path))
+        except HTTPException as error:
+            print(error.detail, file=sys.stderr)
+            return 2
+    for error in report.errors:
+        print(f"line {error.line}: {'; '.join(error.errors)}", file=sys.stderr)
+    print(f"{report.rows} rows: {report.created} created, {report.updated} updated, {report.failed} failed")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,5 +1,21 @@
+import argparse
+import os
+
 import uvicorn
 
+from utils.settings import WEB_PORT
+
 
 if __name__ == "__main__":
-    uvicorn.run("app.api:app", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Run the API server: a reloading development server, or several workers with --production.")
+    parser.add_argument("--production", action="store_true", help="run worker processes without the file watcher")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS") or os.cpu_count() or 1), help="worker processes in production (default: WEB_WORKERS, else one per CPU)")
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    args = parser.parse_args()
+
+    if args.production:
+        # Workers size their connection pool from WEB_WORKERS (see utils/database.py)
+        os.environ["WEB_WORKERS"] = str(args.workers)
+        uvicorn.run("app.api:app", host="0.0.0.0", port=args.port, workers=args.workers, proxy_headers=True, access_log=False)
+    else:
+        uvicorn.run("app.api:app", host="0.0.0.0", port=args.port, reload=True)
@@ -0,0 +1,154 @@
+"""initial schema
+
+Tables as created by ``Base.metadata.create_all`` before migrations existed.
+Databases created that way should be stamped with ``alembic stamp 0001`` instead
+of upgraded through this revision.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('degrees',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('level', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_degrees_id'), 'degrees', ['id'], unique=False)
+    op.create_index(op.f('ix_degrees_name'), 'degrees', ['name'], unique=False)
+    op.create_table('mentors',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('first_name', sa.String(), nullable=True),
+    sa.Column('last_name', sa.String(), nullable=True),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('password', sa.String(), nullable=True),
+    sa.Column('registered_at', sa.DateTime(), nullable=True),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mentors_email'), 'mentors', ['email'], unique=True)
+    op.create_index(op.f('ix_mentors_first_name'), 'mentors', ['first_name'], unique=False)
+    op.create_index(op.f('ix_mentors_id'), 'mentors', ['id'], unique=False)
+    op.create_index(op.f('ix_mentors_last_name'), 'mentors', ['last_name'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('password', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('classrooms',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('degree_id', sa.Integer(), nullable=True),
+    sa.Column('capacity', sa.Integer(), nullable=True),
+    sa.Column('day', sa.String(), nullable=True),
+    sa.Column('time_slot', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['degree_id'], ['degrees.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_classrooms_id'), 'classrooms', ['id'], unique=False)
+    op.create_index(op.f('ix_classrooms_name'), 'classrooms', ['name'], unique=False)
+    op.create_table('courses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('degree_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['degree_id'], ['degrees.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_courses_id'), 'courses', ['id'], unique=False)
+    op.create_index(op.f('ix_courses_name'), 'courses', ['name'], unique=False)
+    op.create_table('students',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('first_name', sa.String(), nullable=True),
+    sa.Column('last_name', sa.String(), nullable=True),
+    sa.Column('birth_date', sa.DateTime(), nullable=True),
+    sa.Column('degree_id', sa.Integer(), nullable=True),
+    sa.Column('classroom_id', sa.Integer(), nullable=True),
+    sa.Column('mentor_id', sa.Integer(), nullable=True),
+    sa.Column('state', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['classroom_id'], ['classrooms.id'], ),
+    sa.ForeignKeyConstraint(['degree_id'], ['degrees.id'], ),
+    sa.ForeignKeyConstraint(['mentor_id'], ['mentors.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_students_first_name'), 'students', ['first_name'], unique=False)
+    op.create_index(op.f('ix_students_id'), 'students', ['id'], unique=False)
+    op.create_index(op.f('ix_students_last_name'), 'students', ['last_name'], unique=False)
+    op.create_table('attendances',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('course_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attendances_id'), 'attendances', ['id'], unique=False)
+    op.create_table('payments',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('method', sa.String(), nullable=True),
+    sa.Column('state', sa.String(), nullable=True),
+    sa.Column('quarter', sa.String(), nullable=True),
+    sa.Column('mentor_id', sa.Integer(), nullable=True),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['mentor_id'], ['mentors.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_payments_id'), 'payments', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_payments_id'), table_name='payments')
+    op.drop_table('payments')
+    op.drop_index(op.f('ix_attendances_id'), table_name='attendances')
+    op.drop_table('attendances')
+    op.drop_index(op.f('ix_students_last_name'), table_name='students')
+    op.drop_index(op.f('ix_students_id'), table_name='students')
+    op.drop_index(op.f('ix_students_first_name'), table_name='students')
+    op.drop_table('students')
+    op.drop_index(op.f('ix_courses_name'), table_name='courses')
+    op.drop_index(op.f('ix_courses_id'), table_name='courses')
+    op.drop_table('courses')
+    op.drop_index(op.f('ix_classrooms_name'), table_name='classrooms')
+    op.drop_index(op.f('ix_classrooms_id'), table_name='classrooms')
+    op.drop_table('classrooms')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_mentors_last_name'), table_name='mentors')
+    op.drop_index(op.f('ix_mentors_id'), table_name='mentors')
+    op.drop_index(op.f('ix_mentors_first_name'), table_name='mentors')
+    op.drop_index(op.f('ix_mentors_email'), table_name='mentors')
+    op.drop_table('mentors')
+    op.drop_index(op.f('ix_degrees_name'), table_name='degrees')
+    op.drop_index(op.f('ix_degrees_id'), table_name='degrees')
+    op.drop_table('degrees')
@@ -0,0 +1,45 @@
+"""attendance uniqueness and classroom occupancy counter
+
+Removes duplicated (student_id, course_id, date) attendances before adding the unique
+constraint used by bulk roll-call ingestion, and adds ``classrooms.enrolled``,
+backfilled from the students table.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM attendances WHERE id NOT IN ("
+        "SELECT MIN(id) FROM attendances GROUP BY student_id, course_id, date)"
+    )
+    with op.batch_alter_table('attendances') as batch_op:
+        batch_op.create_unique_constraint('uq_attendances_student_course_date', ['student_id', 'course_id', 'date'])
+
+    with op.batch_alter_table('classrooms') as batch_op:
+        batch_op.add_column(sa.Column('enrolled', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE classrooms SET enrolled = ("
+        "SELECT COUNT(students.id) FROM students WHERE students.classroom_id = classrooms.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('classrooms') as batch_op:
+        batch_op.drop_column('enrolled')
+    with op.batch_alter_table('attendances') as batch_op:
+        batch_op.drop_constraint('uq_attendances_student_course_date', type_='unique')
@@ -0,0 +1,49 @@
+"""indexes for foreign keys and route filters
+
+Composite indexes follow the route queries: a filter column followed by the keyset
+pagination order (``id`` or ``date, id``), so each list page is an index range scan.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_students_degree_id_id', 'students', ['degree_id', 'id']),
+    ('ix_students_classroom_id_id', 'students', ['classroom_id', 'id']),
+    ('ix_students_mentor_id_id', 'students', ['mentor_id', 'id']),
+    ('ix_students_state_id', 'students', ['state', 'id']),
+    ('ix_classrooms_degree_id', 'classrooms', ['degree_id']),
+    ('ix_classrooms_day_time_slot', 'classrooms', ['day', 'time_slot']),
+    ('ix_courses_degree_id', 'courses', ['degree_id']),
+    ('ix_attendances_date_id', 'attendances', ['date', 'id']),
+    ('ix_attendances_student_id_date', 'attendances', ['student_id', 'date']),
+    ('ix_attendances_course_id_date', 'attendances', ['course_id', 'date']),
+    ('ix_payments_date_id', 'payments', ['date', 'id']),
+    ('ix_payments_mentor_id_date_id', 'payments', ['mentor_id', 'date', 'id']),
+    ('ix_payments_student_id_date_id', 'payments', ['student_id', 'date', 'id']),
+    ('ix_payments_mentor_id_quarter', 'payments', ['mentor_id', 'quarter']),
+    ('ix_payments_quarter', 'payments', ['quarter']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
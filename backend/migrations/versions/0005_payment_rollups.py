@@ -0,0 +1,55 @@
+"""payment rollup tables for the reporting endpoints
+
+Creates ``payment_rollups`` and ``student_payment_balances`` and fills them from the
+existing payments; the payment routes keep them up to date from then on.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('payment_rollups',
+    sa.Column('quarter', sa.String(), nullable=False),
+    sa.Column('mentor_id', sa.Integer(), nullable=False),
+    sa.Column('method', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('total_amount', sa.Integer(), nullable=False),
+    sa.Column('payment_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('quarter', 'mentor_id', 'method', 'state')
+    )
+    op.create_table('student_payment_balances',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('total_amount', sa.Integer(), nullable=False),
+    sa.Column('payment_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('student_id', 'state')
+    )
+    op.execute(
+        "INSERT INTO payment_rollups (quarter, mentor_id, method, state, total_amount, payment_count) "
+        "SELECT COALESCE(quarter, ''), COALESCE(mentor_id, 0), COALESCE(method, ''), COALESCE(state, ''), COALESCE(SUM(amount), 0), COUNT(id) "
+        "FROM payments GROUP BY COALESCE(quarter, ''), COALESCE(mentor_id, 0), COALESCE(method, ''), COALESCE(state, '')"
+    )
+    op.execute(
+        "INSERT INTO student_payment_balances (student_id, state, total_amount, payment_count) "
+        "SELECT student_id, COALESCE(state, ''), COALESCE(SUM(amount), 0), COUNT(id) "
+        "FROM payments WHERE student_id IS NOT NULL GROUP BY student_id, COALESCE(state, '')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('student_payment_balances')
+    op.drop_table('payment_rollups')
@@ -0,0 +1,65 @@
+"""attendance summary tables for the attendance rate endpoints
+
+Creates ``attendance_weeks`` and ``course_sessions`` and fills them from the existing
+attendances; the attendance routes keep them up to date from then on.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Week number of attendances.date, counted from Monday 1970-01-05 (utils/analytics.py)
+WEEK = {
+    'postgresql': "(CAST(date AS DATE) - DATE '1970-01-05') / 7",
+    'sqlite': "CAST((julianday(date) - julianday('1970-01-05')) / 7 AS INTEGER)",
+}
+
+
+def upgrade() -> None:
+    op.create_table('attendance_weeks',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('week', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('attended', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('student_id', 'week', 'course_id')
+    )
+    op.create_table('course_sessions',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('week', sa.Integer(), nullable=False),
+    sa.Column('attendees', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('course_id', 'date')
+    )
+    op.create_index('ix_course_sessions_week', 'course_sessions', ['week'], unique=False)
+
+    week = WEEK[op.get_bind().dialect.name]
+    op.execute(
+        "INSERT INTO attendance_weeks (student_id, week, course_id, attended) "
+        f"SELECT student_id, {week}, course_id, COUNT(id) FROM attendances "
+        "WHERE student_id IS NOT NULL AND course_id IS NOT NULL AND date IS NOT NULL "
+        f"GROUP BY student_id, {week}, course_id"
+    )
+    op.execute(
+        "INSERT INTO course_sessions (course_id, date, week, attendees) "
+        f"SELECT course_id, date, {week}, COUNT(id) FROM attendances "
+        "WHERE course_id IS NOT NULL AND date IS NOT NULL "
+        "GROUP BY course_id, date"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_course_sessions_week', table_name='course_sessions')
+    op.drop_table('course_sessions')
+    op.drop_table('attendance_weeks')
@@ -0,0 +1,43 @@
+"""unique natural key of students for the CSV import
+
+Adds a unique constraint on (first_name, last_name, birth_date), the key the student
+import upserts on. Duplicated students are referenced by attendances and payments, so
+they are not merged here: the upgrade stops if there are any, to be merged by hand.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DUPLICATES = (
+    "SELECT first_name, last_name, birth_date, COUNT(id) FROM students "
+    "GROUP BY first_name, last_name, birth_date HAVING COUNT(id) > 1"
+)
+
+
+def upgrade() -> None:
+    duplicates = op.get_bind().execute(sa.text(DUPLICATES)).all()
+    if duplicates:
+        raise RuntimeError(
+            f"{len(duplicates)} (first_name, last_name, birth_date) keys are shared by several students, "
+            f"e.g. {tuple(duplicates[0][:3])}; merge them (see: {DUPLICATES}) before upgrading"
+        )
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.create_unique_constraint('uq_students_name_birth_date', ['first_name', 'last_name', 'birth_date'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_constraint('uq_students_name_birth_date', type_='unique')
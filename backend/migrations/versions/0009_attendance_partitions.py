@@ -0,0 +1,114 @@
+"""attendances partitioned by term, attendance archives
+
+On PostgreSQL, rebuilds ``attendances`` as a table partitioned by range of ``date``:
+one partition per term (quarter) from the first stored attendance to two terms after
+today, plus a default partition, with the primary key (id, date) since the key of a
+partitioned table must include the partition column. Ids and their sequence are kept.
+utils/partitions.py creates the partitions of the following terms.
+
+``date`` becomes NOT NULL on both dialects (partition key), and ``attendance_archives``
+records the terms moved out of the table. The upgrade stops if an attendance has no
+date. A downgrade puts the stored rows back in a plain table; archived terms stay in
+their files.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Terms created after the current one (ATTENDANCE_PARTITIONS_AHEAD when written)
+TERMS_AHEAD = 2
+
+COLUMNS = "id, date, student_id, course_id"
+
+
+def term_index(day: date) -> int:
+    return day.year * 4 + (day.month - 1) // 3
+
+
+def term_start(index: int) -> date:
+    return date(index // 4, index % 4 * 3 + 1, 1)
+
+
+def create_constraints() -> None:
+    op.create_unique_constraint('uq_attendances_student_course_date', 'attendances', ['student_id', 'course_id', 'date'])
+    op.create_foreign_key('attendances_student_id_fkey', 'attendances', 'students', ['student_id'], ['id'])
+    op.create_foreign_key('attendances_course_id_fkey', 'attendances', 'courses', ['course_id'], ['id'])
+    op.create_index('ix_attendances_id', 'attendances', ['id'], unique=False)
+    op.create_index('ix_attendances_date_id', 'attendances', ['date', 'id'], unique=False)
+    op.create_index('ix_attendances_student_id_date', 'attendances', ['student_id', 'date'], unique=False)
+    op.create_index('ix_attendances_course_id_date', 'attendances', ['course_id', 'date'], unique=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    undated = bind.execute(sa.text("SELECT COUNT(id) FROM attendances WHERE date IS NULL")).scalar()
+    if undated:
+        raise RuntimeError(f"{undated} attendances have no date; set or delete them before upgrading")
+    op.create_table('attendance_archives',
+    sa.Column('term', sa.String(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('term')
+    )
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('attendances') as batch_op:
+            batch_op.alter_column('date', existing_type=sa.DateTime(), nullable=False)
+        return
+
+    first = bind.execute(sa.text("SELECT MIN(date) FROM attendances")).scalar()
+    today = date.today()
+    op.execute(
+        "CREATE TABLE attendances_partitioned ("
+        "id INTEGER NOT NULL DEFAULT nextval('attendances_id_seq'::regclass), "
+        "date TIMESTAMP WITHOUT TIME ZONE NOT NULL, student_id INTEGER, course_id INTEGER"
+        ") PARTITION BY RANGE (date)"
+    )
+    for index in range(term_index(min(first.date(), today) if first else today), term_index(today) + TERMS_AHEAD + 1):
+        op.execute(
+            f"CREATE TABLE attendances_{index // 4}_q{index % 4 + 1} PARTITION OF attendances_partitioned "
+            f"FOR VALUES FROM ('{term_start(index)}') TO ('{term_start(index + 1)}')"
+        )
+    op.execute("CREATE TABLE attendances_default PARTITION OF attendances_partitioned DEFAULT")
+    op.execute(f"INSERT INTO attendances_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM attendances")
+    op.execute("ALTER SEQUENCE attendances_id_seq OWNED BY attendances_partitioned.id")
+    op.execute("DROP TABLE attendances")
+    op.execute("ALTER TABLE attendances_partitioned RENAME TO attendances")
+    op.create_primary_key('attendances_pkey', 'attendances', ['id', 'date'])
+    create_constraints()
+    op.execute("ANALYZE attendances")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE TABLE attendances_unpartitioned ("
+            "id INTEGER NOT NULL DEFAULT nextval('attendances_id_seq'::regclass), "
+            "date TIMESTAMP WITHOUT TIME ZONE, student_id INTEGER, course_id INTEGER)"
+        )
+        op.execute(f"INSERT INTO attendances_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM attendances")
+        op.execute("ALTER SEQUENCE attendances_id_seq OWNED BY attendances_unpartitioned.id")
+        op.execute("DROP TABLE attendances")
+        op.execute("ALTER TABLE attendances_unpartitioned RENAME TO attendances")
+        op.create_primary_key('attendances_pkey', 'attendances', ['id'])
+        create_constraints()
+    else:
+        with op.batch_alter_table('attendances') as batch_op:
+            batch_op.alter_column('date', existing_type=sa.DateTime(), nullable=True)
+    op.drop_table('attendance_archives')
@@ -0,0 +1,42 @@
+"""
+Fixtures of the test suite.
+
+The tests run the ASGI app through ``httpx.ASGITransport`` on a SQLite database created
+in a temporary directory and seeded once per session with a small ``benchmarks.dataset``
+volume. ``DATABASE_URL`` is set before ``utils.database`` is imported, since its engines
+are created at import time.
+"""
+
+import os
+import tempfile
+
+DATABASE_DIR = tempfile.TemporaryDirectory(prefix="islah-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_DIR.name}/test.db"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.api import app  # noqa: E402
+from benchmarks.dataset import Volumes, seed  # noqa: E402
+from utils.database import engine  # noqa: E402
+
+# Enough rows for the ids named by the routes under test (student 42, mentor 42, degree 3...)
+VOLUMES = Volumes(degrees=5, mentors=50, classrooms=20, courses=10, students=300, attendances=2_000, payments=500)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def database():
+    seed(engine, VOLUMES)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
@@ -0,0 +1,59 @@
+"""Sequence order of the events received by NOTIFY, which arrive in commit order."""
+
+import asyncio
+
+import pytest
+
+import utils.changes
+from utils.changes import RESET, UPDATED, Change, ChangeFeed
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def feed(monkeypatch):
+    monkeypatch.setattr(utils.changes, "CHANGE_FEED_REORDER_MS", 50)
+    feed = ChangeFeed()
+    feed.notified = True
+    yield feed
+    await feed.stop()
+
+
+def change(seq: int) -> Change:
+    return Change(seq, "courses", UPDATED, seq, {"id": seq})
+
+
+def published(feed: ChangeFeed) -> list[int]:
+    return [change.seq for change in feed.buffer]
+
+
+async def test_events_are_published_in_sequence_order(feed):
+    subscription = feed.subscribe()
+    feed.arrived(change(2))
+    feed.arrived(change(3))
+    assert published(feed) == []
+    feed.arrived(change(1))
+    assert published(feed) == [1, 2, 3]
+    assert [change.seq for change in await subscription.next(0)] == [1, 2, 3]
+
+
+async def test_missing_number_is_skipped_after_the_window(feed):
+    feed.arrived(change(1))
+    feed.arrived(change(3))
+    assert published(feed) == [1]
+    await asyncio.sleep(0.1)
+    assert published(feed) == [1, 3]
+    feed.arrived(change(4))
+    assert published(feed) == [1, 3, 4]
+
+
+async def test_late_event_resets_the_clients_that_may_miss_it(feed):
+    subscription = feed.subscribe()
+    feed.arrived(change(1))
+    feed.arrived(change(3))
+    await asyncio.sleep(0.1)
+    await subscription.next(0)
+    feed.arrived(change(2))
+    assert [change.action for change in await subscription.next(0)] == [RESET]
+    assert feed.since(1) is None
+    assert feed.since(3) == []
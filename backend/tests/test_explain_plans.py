@@ -0,0 +1,44 @@
+"""
+No route query falls back to a sequential scan of a large table, on PostgreSQL.
+
+Runs ``benchmarks.explain_plans`` in its own process, since the app's engines are bound
+to the test database at import, against the database named by ``TEST_POSTGRES_URL``
+(which it seeds with the ``SMALL`` dataset the first time, so it should be dedicated to
+it). Skipped when the variable is unset or the database cannot be reached.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+def postgres_available() -> bool:
+    if not TEST_POSTGRES_URL:
+        return False
+    engine = create_engine(TEST_POSTGRES_URL, connect_args={"connect_timeout": 5})
+    try:
+        with engine.connect():
+            return True
+    except OperationalError:
+        return False
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.skipif(not postgres_available(), reason="TEST_POSTGRES_URL is unset or unreachable")
+def test_route_queries_use_an_index():
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.explain_plans"],
+        cwd=BACKEND, env={**os.environ, "DATABASE_URL": TEST_POSTGRES_URL}, capture_output=True, text=True, timeout=600,
+    )
+    output = result.stdout + result.stderr
+    assert "SEQ SCAN" not in result.stdout, output
+    assert result.returncode == 0, output
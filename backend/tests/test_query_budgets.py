@@ -0,0 +1,22 @@
+"""SQL statement budgets of the routes, from the tables of ``benchmarks.query_counts``."""
+
+import pytest
+
+from benchmarks.query_counts import ROUTES, SINGLE_ROUTES
+from utils.testing import assert_max_queries
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("route, budget", ROUTES.items())
+async def test_list_route_budget(client, route, budget):
+    with assert_max_queries(budget):
+        response = await client.get(route, params={"limit": 100})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("route, budget", SINGLE_ROUTES.items())
+async def test_route_budget(client, route, budget):
+    with assert_max_queries(budget):
+        response = await client.get(route)
+    assert response.status_code == 200
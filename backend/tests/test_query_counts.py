@@ -0,0 +1,68 @@
+"""The statements of an included list do not grow with its rows (no N+1 fetch)."""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from utils.database import AsyncSessionLocal
+from utils.models import Classroom, Degree, Mentor, Student
+from utils.testing import assert_max_queries
+
+pytestmark = pytest.mark.anyio
+
+# Students of the first page, then ten times as many
+STUDENTS = 50
+INCLUDE = "degree,classroom,mentor"
+
+
+async def add_students(degree_id: int, start: int, count: int) -> None:
+    """``count`` students of the degree, each with its own classroom and mentor, so every include has ``count`` rows to load."""
+    async with AsyncSessionLocal() as db:
+        classroom_ids = (await db.scalars(insert(Classroom).returning(Classroom.id), [
+            {"name": f"Counts {n}", "degree_id": degree_id, "capacity": 1, "enrolled": 1, "day": "monday", "time_slot": "morning"}
+            for n in range(start, start + count)
+        ])).all()
+        mentor_ids = (await db.scalars(insert(Mentor).returning(Mentor.id), [
+            {"first_name": "Counts", "last_name": str(n), "email": f"counts{n}@example.com", "phone": f"07{n:08d}"}
+            for n in range(start, start + count)
+        ])).all()
+        await db.execute(insert(Student), [
+            {"first_name": "Counts", "last_name": str(n), "birth_date": date(2012, 1, 1), "degree_id": degree_id,
+             "classroom_id": classroom_id, "mentor_id": mentor_id, "state": "active"}
+            for n, classroom_id, mentor_id in zip(range(start, start + count), classroom_ids, mentor_ids)
+        ])
+        await db.commit()
+
+
+@pytest.fixture
+async def degree_id(database):
+    async with AsyncSessionLocal() as db:
+        degree = Degree(name="Counts", level="1")
+        db.add(degree)
+        await db.commit()
+    yield degree.id
+    async with AsyncSessionLocal() as db:
+        mentor_ids = (await db.scalars(select(Student.mentor_id).where(Student.degree_id == degree.id))).all()
+        await db.execute(delete(Student).where(Student.degree_id == degree.id))
+        await db.execute(delete(Mentor).where(Mentor.id.in_(mentor_ids)))
+        await db.execute(delete(Classroom).where(Classroom.degree_id == degree.id))
+        await db.execute(delete(Degree).where(Degree.id == degree.id))
+        await db.commit()
+
+
+async def statements(client, degree_id: int, students: int) -> int:
+    with assert_max_queries(1) as executed:
+        response = await client.get(f"/students/degree/{degree_id}", params={"include": INCLUDE, "limit": 10 * STUDENTS})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == students
+    assert all(item["degree"] and item["classroom"] and item["mentor"] for item in items)
+    return len(executed)
+
+
+async def test_included_students_statements_do_not_grow(client, degree_id):
+    await add_students(degree_id, 0, STUDENTS)
+    few = await statements(client, degree_id, STUDENTS)
+    await add_students(degree_id, STUDENTS, 9 * STUDENTS)
+    assert await statements(client, degree_id, 10 * STUDENTS) == few
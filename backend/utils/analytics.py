@@ -0,0 +1,134 @@
+"""
+Attendance summaries behind the attendance rate endpoints.
+
+``AttendanceWeek`` counts each student's attendances per course and week, and
+``CourseSession`` counts the attendees of each course per day, a day with at least one
+attendee being a session that was held. Attendance writes apply their delta with an
+upsert in the caller's transaction, so rates are aggregated from these tables instead
+of the attendances themselves. Weeks are numbered from Monday 1970-01-05, and periods
+are rounded out to the whole weeks they overlap.
+"""
+
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Executable, Integer, cast, delete, func, insert, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import dialect_insert
+from utils.models import Attendance, AttendanceArchive, AttendanceWeek, CourseSession
+
+FIRST_MONDAY = date(1970, 1, 5)
+
+
+def as_datetime(day: date | datetime) -> datetime:
+    """Attendance dates are stored as datetimes at midnight."""
+    return day if isinstance(day, datetime) else datetime.combine(day, time.min)
+
+
+def week_of(day: date | datetime) -> int:
+    if isinstance(day, datetime):
+        day = day.date()
+    return (day - FIRST_MONDAY).days // 7
+
+
+def week_start(week: int) -> date:
+    """The Monday of a week number."""
+    return FIRST_MONDAY + timedelta(weeks=week)
+
+
+def week_range(start_at: datetime | None, end_before: datetime | None) -> tuple[int | None, int | None]:
+    """Inclusive bounds of the weeks overlapping a ``period_bounds`` period."""
+    first = week_of(start_at) if start_at is not None else None
+    last = week_of(end_before - timedelta(microseconds=1)) if end_before is not None else None
+    return first, last
+
+
+async def record_attendances(db: AsyncSession, attendances: list[tuple], sign: int = 1) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) ``(student_id, course_id, date)`` attendances from the summaries."""
+    weeks = Counter()
+    sessions = Counter()
+    for student_id, course_id, day in attendances:
+        if student_id is None or course_id is None or day is None:
+            continue
+        day = as_datetime(day)
+        weeks[student_id, week_of(day), course_id] += sign
+        sessions[course_id, day] += sign
+    if not weeks:
+        return
+
+    statement = dialect_insert(db, AttendanceWeek)
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["student_id", "week", "course_id"],
+            set_={"attended": AttendanceWeek.attended + statement.excluded.attended},
+        ),
+        [{"student_id": student_id, "week": week, "course_id": course_id, "attended": count} for (student_id, week, course_id), count in weeks.items()],
+    )
+    statement = dialect_insert(db, CourseSession)
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["course_id", "date"],
+            set_={"attendees": CourseSession.attendees + statement.excluded.attendees},
+        ),
+        [{"course_id": course_id, "date": day, "week": week_of(day), "attendees": count} for (course_id, day), count in sessions.items()],
+    )
+
+
+async def move_attendance(db: AsyncSession, old: tuple, new: tuple) -> None:
+    """Move one attendance's contribution after an update."""
+    if old == new:
+        return
+    await record_attendances(db, [old], -1)
+    await record_attendances(db, [new], 1)
+
+
+def week_expression(dialect: str):
+    """SQL computing the week number of ``attendances.date``."""
+    if dialect == "postgresql":
+        # Integer division: the cast would round a numeric quotient instead of flooring it
+        return cast((func.date(Attendance.date) - literal_column("DATE '1970-01-05'")) // 7, Integer)
+    return cast((func.julianday(Attendance.date) - func.julianday("1970-01-05")) / 7, Integer)
+
+
+def rebuild_statements(dialect: str, since: datetime | None = None) -> list[Executable]:
+    """Statements that recompute both summaries from the attendances table.
+
+    With ``since``, only the sessions from that day and the weeks starting from it are
+    recomputed; the older summaries are kept.
+    """
+    week = week_expression(dialect).label("week")
+    weeks, sessions = delete(AttendanceWeek), delete(CourseSession)
+    attended = select(Attendance.student_id, week, Attendance.course_id, func.count(Attendance.id))
+    held = select(Attendance.course_id, Attendance.date, week, func.count(Attendance.id))
+    if since is not None:
+        # The first whole week from ``since``: the week it falls in mixes kept and recomputed days
+        first_week = week_of(since) + (since.weekday() > 0 or since.time() > time.min)
+        weeks = weeks.where(AttendanceWeek.week >= first_week)
+        sessions = sessions.where(CourseSession.date >= since)
+        attended = attended.where(Attendance.date >= as_datetime(week_start(first_week)))
+        held = held.where(Attendance.date >= since)
+    return [
+        weeks,
+        sessions,
+        insert(AttendanceWeek).from_select(
+            ["student_id", "week", "course_id", "attended"],
+            attended.where(Attendance.student_id.is_not(None), Attendance.course_id.is_not(None))
+            .group_by(Attendance.student_id, week, Attendance.course_id),
+        ),
+        insert(CourseSession).from_select(
+            ["course_id", "date", "week", "attendees"],
+            held.where(Attendance.course_id.is_not(None)).group_by(Attendance.course_id, Attendance.date),
+        ),
+    ]
+
+
+async def rebuild_summaries(db: AsyncSession) -> None:
+    """Rebuild the summaries from scratch (repair or backfill), in the caller's transaction.
+
+    The summaries of archived terms (utils/partitions.py), whose attendances are no
+    longer in the table, are kept: only the ones after the latest archived term are rebuilt.
+    """
+    since = await db.scalar(select(func.max(AttendanceArchive.ends_at)))
+    for statement in rebuild_statements(db.bind.dialect.name, since):
+        await db.execute(statement)
@@ -0,0 +1,104 @@
+"""
+Batch lookups by id and a request-scoped data loader.
+
+``DataLoader.load`` can be awaited from several places of one request: lookups made
+before the event loop gets back to the loader are coalesced into a single
+``WHERE id = ANY(...)`` (PostgreSQL) or ``WHERE id IN (...)`` query per model, and
+results are memoized for the rest of the request. The ``/<resource>/batch`` endpoints
+use it to return many rows in request order, with the ids that were not found.
+"""
+
+import asyncio
+from typing import Any, Generic, TypeVar
+
+from fastapi import Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import get_async_db
+from utils.settings import MAX_BATCH_IDS
+
+T = TypeVar("T")
+
+
+class Batch(BaseModel, Generic[T]):
+    items: list[T]
+    missing: list[int]
+
+
+class BatchIds(BaseModel):
+    ids: list[int] = Field(max_length=MAX_BATCH_IDS)
+
+
+def parse_ids(ids: str = Query(..., description="Comma-separated ids, e.g. 1,2,3")) -> list[int]:
+    """Dependency reading ``?ids=1,2,3``, or raising a 400."""
+    try:
+        parsed = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per batch")
+    return parsed
+
+
+def id_in(db: AsyncSession, column, ids: list[int]):
+    """``column`` is one of ``ids``, as a single array parameter on PostgreSQL."""
+    if db.bind.dialect.name == "postgresql":
+        return column == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    return column.in_(ids)
+
+
+class DataLoader:
+    """Coalesce and memoize by-id lookups made while handling one request."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.futures: dict[tuple[Any, int], asyncio.Future] = {}
+        self.queued: dict[Any, list[int]] = {}
+        self.dispatch: asyncio.Task | None = None
+        # The session serves one query at a time
+        self.lock = asyncio.Lock()
+
+    def load(self, entity, id: int) -> asyncio.Future:
+        """Future of the ``entity`` row with this id, or None if there is none."""
+        future = self.futures.get((entity, id))
+        if future is None:
+            future = self.futures[entity, id] = asyncio.get_running_loop().create_future()
+            self.queued.setdefault(entity, []).append(id)
+            if self.dispatch is None:
+                self.dispatch = asyncio.create_task(self._dispatch())
+        return future
+
+    async def load_many(self, entity, ids: list[int]) -> list:
+        return list(await asyncio.gather(*(self.load(entity, id) for id in ids)))
+
+    async def _dispatch(self) -> None:
+        # Let the callers of this loop iteration queue their ids first
+        await asyncio.sleep(0)
+        queued, self.queued, self.dispatch = self.queued, {}, None
+        async with self.lock:
+            for entity, ids in queued.items():
+                try:
+                    rows = {row.id: row for row in await self.db.scalars(select(entity).where(id_in(self.db, entity.id, ids)))}
+                except Exception as error:
+                    for id in ids:
+                        self.futures.pop((entity, id)).set_exception(error)
+                    continue
+                for id in ids:
+                    self.futures[entity, id].set_result(rows.get(id))
+
+
+def get_loader(db: AsyncSession = Depends(get_async_db)) -> DataLoader:
+    """Dependency giving one loader per request, on the request's session."""
+    return DataLoader(db)
+
+
+async def batch(loader: DataLoader, entity, ids: list[int]) -> dict:
+    """Rows of ``entity`` for ``ids`` in request order (duplicates dropped), with the missing ids."""
+    ids = list(dict.fromkeys(ids))
+    rows = await loader.load_many(entity, ids)
+    return {
+        "items": [row for row in rows if row is not None],
+        "missing": [id for id, row in zip(ids, rows) if row is None],
+    }
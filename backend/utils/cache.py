@@ -0,0 +1,126 @@
+"""
+In-process read-through cache for reference data responses.
+
+Each ``ResponseCache`` keeps serialized JSON bodies for one router, keyed by path and
+query string, with a TTL and LRU eviction once ``max_entries`` is reached. Bodies carry
+a strong ETag: a request whose ``If-None-Match`` matches a cached entry gets a 304
+without touching the database. Write handlers call ``invalidate`` so the next read goes
+back to the database, and also clear the caches declared ``related`` to theirs (whose
+responses can embed its rows). A load that an invalidation overtakes may have read the
+rows from before the write: its body is served but not cached. Caches are per process;
+the TTL bounds how long another worker can serve a stale entry.
+"""
+
+import functools
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from utils.settings import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class ResponseCache:
+    """TTL + LRU cache of JSON response bodies with hit/miss counters."""
+
+    def __init__(self, name: str, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES, related: tuple[str, ...] = ()):
+        self.name = name
+        self.related = related
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped by every invalidation, so that loads started before it are not cached
+        self.generation = 0
+        caches[name] = self
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, body: bytes) -> CacheEntry:
+        entry = CacheEntry(body=body, etag=make_etag(body), expires_at=time.monotonic() + self.ttl)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.generation += 1
+
+    def invalidate(self) -> None:
+        """Drop every entry, after a write to the underlying table."""
+        self.clear()
+        for cache in caches.values():
+            if self.name in cache.related:
+                cache.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    async def respond(self, request: Request, load: Callable[[], Awaitable[Any]], response_type: Any) -> Response:
+        """Serve the request from the cache, or ``load`` it, serialize it as ``response_type`` and cache it.
+
+        Fields missing from dicts returned by ``load`` are left out of the body.
+        """
+        key = request.url.path + "?" + request.url.query
+        entry = self.get(key)
+        if entry is None:
+            generation = self.generation
+            adapter = type_adapter(response_type)
+            payload = adapter.validate_python(await load(), from_attributes=True)
+            body = adapter.dump_json(payload, exclude_unset=True)
+            if self.generation == generation:
+                entry = self.put(key, body)
+            else:
+                # Invalidated while loading: the rows read may predate the write
+                entry = CacheEntry(body=body, etag=make_etag(body), expires_at=0)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+caches: dict[str, ResponseCache] = {}
+
+type_adapter = functools.cache(TypeAdapter)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value matches ``etag``."""
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,342 @@
+"""
+Change feed: the create, update and delete events of the resources, pushed to clients.
+
+Writes call ``emit`` in their transaction, right before committing, with the written
+rows serialized as the API returns them. Each event gets a sequence number from
+``change_seq`` and is delivered to subscribers only once its transaction commits:
+
+- on PostgreSQL, ``emit`` sends one ``NOTIFY`` per event. The server delivers them at
+  commit to every worker, which listens on its own connection outside the pools.
+  Concurrent writes take no lock, so they may commit in another order than their
+  numbers, and a rolled back write leaves its numbers unused. Each worker publishes
+  the events in sequence order: one received above a missing number waits for it at
+  most CHANGE_FEED_REORDER_MS, after which the missing number is skipped. A client can
+  then resume from the last number it saw on any worker. An event arriving after a
+  higher number was published cannot be put back in order: the subscribers it concerns,
+  and the clients resuming from before it, get a reset.
+- elsewhere (SQLite), events are numbered by the process and published after the
+  session commits. Only that worker's subscribers receive them.
+
+Each worker keeps the last CHANGE_FEED_BUFFER events, so a client that reconnects with
+its last sequence number gets what it missed. It gets a ``reset`` event instead when
+those events are no longer all there: it should reload what it shows, then carry on
+from the sequence number of the reset. A subscriber queues at most
+CHANGE_FEED_QUEUE_SIZE events. When it reads slower than writes happen, its queue
+stops growing and it is caught up from the buffer once it drains, so a slow client
+never holds more than that in memory.
+
+An event's ``data`` is the row after the write, or the deleted row, and ``previous``
+holds the earlier values of the columns the write hooks track (a student's classroom,
+for instance). Subscribers can filter on resources and on one classroom or course. An
+event concerns a classroom through the row's ``classroom_id``, current or previous, or
+because it is that classroom's own event; courses work the same way.
+"""
+
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import asyncpg
+from sqlalchemy import ARRAY, Text, bindparam, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from utils.database import async_engine
+from utils.serialization import dumps
+from utils.settings import CHANGE_FEED_BUFFER, CHANGE_FEED_QUEUE_SIZE, CHANGE_FEED_REORDER_MS, CHANGE_FEED_RETRY_SECONDS
+
+logger = logging.getLogger("app.changes")
+
+CHANNEL = "changes"
+CREATED, UPDATED, DELETED, RESET = "created", "updated", "deleted", "reset"
+# Largest NOTIFY payload (8000 bytes) minus room for the sequence number; the data of
+# larger events is left out, for clients to fetch the row by id
+MAX_PAYLOAD = 7900
+# Session.info key of the events waiting for their transaction to commit (in-process feed)
+PENDING = "pending_changes"
+
+notify = text(
+    "SELECT pg_notify(:channel, nextval('change_seq') || ':' || payload) "
+    "FROM unnest(:payloads) WITH ORDINALITY AS events(payload, position) ORDER BY position"
+).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+
+
+@dataclass
+class Change:
+    """One event, encoded once for every subscriber."""
+
+    seq: int
+    resource: str
+    action: str
+    id: int | None = None
+    data: dict | None = None
+    previous: dict | None = None
+    body: bytes = field(default=b"", repr=False)
+
+    def __post_init__(self):
+        if not self.body:
+            self.body = dumps(self.message())
+
+    def message(self) -> dict:
+        if self.action == RESET:
+            return {"seq": self.seq, "action": RESET}
+        message = {"seq": self.seq, "resource": self.resource, "action": self.action, "id": self.id, "data": self.data}
+        if self.previous:
+            message["previous"] = self.previous
+        return message
+
+    def concerns(self, name: str, value: int) -> bool:
+        """Whether the event concerns the ``name`` (``classroom`` or ``course``) with id ``value``."""
+        if self.resource == f"{name}s" and self.id == value:
+            return True
+        key = f"{name}_id"
+        return any(values is not None and values.get(key) == value for values in (self.data, self.previous))
+
+
+class Subscription:
+    """The events one client receives, in sequence order."""
+
+    def __init__(self, feed: "ChangeFeed", resources: set[str] | None, classroom_id: int | None, course_id: int | None, after: int):
+        self.feed = feed
+        self.resources = resources
+        self.classroom_id = classroom_id
+        self.course_id = course_id
+        # Sequence number of the last event delivered
+        self.last = after
+        self.queue: deque[Change] = deque()
+        # Events were left out of the full queue: catch up from the feed's buffer once drained
+        self.behind = False
+        self.ready = asyncio.Event()
+
+    def wants(self, change: Change) -> bool:
+        if self.resources is not None and change.resource not in self.resources:
+            return False
+        if self.classroom_id is not None and not change.concerns("classroom", self.classroom_id):
+            return False
+        return self.course_id is None or change.concerns("course", self.course_id)
+
+    def offer(self, change: Change) -> None:
+        if change.seq <= self.last or not self.wants(change):
+            return
+        if self.behind or len(self.queue) >= CHANGE_FEED_QUEUE_SIZE:
+            self.behind = True
+        else:
+            self.queue.append(change)
+        self.ready.set()
+
+    def reset(self) -> None:
+        """Replace the queued events by a reset to the feed's current sequence number."""
+        self.queue.clear()
+        self.queue.append(self.feed.reset_event())
+        self.last = self.feed.seq
+        self.behind = False
+        self.ready.set()
+
+    async def next(self, timeout: float) -> list[Change]:
+        """The events ready to send, waiting at most ``timeout`` seconds (an empty list then)."""
+        if not self.queue and not self.behind:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        if not self.queue and self.behind:
+            missed = self.feed.since(self.last)
+            if missed is None:
+                self.reset()
+            else:
+                self.behind = False
+                self.queue.extend(change for change in missed if self.wants(change))
+        changes = []
+        while self.queue and len(changes) < CHANGE_FEED_QUEUE_SIZE:
+            changes.append(self.queue.popleft())
+        if changes:
+            self.last = changes[-1].seq
+        return changes
+
+
+class ChangeFeed:
+    """The events of this worker's subscribers, from NOTIFY or from this process's commits."""
+
+    def __init__(self, size: int = CHANGE_FEED_BUFFER):
+        self.buffer: deque[Change] = deque(maxlen=size)
+        # Every event numbered above ``floor`` is in the buffer (or has yet to arrive)
+        self.floor = 0
+        self.seq = 0
+        self.subscribers: set[Subscription] = set()
+        self.notified = async_engine.dialect.name == "postgresql"
+        self.task: asyncio.Task | None = None
+        # NOTIFY: events received above a missing number, as (seq, arrival time, event)
+        self.held: list[tuple[int, float, Change]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        # Last number given when the listener started: events up to it may still arrive
+        self.listened = 0
+
+    # Writing side
+
+    async def emit(self, db: AsyncSession, resource: str, action: str, rows: list[dict], previous: list[dict | None] | None = None) -> None:
+        """Record the events of ``rows`` (dicts as the API returns them, with an ``id``), sent when ``db`` commits."""
+        if not rows:
+            return
+        previous = previous or [None] * len(rows)
+        if not self.notified:
+            db.info.setdefault(PENDING, []).extend((resource, action, row, old) for row, old in zip(rows, previous))
+            return
+        payloads = [payload(resource, action, row, old) for row, old in zip(rows, previous)]
+        await db.execute(notify, {"channel": CHANNEL, "payloads": payloads})
+
+    def committed(self, pending: list[tuple]) -> None:
+        for resource, action, row, old in pending:
+            self.seq += 1
+            self.publish(Change(self.seq, resource, action, row["id"], row, old))
+
+    # Delivery
+
+    def publish(self, change: Change) -> None:
+        if len(self.buffer) == self.buffer.maxlen:
+            self.floor = self.buffer[0].seq
+        self.buffer.append(change)
+        self.seq = max(self.seq, change.seq)
+        for subscription in self.subscribers:
+            subscription.offer(change)
+
+    def since(self, after: int) -> list[Change] | None:
+        """The buffered events numbered above ``after``, None when some may be missing."""
+        if after < self.floor or (not self.notified and after > self.seq):
+            # A number from before the buffer, or from a previous run of this process
+            return None
+        start = bisect.bisect_right(self.buffer, after, key=lambda change: change.seq)
+        return [self.buffer[index] for index in range(start, len(self.buffer))]
+
+    def reset_event(self) -> Change:
+        return Change(self.seq, "", RESET)
+
+    def subscribe(self, resources: set[str] | None = None, classroom_id: int | None = None, course_id: int | None = None, after: int | None = None) -> Subscription:
+        """A subscription to the events to come, and to those numbered above ``after`` when given."""
+        subscription = Subscription(self, resources, classroom_id, course_id, self.seq if after is None else after)
+        if after is not None:
+            missed = self.since(after)
+            if missed is None:
+                subscription.reset()
+            else:
+                subscription.queue.extend(change for change in missed if subscription.wants(change))
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    # Listening (PostgreSQL)
+
+    def start(self) -> None:
+        if self.notified and self.task is None:
+            self.task = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def listen(self) -> None:
+        """Receive the NOTIFY of every worker on a connection of its own, reconnecting when it drops."""
+        dsn = async_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self.received)
+                # Events committed before LISTEN cannot be replayed: start the buffer after them
+                last = await connection.fetchval("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM change_seq")
+                self.restart(last)
+                await lost.wait()
+                logger.warning("change feed connection lost, reconnecting")
+            except (OSError, asyncpg.PostgresError):
+                logger.warning("change feed listener failed, retrying in %ss", CHANGE_FEED_RETRY_SECONDS, exc_info=True)
+                await asyncio.sleep(CHANGE_FEED_RETRY_SECONDS)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+    def restart(self, last: int) -> None:
+        """Start over after ``last``; subscribers that may have missed events get a reset."""
+        missed = self.task is not None and self.seq > 0 and last > self.seq
+        self.floor = max(self.floor, last)
+        self.seq = max(self.seq, last)
+        self.listened = last
+        if missed:
+            self.buffer.clear()
+            self.held.clear()
+            for subscription in self.subscribers:
+                subscription.reset()
+
+    def received(self, connection, pid: int, channel: str, message: str) -> None:
+        seq, _, body = message.partition(":")
+        values = json.loads(body)
+        self.arrived(Change(int(seq), values["resource"], values["action"], values.get("id"), values.get("data"), values.get("previous")))
+
+    def arrived(self, change: Change) -> None:
+        """Publish ``change`` in sequence order, holding it while a lower number may still arrive."""
+        if change.seq <= self.seq:
+            self.late(change)
+            return
+        heapq.heappush(self.held, (change.seq, time.monotonic(), change))
+        self.release()
+
+    def release(self) -> None:
+        """Publish the held events next in sequence, skipping the missing numbers waited for too long."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        window = CHANGE_FEED_REORDER_MS / 1000
+        while self.held:
+            # Every held event waits for the missing numbers below the first
+            waited = time.monotonic() - min(arrival for _, arrival, _ in self.held)
+            if self.held[0][0] != self.seq + 1 and waited < window:
+                self.timer = asyncio.get_running_loop().call_later(window - waited, self.release)
+                return
+            self.publish(heapq.heappop(self.held)[2])
+
+    def late(self, change: Change) -> None:
+        """An event numbered below one already published: the clients that may miss it get a reset."""
+        if change.seq > self.listened:
+            logger.warning("change %d arrived after change %d was published, raise CHANGE_FEED_REORDER_MS", change.seq, self.seq)
+        self.floor = max(self.floor, self.seq)
+        for subscription in self.subscribers:
+            if subscription.wants(change):
+                subscription.reset()
+
+
+def payload(resource: str, action: str, row: dict, previous: dict | None) -> str:
+    values = {"resource": resource, "action": action, "id": row["id"], "data": row, "previous": previous}
+    encoded = dumps(values)
+    if len(encoded) > MAX_PAYLOAD:
+        encoded = dumps({**values, "data": None})
+    return encoded.decode()
+
+
+def _publish_committed(session: Session) -> None:
+    pending = session.info.pop(PENDING, None)
+    if pending:
+        feed.committed(pending)
+
+
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING, None)
+
+
+# In-process feed: publish the events of a transaction once it commits, forget them on rollback
+event.listen(Session, "after_commit", _publish_committed)
+event.listen(Session, "after_rollback", _drop_rolled_back)
+
+feed = ChangeFeed()
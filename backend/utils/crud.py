@@ -0,0 +1,274 @@
+"""
+Generic routes of a resource: list, get by id, batch, create, update, patch and delete.
+
+Each router module builds a ``Crud`` from its entity and its Model/Response schemas,
+declares its own routes, then calls ``register`` to add the generic ones after them
+(routes match in order, so ``/students/search`` must come before
+``/students/{student_id}``). Statements are built once, with bind parameters for what
+changes between requests: SQLAlchemy memoizes a statement object's cache key, so a
+request only binds its parameters to an already compiled statement.
+
+Side effects of writes go in the hooks of a subclass: ``prepare`` completes the written
+values, ``created``, ``updated`` and ``deleted`` run in the transaction of the write
+and ``committed`` after it. ``updated`` receives the previous values of the
+``tracked`` columns, only when the write sets one of them. Each write then emits its
+change feed event (``utils.changes``), the row as the routes return it, just before
+committing.
+"""
+
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from pydantic import BaseModel
+from sqlalchemy import Row, bindparam, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.batch import Batch, BatchIds, DataLoader, batch, get_loader, parse_ids
+from utils.cache import ResponseCache
+from utils.changes import CREATED, DELETED, UPDATED, feed
+from utils.database import get_async_db
+from utils.includes import Include, eager, expand, expand_page, expanded_response
+from utils.pagination import KeysetQuery, Page, PageParams
+from utils.serialization import RowSerializer
+from utils.writes import delete_returning, insert_returning, partial, update_returning
+
+db_dependency = Depends(get_async_db)
+page_dependency = Depends(PageParams)
+ids_dependency = Depends(parse_ids)
+loader_dependency = Depends(get_loader)
+
+
+class Crud:
+    """Generic routes and pre-built statements of one entity."""
+
+    # Columns whose previous values ``updated`` receives
+    tracked: tuple[str, ...] = ()
+    # Detail of the 409 answered when a write breaks a constraint, None to let it raise
+    conflict: str | None = None
+
+    def __init__(
+        self,
+        entity,
+        model: type[BaseModel],
+        response: type[BaseModel],
+        path: str,
+        *,
+        details: type[BaseModel] | None = None,
+        includes: tuple[str, ...] = (),
+        keys: tuple | None = None,
+        rows: RowSerializer | None = None,
+        cache: ResponseCache | None = None,
+        create_path: str | None = None,
+    ):
+        """``details`` is the response with the ``includes`` relations, ``keys`` the page order
+        (the id by default), ``rows`` the fast path of pages without relations."""
+        self.entity = entity
+        self.model = model
+        self.patch_model = partial(model)
+        self.response = response
+        self.details = details or response
+        self.path = path
+        self.create_path = create_path or path
+        self.name = entity.__name__
+        self.plural = path.strip("/")
+        self.id_name = f"{self.name.lower()}_id"
+        self.keys = keys or (entity.id,)
+        self.includes = includes
+        self.include_dependency = Depends(Include(*includes))
+        self.rows = rows
+        # Rows of the change feed events, encoded as the responses
+        self.serializer = rows or RowSerializer(response, entity)
+        self.cache = cache
+        self.pages: dict[tuple, KeysetQuery] = {}
+        self.by_id: dict[tuple[str, ...], Any] = {}
+
+    # Statements
+
+    def keyset(self, includes: tuple[str, ...] = (), filters: tuple[str, ...] = ()) -> KeysetQuery:
+        """Pages of the entity with ``includes`` embedded, filtered on equality with the ``filters`` columns."""
+        query = self.pages.get((includes, filters))
+        if query is None:
+            rows = self.rows is not None and not includes
+            base = self.rows.select() if rows else eager(select(self.entity), self.entity, includes)
+            base = base.where(*(getattr(self.entity, name) == bindparam(name) for name in filters))
+            query = self.pages[includes, filters] = KeysetQuery(base, self.keys, rows)
+        return query
+
+    def select_by_id(self, includes: tuple[str, ...] = ()):
+        statement = self.by_id.get(includes)
+        if statement is None:
+            statement = self.by_id[includes] = eager(select(self.entity), self.entity, includes).where(self.entity.id == bindparam("row_id"))
+        return statement
+
+    # Reads
+
+    async def page(self, db: AsyncSession, page: PageParams, includes: tuple[str, ...] = (), not_found: str | None = None, **filters) -> dict:
+        """A page of the entity, filtered on ``filters`` (column name to value, None ignored).
+
+        Items are rows on the ``rows`` fast path, ``expand``-ed dicts for an entity with
+        relations to include, ORM objects otherwise.
+        """
+        filters = {name: value for name, value in filters.items() if value is not None}
+        items = await self.keyset(includes, tuple(filters)).page(db, page, **filters)
+        if not items["items"] and page.cursor is None:
+            raise HTTPException(status_code=404, detail=not_found or f"No {self.plural} found")
+        if self.includes and (includes or self.rows is None):
+            return expand_page(items, self.response, includes)
+        return items
+
+    async def page_response(self, db: AsyncSession, page: PageParams, includes: tuple[str, ...] = (), not_found: str | None = None, **filters) -> Any:
+        """``page`` as a response, leaving out the relations that were not included."""
+        items = await self.page(db, page, includes, not_found, **filters)
+        if self.rows is not None and not includes:
+            return self.rows.page_response(items)
+        if self.includes:
+            return expanded_response(items, Page[self.details])
+        return items
+
+    async def get(self, db: AsyncSession, id: int, includes: tuple[str, ...] = ()) -> Any:
+        """The entity with this id (``expand``-ed if it has relations to include), or a 404."""
+        obj = (await db.scalars(self.select_by_id(includes), {"row_id": id})).first()
+        if not obj:
+            raise HTTPException(status_code=404, detail=f"{self.name} not found")
+        return expand(obj, self.response, includes) if self.includes else obj
+
+    async def list_response(self, request: Request, db: AsyncSession, page: PageParams, includes: tuple[str, ...]) -> Any:
+        if self.cache is None:
+            return await self.page_response(db, page, includes)
+        return await self.cache.respond(request, lambda: self.page(db, page, includes), Page[self.details])
+
+    async def get_response(self, request: Request, db: AsyncSession, id: int, includes: tuple[str, ...]) -> Any:
+        if self.cache is not None:
+            return await self.cache.respond(request, lambda: self.get(db, id, includes), self.details)
+        obj = await self.get(db, id, includes)
+        return expanded_response(obj, self.details) if self.includes else obj
+
+    # Writes
+
+    def prepare(self, values: dict) -> dict:
+        """Values written by a create or an update, from the body's."""
+        return values
+
+    async def created(self, db: AsyncSession, row: Row) -> None:
+        pass
+
+    async def updated(self, db: AsyncSession, row: Row, old: dict) -> None:
+        pass
+
+    async def deleted(self, db: AsyncSession, row: Row) -> None:
+        pass
+
+    def committed(self, row: Row, deleted: bool = False) -> None:
+        pass
+
+    def _written(self, row: Row, deleted: bool = False) -> None:
+        if self.cache is not None:
+            self.cache.invalidate()
+        self.committed(row, deleted)
+
+    def put_values(self, body: BaseModel) -> dict:
+        """Values written by a PUT."""
+        return body.model_dump()
+
+    async def create(self, db: AsyncSession, values: dict) -> Row:
+        try:
+            row = await insert_returning(db, self.entity, self.prepare(values))
+            await self.created(db, row)
+            await feed.emit(db, self.plural, CREATED, [self.serializer.item(row)])
+            await db.commit()
+        except IntegrityError:
+            if self.conflict is None:
+                raise
+            raise HTTPException(status_code=409, detail=self.conflict)
+        self._written(row)
+        return row
+
+    async def update(self, db: AsyncSession, id: int, values: dict) -> Row:
+        values = self.prepare(values)
+        old = self.tracked if any(name in values for name in self.tracked) else ()
+        try:
+            updated = await update_returning(db, self.entity, id, values, old)
+        except IntegrityError:
+            if self.conflict is None:
+                raise
+            raise HTTPException(status_code=409, detail=self.conflict)
+        if not updated:
+            raise HTTPException(status_code=404, detail=f"{self.name} not found")
+        row, previous = updated
+        if old:
+            await self.updated(db, row, previous)
+        await feed.emit(db, self.plural, UPDATED, [self.serializer.item(row)], [previous or None])
+        await db.commit()
+        self._written(row)
+        return row
+
+    async def delete(self, db: AsyncSession, id: int) -> Row:
+        row = await delete_returning(db, self.entity, id)
+        if not row:
+            raise HTTPException(status_code=404, detail=f"{self.name} not found")
+        await self.deleted(db, row)
+        await feed.emit(db, self.plural, DELETED, [self.serializer.item(row)])
+        await db.commit()
+        self._written(row, deleted=True)
+        return row
+
+    # Routes
+
+    def register(self, router: APIRouter) -> None:
+        """Add the generic routes to ``router``, after the routes it already has."""
+        name, plural, path = self.name.lower(), self.plural, self.path
+        a = "an" if name[0] in "aeiou" else "a"
+        item = f"{path}/{{{self.id_name}}}"
+        id_dependency = Path(alias=self.id_name)
+
+        if self.includes:
+            async def list_route(request: Request, page: PageParams = page_dependency, includes: tuple[str, ...] = self.include_dependency, db: AsyncSession = db_dependency) -> Any:
+                return await self.list_response(request, db, page, includes)
+
+            async def get_route(request: Request, id: int = id_dependency, includes: tuple[str, ...] = self.include_dependency, db: AsyncSession = db_dependency) -> Any:
+                return await self.get_response(request, db, id, includes)
+        else:
+            async def list_route(request: Request, page: PageParams = page_dependency, db: AsyncSession = db_dependency) -> Any:
+                return await self.list_response(request, db, page, ())
+
+            async def get_route(request: Request, id: int = id_dependency, db: AsyncSession = db_dependency) -> Any:
+                return await self.get_response(request, db, id, ())
+
+        async def get_batch_route(ids: list[int] = ids_dependency, loader: DataLoader = loader_dependency) -> Any:
+            return await batch(loader, self.entity, ids)
+
+        async def post_batch_route(body: BatchIds, loader: DataLoader = loader_dependency) -> Any:
+            return await batch(loader, self.entity, body.ids)
+
+        async def create_route(body: self.model, db: AsyncSession = db_dependency) -> Any:
+            return await self.create(db, body.model_dump())
+
+        async def put_route(body: self.model, id: int = id_dependency, db: AsyncSession = db_dependency) -> Any:
+            return await self.update(db, id, self.put_values(body))
+
+        async def patch_route(body: self.patch_model, id: int = id_dependency, db: AsyncSession = db_dependency) -> Any:
+            return await self.update(db, id, body.model_dump(exclude_unset=True))
+
+        async def delete_route(id: int = id_dependency, db: AsyncSession = db_dependency) -> Any:
+            return await self.delete(db, id)
+
+        routes = [
+            (path, "GET", list_route, Page[self.details], f"get_{plural}", f"Get all {plural}{_embedding(self.includes, 'their')}."),
+            (f"{path}/batch", "GET", get_batch_route, Batch[self.response], f"get_{plural}_batch", f"Get several {plural} by ID (``?ids=1,2,3``), in request order, with the ids not found."),
+            (f"{path}/batch", "POST", post_batch_route, Batch[self.response], f"post_{plural}_batch", f"Get several {plural} by ID from a request body, for lists too long for a URL."),
+            (item, "GET", get_route, self.details, f"get_{name}", f"Get {a} {name} by ID{_embedding(self.includes, 'its')}."),
+            (self.create_path, "POST", create_route, self.response, f"create_{name}", f"Create a new {name}."),
+            (item, "PUT", put_route, self.response, f"update_{name}", f"Update {a} {name} by ID."),
+            (item, "PATCH", patch_route, self.response, f"patch_{name}", f"Update the given fields of {a} {name} by ID."),
+            (item, "DELETE", delete_route, self.response, f"delete_{name}", f"Delete {a} {name} by ID."),
+        ]
+        for route_path, method, endpoint, response_model, route_name, description in routes:
+            router.add_api_route(route_path, endpoint, methods=[method], response_model=response_model, name=route_name, description=description)
+
+
+def _embedding(includes: tuple[str, ...], possessive: str) -> str:
+    if not includes:
+        return ""
+    embedded = f"{possessive} {includes[0]}" if len(includes) == 1 else "related objects"
+    return f", with ``include={','.join(includes)}`` to embed {embedded}"
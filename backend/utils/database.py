@@ -1,8 +1,20 @@
 import os
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from utils.diagnostics import is_slow, log_repeated_statements, log_slow_statement
+from utils.settings import (
+    DB_LOCK_TIMEOUT_MS, DB_MAX_CONNECTIONS, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE,
+    DB_POOL_TIMEOUT, DB_RESERVED_CONNECTIONS, DB_STATEMENT_TIMEOUT_MS, JOB_CONCURRENCY, N_PLUS_ONE_THRESHOLD, SLOW_QUERY_MS,
+    WEB_WORKERS,
+)
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -16,15 +28,151 @@ DB_PORT = os.getenv("DB_PORT")
 
 
 # Construire l'URL de connexion à la base de données
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
-print(f"DATABASE_URL: {DATABASE_URL}")
+# (DATABASE_URL peut être surchargée, par exemple avec une base SQLite locale)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
 
-# Créer l'engine SQLAlchemy avec psycopg2
-engine = create_engine(DATABASE_URL)
+
+def to_async_url(url: str) -> str:
+    """Return the async driver equivalent of a synchronous database URL."""
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+
+def pool_sizes(workers: int = WEB_WORKERS) -> tuple[int, int]:
+    """``(pool_size, max_overflow)`` of one worker, so that all workers together stay within the connection budget.
+
+    The connections of each worker's job pool (``job_connections``) and the connection of
+    its change feed listener come out of its share.
+    """
+    share = max(1, (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // max(1, workers) - job_connections() - 1)
+    pool_size = DB_POOL_SIZE if DB_POOL_SIZE is not None else max(1, share // 2)
+    max_overflow = DB_MAX_OVERFLOW if DB_MAX_OVERFLOW is not None else max(0, share - pool_size)
+    return pool_size, max_overflow
+
+
+def async_engine_options(url: str) -> dict:
+    """Pool and timeout options of the engine serving requests; SQLite keeps the defaults."""
+    if not url.startswith("postgresql"):
+        return {}
+    pool_size, max_overflow = pool_sizes()
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS), "lock_timeout": str(DB_LOCK_TIMEOUT_MS)}},
+    }
+
+
+def job_connections() -> int:
+    """Most connections of a worker's job pool: one per concurrent job, one more per job for
+    its progress and status writes, and one for the heartbeat."""
+    return 2 * JOB_CONCURRENCY + 1
+
+
+def job_engine_options(url: str) -> dict:
+    """Options of the engine running background jobs and their bookkeeping, with no statement timeout."""
+    if not url.startswith("postgresql"):
+        return {}
+    return {
+        "pool_size": JOB_CONCURRENCY,
+        # Bookkeeping writes are short: they open overflow connections while the jobs hold theirs
+        "max_overflow": job_connections() - JOB_CONCURRENCY,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"server_settings": {"statement_timeout": "0", "lock_timeout": str(DB_LOCK_TIMEOUT_MS)}},
+    }
+
+
+# Créer l'engine SQLAlchemy avec psycopg2 (scripts et benchmarks, sans limite de durée)
+engine = create_engine(DATABASE_URL, pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+
+# Créer l'engine asynchrone (asyncpg) utilisé par les routes, avec un pool dimensionné par worker
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options(ASYNC_DATABASE_URL))
+
+# Créer l'engine des tâches de fond (utils/jobs.py), séparé pour ne pas prendre les connexions des routes
+job_engine = create_async_engine(ASYNC_DATABASE_URL, **job_engine_options(ASYNC_DATABASE_URL))
 
 # Créer une session locale
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Créer une session asynchrone locale
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Créer une session asynchrone des tâches de fond
+JobSessionLocal = async_sessionmaker(job_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+@dataclass
+class QueryStats:
+    """SQL statements, database time (seconds) and rows of one request."""
+    statements: int = 0
+    duration: float = 0.0
+    rows: int = 0
+    # Scope ASGI de la requête, pour retrouver sa route dans les logs
+    scope: dict | None = None
+    # Nombre d'exécutions de chaque texte SQL (détection des N+1)
+    shapes: Counter = field(default_factory=Counter)
+    # Requête qui répète ses requêtes SQL par conception (écritures par lots), voir expect_repeats
+    repeats_expected: bool = False
+
+    def report_repeats(self) -> None:
+        if not self.repeats_expected:
+            log_repeated_statements(self.shapes, self.scope)
+
+# Statistiques SQL de la requête en cours (renseignées par le middleware de utils/metrics.py)
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if SLOW_QUERY_MS > 0 or query_stats.get() is not None:
+        conn.info["query_started"] = perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    duration = perf_counter() - started
+    stats = query_stats.get()
+    # Journaliser les requêtes lentes, avec leurs paramètres et la route appelante
+    if is_slow(duration):
+        log_slow_statement(statement, parameters, duration, stats.scope if stats else None)
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.duration += duration
+    # Les drivers async (asyncpg, aiosqlite) chargent les lignes dès l'exécution
+    rows = getattr(cursor, "_rows", None)
+    stats.rows += len(rows) if rows else max(cursor.rowcount, 0)
+    if N_PLUS_ONE_THRESHOLD > 0:
+        stats.shapes[statement] += 1
+
+def expect_repeats() -> None:
+    """Leave the current request out of N+1 reports: it runs the same statements once per chunk of its rows."""
+    stats = query_stats.get()
+    if stats is not None:
+        stats.repeats_expected = True
+
+# Compter et chronométrer les requêtes SQL, sur tous les engines
+for _engine in (engine, async_engine.sync_engine, job_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+def _use_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+# SQLite : journal WAL, pour que les tâches de fond écrivent leur avancement pendant une longue lecture (export)
+if DATABASE_URL.startswith("sqlite") and ":memory:" not in DATABASE_URL:
+    for _engine in (engine, async_engine.sync_engine, job_engine.sync_engine):
+        event.listen(_engine, "connect", _use_wal)
+
 # Déclarer une base pour les modèles
 Base = declarative_base()
 
@@ -35,3 +183,12 @@ def get_db():
     finally:
         db.close()
 
+def dialect_insert(db, model):
+    """Return an INSERT for ``model`` supporting ON CONFLICT on the session's dialect (PostgreSQL or SQLite)."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
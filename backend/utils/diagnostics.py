@@ -0,0 +1,57 @@
+"""
+Slow statement and N+1 logging.
+
+The engine event hooks of ``utils.database`` time every statement. One slower than
+``SLOW_QUERY_MS`` is logged on the ``app.sql`` logger with its bound parameters and,
+inside an HTTP request, the route template that issued it. Within a request, statements
+are also counted by their SQL text: a parameterised statement run
+``N_PLUS_ONE_THRESHOLD`` times or more (one query per item of a page, say) is reported
+when the request ends, as a likely N+1 to batch (``utils.batch``) or eager-load
+(``utils.includes``). Both thresholds are read from the environment, 0 disabling them.
+"""
+
+import logging
+from collections import Counter
+
+from utils.settings import N_PLUS_ONE_THRESHOLD, SLOW_QUERY_MS
+
+logger = logging.getLogger("app.sql")
+
+# Longest statement and parameter text written to the log
+MAX_LOGGED_LENGTH = 1000
+
+
+def route_of(scope: dict) -> str:
+    """``METHOD /route/template`` of an ASGI scope, once the router has matched it."""
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path', 'unmatched'))}"
+
+
+def where(scope: dict | None) -> str:
+    """Where a statement ran, for the log: ``on METHOD /route`` or ``outside any request``."""
+    return "outside any request" if scope is None else f"on {route_of(scope)}"
+
+
+def _shorten(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= MAX_LOGGED_LENGTH else text[:MAX_LOGGED_LENGTH] + "..."
+
+
+def is_slow(seconds: float) -> bool:
+    return SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS
+
+
+def log_slow_statement(statement: str, parameters, seconds: float, scope: dict | None) -> None:
+    logger.warning(
+        "slow statement (%.1f ms) %s: %s -- parameters: %s",
+        seconds * 1000, where(scope), _shorten(statement), _shorten(repr(parameters)),
+    )
+
+
+def log_repeated_statements(shapes: Counter, scope: dict | None) -> None:
+    """Report the statements a request ran ``N_PLUS_ONE_THRESHOLD`` times or more."""
+    if N_PLUS_ONE_THRESHOLD <= 0:
+        return
+    for statement, count in shapes.items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            logger.warning("likely N+1 %s: statement run %d times: %s", where(scope), count, _shorten(statement))
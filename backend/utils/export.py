@@ -0,0 +1,115 @@
+"""
+Streaming CSV / NDJSON export of large tables.
+
+Rows are read through a server-side cursor (``stream_results`` + ``yield_per``) in a
+session owned by the response generator, and written out one partition at a time, so
+memory stays flat however many rows are exported.
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import AsyncSessionLocal
+from utils.settings import EXPORT_CHUNK_SIZE
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv",
+    ExportFormat.ndjson: "application/x-ndjson",
+}
+
+
+def quarter_bounds(quarter: str) -> tuple[date, date]:
+    """Return the [start, end) dates of a quarter written as ``YYYY-Qn``."""
+    match = re.fullmatch(r"(\d{4})-?Q([1-4])", quarter.strip().upper())
+    if not match:
+        raise HTTPException(status_code=400, detail="Quarter must look like 2024-Q1")
+    year, number = int(match.group(1)), int(match.group(2))
+    start = date(year, 3 * number - 2, 1)
+    end = date(year + 1, 1, 1) if number == 4 else date(year, 3 * number + 1, 1)
+    return start, end
+
+
+def period_bounds(start: date | None, end: date | None, quarter: str | None = None) -> tuple[datetime | None, datetime | None]:
+    """Turn an inclusive [start, end] date range, narrowed by an optional quarter, into [lower, upper) datetimes."""
+    lower = datetime.combine(start, time.min) if start else None
+    upper = datetime.combine(end + timedelta(days=1), time.min) if end else None
+    if quarter is not None:
+        quarter_start, quarter_end = (datetime.combine(d, time.min) for d in quarter_bounds(quarter))
+        lower = max(lower, quarter_start) if lower else quarter_start
+        upper = min(upper, quarter_end) if upper else quarter_end
+    return lower, upper
+
+
+def _csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(type(value))
+
+
+async def stream_rows(
+    query: Select,
+    columns: list[str],
+    export_format: ExportFormat,
+    convert: Callable[[tuple], tuple] | None = None,
+    sessions: Callable[[], AsyncSession] = AsyncSessionLocal,
+    progress: Callable[[int], Awaitable[None]] | None = None,
+) -> AsyncIterator[str]:
+    """Yield ``query``'s rows encoded as CSV or NDJSON, one ``yield_per`` partition per chunk.
+
+    ``sessions`` opens the session reading them (the export jobs use the job engine), and
+    ``progress`` is awaited with the number of rows yielded so far after each chunk.
+    """
+    query = query.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == ExportFormat.csv:
+        writer.writerow(columns)
+        yield buffer.getvalue()
+    exported = 0
+    async with sessions() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            for row in partition:
+                row = convert(tuple(row)) if convert else tuple(row)
+                if export_format == ExportFormat.csv:
+                    writer.writerow([_csv_value(value) for value in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=_json_value))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            exported += len(partition)
+            if progress is not None:
+                await progress(exported)
+
+
+def export_response(query: Select, columns: list[str], export_format: ExportFormat, filename: str, convert: Callable[[tuple], tuple] | None = None) -> StreamingResponse:
+    """Build a ``StreamingResponse`` that downloads ``query`` as ``filename.<format>``."""
+    return StreamingResponse(
+        stream_rows(query, columns, export_format, convert),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'},
+    )
@@ -0,0 +1,298 @@
+"""
+Streaming CSV import of a resource, upserted on its natural key.
+
+The upload is read as it arrives and cut into CSV records (a quoted field may span
+lines), so memory holds one chunk of rows however big the file. The header row names
+the columns, which are the fields of the resource's Model; each row is validated with
+that Model. Valid rows are written ``IMPORT_CHUNK_SIZE`` at a time, each chunk in its
+own transaction, by ``INSERT ... ON CONFLICT (key) DO UPDATE``: a row whose key
+already exists updates it, the others are created.
+
+Each chunk emits the change feed events (``utils.changes``) of its rows, encoded as the
+resource's Response, before committing.
+
+Invalid rows are reported with their line and skipped: values the Model rejects,
+foreign keys naming no row, a key repeated later in the same chunk (the later row
+wins). A chunk the database still rejects is rolled back alone and its rows reported;
+the chunks committed before it stay written.
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+from collections.abc import AsyncIterator, Iterable
+from datetime import date, datetime, time
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import DateTime, Row, and_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.changes import CREATED, UPDATED, feed
+from utils.database import dialect_insert, expect_repeats
+from utils.serialization import RowSerializer
+from utils.settings import IMPORT_CHUNK_SIZE, IMPORT_MAX_REPORTED_ERRORS
+
+# OpenAPI request body of the import routes, which read the raw upload
+CSV_BODY = {"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string"}}}}}
+
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    # The first IMPORT_MAX_REPORTED_ERRORS failed rows, in file order
+    errors: list[ImportRowError] = []
+
+    def fail(self, line: int, *errors: str) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append(ImportRowError(line=line, errors=list(errors)))
+
+
+async def records(chunks: AsyncIterator[bytes]) -> AsyncIterator[list[tuple[int, list[str]]]]:
+    """Parse a CSV byte stream; yield, per chunk received, its complete records with their first line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending, record, quotes, line, start = "", [], 0, 0, 1
+
+    def split(text: str, final: bool) -> tuple[str, list[tuple[int, list[str]]]]:
+        nonlocal record, quotes, line, start
+        lines = text.split("\n")
+        rest = "" if final else lines.pop()
+        complete, starts = [], []
+        for text_line in lines:
+            line += 1
+            record.append(text_line)
+            # A record ends on a line that leaves its quotes balanced
+            quotes += text_line.count('"')
+            if quotes % 2 == 0:
+                complete.append("\n".join(record))
+                starts.append(start)
+                record, quotes, start = [], 0, line + 1
+        parsed = [(first, fields) for first, fields in zip(starts, csv.reader(complete)) if any(fields)]
+        return rest, parsed
+
+    async for chunk in chunks:
+        pending, parsed = split(pending + decoder.decode(chunk), False)
+        if parsed:
+            yield parsed
+    _, parsed = split(pending + decoder.decode(b"", True), True)
+    if record:
+        raise HTTPException(status_code=400, detail=f"Unterminated quoted field from line {start}")
+    if parsed:
+        yield parsed
+
+
+class CsvImport:
+    """Import of one entity's rows, matched on the ``key`` columns."""
+
+    # Columns whose previous values ``written`` receives for the rows that existed
+    tracked: tuple[str, ...] = ()
+
+    def __init__(self, entity, model: type[BaseModel], response: type[BaseModel], key: tuple[str, ...]):
+        self.entity = entity
+        self.model = model
+        self.key = key
+        self.table = entity.__table__
+        self.serializer = RowSerializer(response, entity)
+        self.columns = [self.table.c[name] for name in model.model_fields]
+        self.required = {name for name, field in model.model_fields.items() if field.is_required()}
+        # Foreign key column -> referenced id column, checked before writing
+        self.references = {column.name: next(iter(column.foreign_keys)).column for column in self.columns if column.foreign_keys}
+        self.datetimes = {column.name for column in self.columns if isinstance(column.type, DateTime)}
+        returned = {*self.key, *self.tracked}
+        self.existing = select(*(self.table.c[name] for name in sorted(returned)))
+        # Dialect name -> statements, see ``statements``
+        self.built: dict[str, tuple] = {}
+
+    # Hooks
+
+    async def written(self, db: AsyncSession, rows: list[Row], previous: dict[tuple, Row]) -> None:
+        """Side effects of a chunk, in its transaction: ``previous`` maps the key of the
+        rows that existed to their ``tracked`` values before the chunk."""
+
+    def committed(self, rows: list[Row]) -> None:
+        pass
+
+    # Import
+
+    def values(self, row: BaseModel) -> dict:
+        values = row.model_dump()
+        for name in self.datetimes:
+            value = values[name]
+            if isinstance(value, date) and not isinstance(value, datetime):
+                values[name] = datetime.combine(value, time.min)
+        return values
+
+    def header(self, fields: list[str]) -> list[str]:
+        names = [name.strip() for name in fields]
+        missing = sorted(self.required - set(names))
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing CSV columns: {', '.join(missing)}")
+        return names
+
+    async def run(self, db: AsyncSession, chunks: AsyncIterator[bytes]) -> ImportReport:
+        """Import the CSV read from ``chunks``, committing every ``IMPORT_CHUNK_SIZE`` valid rows.
+
+        A chunk is written while the next one is parsed and validated, so the database
+        works during the Python work instead of after it; chunks are still written one at
+        a time, in file order.
+        """
+        expect_repeats()
+        report = ImportReport()
+        names, valid, writing = None, [], None
+        known = {name: set() for name in self.references}
+        try:
+            async for parsed in records(chunks):
+                for line, fields in parsed:
+                    if names is None:
+                        names = self.header(fields)
+                        continue
+                    report.rows += 1
+                    try:
+                        row = self.model.model_validate(dict(zip(names, fields)))
+                    except ValidationError as error:
+                        report.fail(line, *(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors(include_url=False)))
+                        continue
+                    valid.append((line, self.values(row)))
+                    if len(valid) >= IMPORT_CHUNK_SIZE:
+                        if writing is not None:
+                            await writing
+                        writing = asyncio.ensure_future(self.write(db, valid, report, known))
+                        valid = []
+        finally:
+            if writing is not None:
+                await writing
+        if names is None:
+            raise HTTPException(status_code=400, detail="Empty CSV: expected a header row")
+        if valid:
+            await self.write(db, valid, report, known)
+        # Rows rejected by validation and by the writes were reported as they interleaved
+        report.errors.sort(key=lambda error: error.line)
+        return report
+
+    async def write(self, db: AsyncSession, rows: list[tuple[int, dict]], report: ImportReport, known: dict[str, set]) -> None:
+        """Upsert one chunk in its own transaction, reporting the rows it skips."""
+        rows = await self.check(db, self.deduplicate(rows, report), report, known)
+        if not rows:
+            return
+        previous_statement, upsert = self.statements(db)
+        postgresql = db.bind.dialect.name == "postgresql"
+        values = [values for _, values in rows]
+        try:
+            previous = (await db.execute(previous_statement, self.arrays(values, self.key) if postgresql else self.json_keys(db, values))).all()
+            written = (await db.execute(upsert, self.arrays(values, self.model.model_fields) if postgresql else values)).all()
+            previous = {tuple(getattr(row, name) for name in self.key): row for row in previous}
+            await self.written(db, written, previous)
+            await self.emit(db, written, previous)
+            await db.commit()
+        except DBAPIError as error:
+            await db.rollback()
+            message = str(error.orig).splitlines()[0]
+            for line, _ in rows:
+                report.fail(line, f"rejected by the database with the rows of its chunk: {message}")
+            return
+        report.updated += len(previous)
+        report.created += len(written) - len(previous)
+        self.committed(written)
+
+    async def emit(self, db: AsyncSession, rows: list[Row], previous: dict[tuple, Row]) -> None:
+        """Change feed events of a chunk: ``created`` for new keys, ``updated`` with the ``tracked`` values for the others."""
+        created, updated, old = [], [], []
+        for row in rows:
+            existing = previous.get(tuple(getattr(row, name) for name in self.key))
+            if existing is None:
+                created.append(self.serializer.item(row))
+            else:
+                updated.append(self.serializer.item(row))
+                old.append({name: getattr(existing, name) for name in self.tracked} or None)
+        await feed.emit(db, self.table.name, CREATED, created)
+        await feed.emit(db, self.table.name, UPDATED, updated, old)
+
+    def statements(self, db: AsyncSession) -> tuple:
+        """The SELECT of the chunk's rows that already exist and the upsert of the chunk,
+        built once per dialect.
+
+        A chunk is bound as a few parameters, so both are compiled once: on PostgreSQL one
+        array per column, expanded by ``unnest``; on SQLite, whose upsert runs as an
+        executemany (sent in multi-row VALUES batches), the keys as one JSON array read by
+        ``json_each``.
+        """
+        dialect = db.bind.dialect.name
+        statements = self.built.get(dialect)
+        if statements is not None:
+            return statements
+        key_columns = [self.table.c[name] for name in self.key]
+        if dialect == "postgresql":
+            keys = self.unnest(self.key, "keys")
+            previous = self.existing.join_from(self.table, keys, and_(*(column == keys.c[column.name] for column in key_columns)))
+            rows = self.unnest(self.model.model_fields, "rows")
+            upsert = dialect_insert(db, self.table).from_select(list(self.model.model_fields), select(rows))
+        else:
+            keys = func.json_each(bindparam("keys")).table_valued("value").alias("keys")
+            previous = self.existing.join_from(self.table, keys, and_(*(column == func.json_extract(keys.c.value, f"$[{i}]") for i, column in enumerate(key_columns))))
+            upsert = dialect_insert(db, self.table)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=list(self.key),
+            set_={name: upsert.excluded[name] for name in self.model.model_fields if name not in self.key},
+        ).returning(*self.table.c)
+        statements = self.built[dialect] = (previous, upsert)
+        return statements
+
+    def unnest(self, names: Iterable[str], alias: str):
+        """Rows of ``unnest`` over one array parameter per column, see ``arrays``."""
+        arrays = (bindparam(f"{name}_values", type_=ARRAY(self.table.c[name].type)) for name in names)
+        return func.unnest(*arrays).table_valued(*names).render_derived(name=alias)
+
+    @staticmethod
+    def arrays(rows: list[dict], names: Iterable[str]) -> dict:
+        return {f"{name}_values": [values[name] for values in rows] for name in names}
+
+    def json_keys(self, db: AsyncSession, rows: list[dict]) -> dict:
+        # Keys stored as the column types store them (SQLite keeps datetimes as text)
+        processors = []
+        for name in self.key:
+            column_type = self.table.c[name].type
+            processors.append(column_type.dialect_impl(db.bind.dialect).bind_processor(db.bind.dialect) or (lambda value: value))
+        return {"keys": json.dumps([[process(values[name]) for name, process in zip(self.key, processors)] for values in rows])}
+
+    def deduplicate(self, rows: list[tuple[int, dict]], report: ImportReport) -> list[tuple[int, dict]]:
+        """Keep the last row of each key: one statement cannot upsert a key twice."""
+        last = {}
+        for line, values in rows:
+            key = tuple(values[name] for name in self.key)
+            if key in last:
+                report.fail(last[key][0], f"replaced by line {line}, which has the same {', '.join(self.key)}")
+            last[key] = (line, values)
+        return list(last.values()) if len(last) < len(rows) else rows
+
+    async def check(self, db: AsyncSession, rows: list[tuple[int, dict]], report: ImportReport, known: dict[str, set]) -> list[tuple[int, dict]]:
+        """Drop the rows whose foreign keys name no row. ``known`` holds the ids found by the
+        previous chunks of the import, which are not looked up again."""
+        unknown = {}
+        for name, referenced in self.references.items():
+            ids = {values[name] for _, values in rows if values[name] is not None} - known[name]
+            if ids:
+                found = set((await db.scalars(select(referenced).where(referenced.in_(ids)))).all())
+                known[name] |= found
+                ids -= found
+            unknown[name] = ids
+        if not any(unknown.values()):
+            return rows
+        kept = []
+        for line, values in rows:
+            errors = [f"{name}: no row has id {values[name]}" for name in self.references if values[name] in unknown[name]]
+            if errors:
+                report.fail(line, *errors)
+            else:
+                kept.append((line, values))
+        return kept
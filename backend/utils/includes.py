@@ -0,0 +1,58 @@
+"""
+Relationship expansion for the ``include=`` query parameter.
+
+``include=degree,classroom,mentor`` embeds the related objects in each item instead of
+their ids alone. The relationships are many-to-one, so they are joined into the query
+that loads the page (``joinedload``) and a page costs the same number of statements
+whatever its size. Items are returned as dicts holding only the requested relations,
+for response models whose relation fields default to None and are dumped with
+``exclude_unset``.
+"""
+
+from typing import Any
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.orm import joinedload
+
+from utils.cache import type_adapter
+
+
+class Include:
+    """Dependency parsing ``include`` against the relationships a resource can embed."""
+
+    def __init__(self, *relationships: str):
+        self.relationships = relationships
+
+    def __call__(self, include: str | None = Query(None, description="Comma-separated related objects to embed")) -> tuple[str, ...]:
+        if not include:
+            return ()
+        names = tuple(dict.fromkeys(name.strip() for name in include.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.relationships]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(unknown)} (expected {', '.join(self.relationships)})")
+        return names
+
+
+def eager(query: Select, entity, includes: tuple[str, ...]) -> Select:
+    """Load the included relationships of ``entity`` in the same statement."""
+    return query.options(*(joinedload(getattr(entity, name)) for name in includes))
+
+
+def expand(obj, response_model: type[BaseModel], includes: tuple[str, ...]) -> dict:
+    """``obj``'s ``response_model`` fields plus its included related objects."""
+    item = {name: getattr(obj, name) for name in response_model.model_fields}
+    for name in includes:
+        item[name] = getattr(obj, name)
+    return item
+
+
+def expand_page(page: dict, response_model: type[BaseModel], includes: tuple[str, ...]) -> dict:
+    return {"items": [expand(obj, response_model, includes) for obj in page["items"]], "next_cursor": page["next_cursor"]}
+
+
+def expanded_response(content: Any, response_type: Any) -> Response:
+    """JSON response of ``expand``-ed content, leaving out the relations that were not included."""
+    adapter = type_adapter(response_type)
+    return Response(content=adapter.dump_json(adapter.validate_python(content, from_attributes=True), exclude_unset=True), media_type="application/json")
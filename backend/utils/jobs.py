@@ -0,0 +1,242 @@
+"""
+Background jobs for the operations too long for a request: full exports, rebuilds of
+the summary tables, large imports.
+
+Submitting a job records it in the ``jobs`` table and starts it as an asyncio task of the
+worker that received it; the route answers at once with the job, whose id clients poll
+(``GET /jobs/{id}``) for its status and progress before downloading its result. The work
+waits on the database, so jobs run on the event loop like the routes rather than in a
+process pool: at most JOB_CONCURRENCY at a time per worker, the others wait queued. They
+run on the job engine, whose connections are outside the request pool and have no
+statement timeout; so do their progress, status and heartbeat writes, which never wait
+for a request connection.
+
+The table is the state shared by the workers, so any of them answers polls and
+cancellations. Every JOB_HEARTBEAT_SECONDS, each worker marks its jobs alive and cancels
+those whose cancellation another worker recorded, marks failed the jobs of workers that
+stopped heartbeating, and deletes the result files older than JOB_RESULT_TTL_HOURS.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import JobSessionLocal, query_stats
+from utils.models import Job
+from utils.settings import (
+    JOB_CONCURRENCY, JOB_HEARTBEAT_MISSES, JOB_HEARTBEAT_SECONDS, JOB_PROGRESS_INTERVAL, JOB_RESULT_TTL_HOURS,
+    JOB_RESULTS_DIR,
+)
+
+logger = logging.getLogger("app.jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobContext:
+    """What a running job sees: its id, its sessions, its progress and its result file."""
+
+    def __init__(self, job_id: int):
+        self.id = job_id
+        # (path, download name, media type) of the result file, see ``result_file``
+        self.file: tuple[str, str, str] | None = None
+        self.saved = 0.0
+
+    def session(self) -> AsyncSession:
+        """A session of the job engine (no statement timeout)."""
+        return JobSessionLocal()
+
+    async def progress(self, done: int, total: int | None = None) -> None:
+        """Record that ``done`` of ``total`` units are done, at most every JOB_PROGRESS_INTERVAL seconds."""
+        if time.monotonic() - self.saved < JOB_PROGRESS_INTERVAL:
+            return
+        self.saved = time.monotonic()
+        values = {"done": done} if total is None else {"done": done, "total": total}
+        async with JobSessionLocal() as db:
+            await db.execute(update(Job).where(Job.id == self.id).values(**values))
+            await db.commit()
+
+    def result_file(self, name: str, media_type: str) -> str:
+        """Path to write the job's result to, downloaded as ``name``."""
+        os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+        path = os.path.join(JOB_RESULTS_DIR, f"{self.id}-{uuid.uuid4().hex}-{name}")
+        self.file = (path, name, media_type)
+        return path
+
+
+# A job kind: ``function(job, **params)``, returning the JSON result of the job (or None)
+JobFunction = Callable[..., Awaitable[dict | list | None]]
+
+
+class JobRunner:
+    """The jobs of this worker process."""
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        self.kinds: dict[str, JobFunction] = {}
+        self.slots = asyncio.Semaphore(concurrency)
+        # Job id -> task, for the jobs submitted to this worker and not finished
+        self.tasks: dict[int, asyncio.Task] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat: asyncio.Task | None = None
+        self.stopping = False
+
+    def kind(self, name: str) -> Callable[[JobFunction], JobFunction]:
+        """Register the decorated coroutine as the job kind ``name``."""
+        def register(function: JobFunction) -> JobFunction:
+            self.kinds[name] = function
+            return function
+        return register
+
+    # Lifecycle
+
+    def start(self) -> None:
+        self.stopping = False
+        self.heartbeat = asyncio.create_task(self.beat())
+
+    async def stop(self) -> None:
+        """Interrupt the jobs of this worker: they are marked failed, to be submitted again."""
+        self.stopping = True
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Jobs
+
+    async def submit(self, db: AsyncSession, kind: str, params: dict | None = None) -> Job:
+        """Record a job of ``kind`` and start it in this worker."""
+        submitted = datetime.now()
+        job = Job(kind=kind, status=QUEUED, params=params or {}, done=0, cancel_requested=False, owner=self.owner, created_at=submitted, heartbeat_at=submitted)
+        db.add(job)
+        await db.commit()
+        job_id = job.id
+        self.tasks[job_id] = asyncio.create_task(self.run(job_id, kind, job.params))
+        self.tasks[job_id].add_done_callback(lambda _: self.tasks.pop(job_id, None))
+        return job
+
+    async def cancel(self, db: AsyncSession, job_id: int) -> Job:
+        """Cancel a queued or running job; a job running in another worker stops at its next heartbeat."""
+        cancelled = datetime.now()
+        statement = (
+            update(Job)
+            .where(Job.id == job_id, Job.status.in_(ACTIVE))
+            .values(
+                cancel_requested=True,
+                status=case((Job.status == QUEUED, CANCELLED), else_=Job.status),
+                finished_at=case((Job.status == QUEUED, cancelled), else_=Job.finished_at),
+            )
+            .returning(Job)
+        )
+        job = (await db.scalars(statement)).first()
+        await db.commit()
+        if job is None:
+            job = await get_job(db, job_id)
+            raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+        task = self.tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    async def run(self, job_id: int, kind: str, params: dict) -> None:
+        # The task copied the context of the submitting request: its SQL is not the request's
+        query_stats.set(None)
+        context = JobContext(job_id)
+        values = {}
+        try:
+            async with self.slots:
+                async with JobSessionLocal() as db:
+                    started = await db.scalar(
+                        update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                        .values(status=RUNNING, started_at=datetime.now()).returning(Job.id)
+                    )
+                    await db.commit()
+                if started is None:
+                    # Cancelled while queued
+                    return
+                result = await self.kinds[kind](context, **params)
+            values = {"status": SUCCEEDED, "result": result, "done": func.coalesce(Job.total, Job.done)}
+            if context.file is not None:
+                values.update(zip(("result_file", "result_name", "media_type"), context.file))
+        except asyncio.CancelledError:
+            values = {"status": FAILED, "error": "Interrupted by a server shutdown"} if self.stopping else {"status": CANCELLED}
+        except Exception as error:
+            logger.exception("job %s (%s) failed", job_id, kind)
+            detail = error.detail if isinstance(error, HTTPException) else f"{type(error).__name__}: {error}"
+            values = {"status": FAILED, "error": str(detail)}
+        if values.get("status") != SUCCEEDED and context.file is not None and os.path.exists(context.file[0]):
+            os.remove(context.file[0])
+        if values:
+            await self.finish(job_id, values)
+
+    @staticmethod
+    async def finish(job_id: int, values: dict) -> None:
+        async with JobSessionLocal() as db:
+            # A job cancelled while queued, or marked failed by the heartbeat, keeps that status
+            await db.execute(update(Job).where(Job.id == job_id, Job.status == RUNNING).values(finished_at=datetime.now(), **values))
+            await db.commit()
+
+    # Heartbeat
+
+    async def beat(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except (SQLAlchemyError, OSError):
+                logger.warning("job heartbeat failed", exc_info=True)
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def check(self) -> None:
+        """Heartbeat this worker's jobs and cancel those cancelled elsewhere; fail the jobs of
+        stopped workers; forget the expired result files."""
+        checked = datetime.now()
+        expired = checked - timedelta(hours=JOB_RESULT_TTL_HOURS)
+        async with JobSessionLocal() as db:
+            if self.tasks:
+                alive = await db.execute(
+                    update(Job).where(Job.id.in_(list(self.tasks)), Job.status.in_(ACTIVE))
+                    .values(heartbeat_at=checked).returning(Job.id, Job.cancel_requested)
+                )
+                for job_id, cancel_requested in alive.all():
+                    if cancel_requested and job_id in self.tasks:
+                        self.tasks[job_id].cancel()
+            stale = checked - timedelta(seconds=JOB_HEARTBEAT_SECONDS * JOB_HEARTBEAT_MISSES)
+            await db.execute(
+                update(Job).where(Job.status.in_(ACTIVE), Job.heartbeat_at < stale)
+                .values(status=FAILED, finished_at=checked, error="Interrupted: its worker stopped")
+            )
+            await db.execute(update(Job).where(Job.finished_at < expired, Job.result_file.is_not(None)).values(result_file=None))
+            await db.commit()
+        remove_files_before(expired)
+
+
+def remove_files_before(moment: datetime) -> None:
+    """Delete the files of JOB_RESULTS_DIR last written before ``moment``."""
+    if not os.path.isdir(JOB_RESULTS_DIR):
+        return
+    before = moment.timestamp()
+    for entry in os.scandir(JOB_RESULTS_DIR):
+        if entry.is_file() and entry.stat().st_mtime < before:
+            os.remove(entry.path)
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Job:
+    job = await db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+jobs = JobRunner()
@@ -0,0 +1,117 @@
+"""
+Request latency and SQL metrics, exposed in the Prometheus text format.
+
+``MetricsMiddleware`` is a plain ASGI middleware: for each HTTP request it installs a
+``QueryStats`` that the engine event hooks of ``utils.database`` fill in, adds a
+``Server-Timing`` header (database time, statement and row counts, time to first
+byte) and records the latency in a histogram labelled by method, route template and
+status, then has ``utils.diagnostics`` report the statements the request repeated.
+Recording is a few dict and list updates per request, cheap enough to leave on.
+Metrics are per process: with several workers, each one reports its own.
+"""
+
+from bisect import bisect_left
+from time import perf_counter
+
+from utils.database import QueryStats, query_stats
+from utils.settings import METRICS_LATENCY_BUCKETS
+
+
+class Registry:
+    """Per-route latency histograms and SQL counters."""
+
+    def __init__(self, buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        # (method, route, status) -> [per-bucket counts (last one is +Inf), sum, count]
+        self.latency: dict[tuple[str, str, str], list] = {}
+        # (method, route) -> [statements, database seconds, rows]
+        self.sql: dict[tuple[str, str], list] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: QueryStats) -> None:
+        histogram = self.latency.get((method, route, str(status)))
+        if histogram is None:
+            histogram = self.latency[method, route, str(status)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        histogram[0][bisect_left(self.buckets, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+        sql = self.sql.get((method, route))
+        if sql is None:
+            sql = self.sql[method, route] = [0, 0.0, 0]
+        sql[0] += stats.statements
+        sql[1] += stats.duration
+        sql[2] += stats.rows
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP http_request_duration_seconds Latency of HTTP requests by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), (counts, total, count) in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {count}")
+        for index, (name, kind, help_text) in enumerate([
+            ("db_statements_total", "counter", "SQL statements executed, by route template."),
+            ("db_duration_seconds_total", "counter", "Time spent executing SQL statements, by route template."),
+            ("db_rows_total", "counter", "Rows returned or affected by SQL statements, by route template."),
+        ]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), values in sorted(self.sql.items()):
+                lines.append(f'{name}{{method="{method}",route="{_escape(route)}"}} {values[index]}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def server_timing(stats: QueryStats, elapsed: float) -> bytes:
+    return (
+        f'db;dur={stats.duration * 1000:.2f};desc="{stats.statements} statements, {stats.rows} rows", '
+        f"app;dur={elapsed * 1000:.2f}"
+    ).encode()
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Time each HTTP request, count its SQL and report both."""
+
+    def __init__(self, app, registry: Registry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(scope=scope)
+        token = query_stats.set(stats)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, perf_counter() - start)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+            stats.report_repeats()
+            # The router stores the matched route in the scope; its path is the template
+            route = scope.get("route")
+            self.registry.observe(scope["method"], getattr(route, "path", "unmatched"), status, perf_counter() - start, stats)
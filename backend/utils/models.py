@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String , DateTime
+from sqlalchemy import DDL, JSON, Boolean, Column, ForeignKey, Index, Integer, Sequence, String , DateTime, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -21,6 +21,15 @@ class Mentor(Base):
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Composite (filter, id) indexes serve the filter and the keyset ORDER BY id
+        Index("ix_students_degree_id_id", "degree_id", "id"),
+        Index("ix_students_classroom_id_id", "classroom_id", "id"),
+        Index("ix_students_mentor_id_id", "mentor_id", "id"),
+        Index("ix_students_state_id", "state", "id"),
+        # Natural key of a student, matched by the CSV import's upserts
+        UniqueConstraint("first_name", "last_name", "birth_date", name="uq_students_name_birth_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     first_name = Column(String, index=True)
@@ -36,6 +45,15 @@ class Student(Base):
     mentor = relationship("Mentor", back_populates="students")
     attendances = relationship("Attendance", back_populates="student")
 
+# Trigram index over the full name, used by utils.search (PostgreSQL only)
+Index(
+    "ix_students_full_name_trgm",
+    (Student.first_name + " " + Student.last_name).label("full_name"),
+    postgresql_using="gin",
+    postgresql_ops={"full_name": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
 
 class Degree(Base):
     __tablename__ = "degrees"
@@ -51,11 +69,16 @@ class Degree(Base):
 
 class Classroom(Base):
     __tablename__ = "classrooms"
+    __table_args__ = (
+        Index("ix_classrooms_degree_id", "degree_id"),
+        Index("ix_classrooms_day_time_slot", "day", "time_slot"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, index=True)
     degree_id = Column(Integer, ForeignKey("degrees.id"))
     capacity = Column(Integer)
+    enrolled = Column(Integer, nullable=False, default=0, server_default="0")
     day = Column(String)
     time_slot = Column(String)
 
@@ -64,6 +87,9 @@ class Classroom(Base):
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_degree_id", "degree_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -74,11 +100,19 @@ class Course(Base):
     degree = relationship("Degree", back_populates="courses")
     attendances = relationship("Attendance", back_populates="course")
 
+# On PostgreSQL the table is partitioned by term on date (migration 0009, utils/partitions.py),
+# with the primary key (id, date); rows are still identified by id.
 class Attendance(Base):
     __tablename__ = "attendances"
+    __table_args__ = (
+        UniqueConstraint("student_id", "course_id", "date", name="uq_attendances_student_course_date"),
+        Index("ix_attendances_date_id", "date", "id"),
+        Index("ix_attendances_student_id_date", "student_id", "date"),
+        Index("ix_attendances_course_id_date", "course_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    date = Column(DateTime)
+    date = Column(DateTime, nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"))
     course_id = Column(Integer, ForeignKey("courses.id"))
 
@@ -104,6 +138,13 @@ class User(Base):
     
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_date_id", "date", "id"),
+        Index("ix_payments_mentor_id_date_id", "mentor_id", "date", "id"),
+        Index("ix_payments_student_id_date_id", "student_id", "date", "id"),
+        Index("ix_payments_mentor_id_quarter", "mentor_id", "quarter"),
+        Index("ix_payments_quarter", "quarter"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     amount = Column(Integer)
@@ -117,3 +158,85 @@ class Payment(Base):
     mentor = relationship("Mentor", back_populates="payments")
 
 
+
+# Pre-aggregated payment totals, maintained by the payment write paths (utils/rollups.py).
+# Missing dimensions are stored as "" / 0 so they can be part of the primary key.
+class PaymentRollup(Base):
+    __tablename__ = "payment_rollups"
+
+    quarter = Column(String, primary_key=True)
+    mentor_id = Column(Integer, primary_key=True)
+    method = Column(String, primary_key=True)
+    state = Column(String, primary_key=True)
+    total_amount = Column(Integer, nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+
+class StudentPaymentBalance(Base):
+    __tablename__ = "student_payment_balances"
+
+    student_id = Column(Integer, primary_key=True)
+    state = Column(String, primary_key=True)
+    total_amount = Column(Integer, nullable=False, default=0)
+    payment_count = Column(Integer, nullable=False, default=0)
+
+# Attendance summaries, refreshed incrementally by the attendance write paths (utils/analytics.py).
+# Weeks are numbered from Monday 1970-01-05.
+class AttendanceWeek(Base):
+    __tablename__ = "attendance_weeks"
+
+    student_id = Column(Integer, primary_key=True)
+    week = Column(Integer, primary_key=True)
+    course_id = Column(Integer, primary_key=True)
+    attended = Column(Integer, nullable=False, default=0)
+
+class CourseSession(Base):
+    __tablename__ = "course_sessions"
+    __table_args__ = (
+        Index("ix_course_sessions_week", "week"),
+    )
+
+    course_id = Column(Integer, primary_key=True)
+    date = Column(DateTime, primary_key=True)
+    week = Column(Integer, nullable=False)
+    attendees = Column(Integer, nullable=False, default=0)
+
+# Terms of attendances moved out of the database into a compressed file (utils/partitions.py)
+class AttendanceArchive(Base):
+    __tablename__ = "attendance_archives"
+
+    term = Column(String, primary_key=True)
+    starts_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=False)
+    rows = Column(Integer, nullable=False, default=0)
+    path = Column(String, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+# Background jobs (utils/jobs.py): one row per submitted job, shared by every worker.
+# status goes queued -> running -> succeeded, failed or cancelled.
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_heartbeat_at", "status", "heartbeat_at"),
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    params = Column(JSON)
+    done = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    result = Column(JSON)
+    result_file = Column(String)
+    result_name = Column(String)
+    media_type = Column(String)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    owner = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+
+# Sequence numbers of the change feed events, shared by every worker (utils/changes.py)
+change_seq = Sequence("change_seq", metadata=Base.metadata)
@@ -0,0 +1,47 @@
+"""
+Classroom occupancy counter.
+
+``Classroom.enrolled`` is maintained by the student write paths instead of being
+counted on every read, so free places are ``capacity - enrolled`` in O(1).
+"""
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.models import Classroom, Student
+
+
+async def adjust_enrolled(db: AsyncSession, classroom_id: int | None, delta: int) -> None:
+    """Add ``delta`` to a classroom's enrolled count, in the caller's transaction."""
+    if classroom_id is None or delta == 0:
+        return
+    await db.execute(update(Classroom).where(Classroom.id == classroom_id).values(enrolled=Classroom.enrolled + delta))
+
+
+classrooms = Classroom.__table__
+# Not "id"/"enrolled": names of the table's columns are taken by the SET clause
+enrolled_delta = update(classrooms).where(classrooms.c.id == bindparam("classroom_id")).values(enrolled=classrooms.c.enrolled + bindparam("delta"))
+
+
+async def adjust_enrolled_many(db: AsyncSession, deltas: dict[int | None, int]) -> None:
+    """Add each classroom's delta to its enrolled count, in the caller's transaction.
+
+    Runs one pre-built UPDATE as an executemany, in classroom id order so that concurrent
+    callers lock the classrooms in the same order.
+    """
+    params = [{"classroom_id": classroom_id, "delta": delta} for classroom_id, delta in sorted(deltas.items()) if classroom_id is not None and delta]
+    if params:
+        await db.execute(enrolled_delta, params)
+
+
+async def move_enrolment(db: AsyncSession, old_classroom_id: int | None, new_classroom_id: int | None) -> None:
+    """Move one student's seat from one classroom to another, locking them in id order."""
+    if old_classroom_id == new_classroom_id:
+        return
+    await adjust_enrolled_many(db, {old_classroom_id: -1, new_classroom_id: 1})
+
+
+async def recount_enrolled(db: AsyncSession) -> None:
+    """Rebuild every counter from the students table (repair or backfill)."""
+    counted = select(func.count(Student.id)).where(Student.classroom_id == Classroom.id).scalar_subquery()
+    await db.execute(update(Classroom).values(enrolled=counted))
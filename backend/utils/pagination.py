@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+Pages are ordered on a tuple of key columns (``id``, or ``(date, id)``) and the next
+page seeks past the last row with ``WHERE (keys) > (last values)`` instead of OFFSET,
+so every page costs the same whatever its depth. Keys must be NOT NULL: a NULL never
+compares greater, so its rows would never be reached. The cursor handed back to clients
+is an opaque url-safe encoding of the last row's key values.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Generic, TypeVar
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import BigInteger, Date, DateTime, Integer, Select, String, bindparam, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.settings import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
+
+
+class PageParams:
+    """Query parameters shared by every paginated endpoint."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = Query(None, description="Opaque cursor returned as next_cursor by the previous page"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+def encode_cursor(values: tuple) -> str:
+    """Encode the key values of the last row of a page into an opaque cursor."""
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: tuple) -> tuple:
+    """Decode a cursor back into typed key values, or raise a 400."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return tuple(_parse_value(key, value) for key, value in zip(keys, values))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_value(key, value: Any) -> Any:
+    """The key value of a cursor, checked against its column's type (a tampered cursor raises ValueError)."""
+    if isinstance(key.type, (DateTime, Date)):
+        if not isinstance(value, str):
+            raise ValueError(value)
+        return datetime.fromisoformat(value) if isinstance(key.type, DateTime) else date.fromisoformat(value)
+    if isinstance(key.type, Integer):
+        # bool is an int subclass, but never a key value; out of the column's range fails in the driver
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(value)
+        bits = 64 if isinstance(key.type, BigInteger) else 32
+        if not -2 ** (bits - 1) <= value < 2 ** (bits - 1):
+            raise ValueError(value)
+        return value
+    if isinstance(key.type, String):
+        if not isinstance(value, str):
+            raise ValueError(value)
+        return value
+    if value is None:
+        raise ValueError(value)
+    return value
+
+
+class KeysetQuery:
+    """The statements of a paginated query, built once and run with each page's parameters.
+
+    SQLAlchemy memoizes the cache key of a statement object, so reusing the same two
+    statements skips building them and looking up their compiled form on every request.
+    Filters are written with ``bindparam`` and their values passed to ``page``.
+    """
+
+    def __init__(self, query: Select, keys: tuple, rows: bool = False):
+        self.keys = keys
+        self.rows = rows
+        limit = bindparam("page_limit", type_=Integer)
+        after = tuple_(*keys) > tuple_(*(bindparam(f"page_after_{index}", type_=key.type) for index, key in enumerate(keys)))
+        self.first = query.order_by(*keys).limit(limit)
+        self.after = query.where(after).order_by(*keys).limit(limit)
+
+    async def page(self, db: AsyncSession, page: PageParams, **params) -> dict:
+        """Run one page and return it with its next cursor."""
+        params["page_limit"] = page.limit + 1
+        statement = self.first
+        if page.cursor is not None:
+            statement = self.after
+            for index, value in enumerate(decode_cursor(page.cursor, self.keys)):
+                params[f"page_after_{index}"] = value
+        result = await db.execute(statement, params)
+        items = result.all() if self.rows else result.scalars().all()
+        next_cursor = None
+        if len(items) > page.limit:
+            items = items[:page.limit]
+            last = items[-1]
+            next_cursor = encode_cursor(tuple(getattr(last, key.key) for key in self.keys))
+        return {"items": items, "next_cursor": next_cursor}
+
+
+async def paginate(db: AsyncSession, query: Select, page: PageParams, keys: tuple, rows: bool = False) -> dict:
+    """Run one page of ``query`` ordered on ``keys`` and return it with its next cursor.
+
+    With ``rows``, ``query`` selects columns (including ``keys``) and the page holds rows
+    instead of ORM objects. For a query run on every request, build a ``KeysetQuery``
+    once instead.
+    """
+    return await KeysetQuery(query, keys, rows).page(db, page)
@@ -0,0 +1,231 @@
+"""
+Term partitions and archives of the attendances table.
+
+On PostgreSQL, ``attendances`` is partitioned by range of ``date`` (migration 0009),
+one partition per term (the ``YYYY-Qn`` quarters of the reports) named
+``attendances_2024_q3``, plus ``attendances_default`` for the dates no partition covers.
+A query filtering on ``date`` only reads the partitions of its period, and a term leaves
+the database by dropping its partition instead of deleting its rows.
+
+``ensure_partitions`` creates the partitions of the current term and of the next
+ATTENDANCE_PARTITIONS_AHEAD ones; each worker runs it at startup and every
+ATTENDANCE_PARTITION_CHECK_HOURS (``keep_partitions``). Rows of a term that went to the
+default partition before its partition existed are moved into it.
+
+``archive_term`` moves a past term out of the database: its rows are written to a
+gzip-compressed CSV in ATTENDANCE_ARCHIVE_DIR, then its partition is detached and
+dropped, and the term is recorded in ``attendance_archives``. ``restore_term`` loads it
+back. The attendance summaries of archived terms are kept, so the rate endpoints still
+cover them. On SQLite, where the table is not partitioned, archiving deletes the term's
+rows instead, with the same files.
+"""
+
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, time
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, bindparam, delete, insert, select, text, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import JobSessionLocal
+from utils.export import quarter_bounds
+from utils.models import Attendance, AttendanceArchive
+from utils.rollups import quarter_of
+from utils.settings import (
+    ATTENDANCE_ARCHIVE_DIR, ATTENDANCE_PARTITION_CHECK_HOURS, ATTENDANCE_PARTITIONS_AHEAD, BULK_INSERT_CHUNK_SIZE,
+    EXPORT_CHUNK_SIZE,
+)
+
+logger = logging.getLogger("app.partitions")
+
+DEFAULT_PARTITION = "attendances_default"
+PARTITION_NAME = re.compile(r"attendances_(\d{4})_q([1-4])")
+# Columns of the archive files
+COLUMNS = ["id", "date", "student_id", "course_id"]
+# Key of the advisory lock serializing partition changes between workers
+LOCK_KEY = 7_302_023
+
+
+def term_bounds(term: str) -> tuple[str, datetime, datetime]:
+    """The canonical ``YYYY-Qn`` form of ``term`` and its [start, end) datetimes."""
+    start, end = quarter_bounds(term)
+    return quarter_of(start), datetime.combine(start, time.min), datetime.combine(end, time.min)
+
+
+def partition_name(term: str) -> str:
+    year, number = term.split("-Q")
+    return f"attendances_{year}_q{number}"
+
+
+def is_partition(table_name: str) -> bool:
+    """Whether ``table_name`` is a partition of attendances (left out of autogenerated migrations)."""
+    return table_name == DEFAULT_PARTITION or PARTITION_NAME.fullmatch(table_name) is not None
+
+
+def upcoming_terms(today: date, ahead: int = ATTENDANCE_PARTITIONS_AHEAD) -> list[str]:
+    """The current term of ``today`` and the ``ahead`` next ones."""
+    index = today.year * 4 + (today.month - 1) // 3
+    return [f"{i // 4}-Q{i % 4 + 1}" for i in range(index, index + ahead + 1)]
+
+
+async def is_partitioned(db: AsyncSession) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return await db.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'attendances'::regclass)"))
+
+
+async def partitions(db: AsyncSession) -> dict[str, int]:
+    """Partition name -> estimated rows (from the planner statistics)."""
+    rows = await db.execute(text(
+        "SELECT child.relname, GREATEST(child.reltuples, 0)::bigint FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'attendances'::regclass ORDER BY child.relname"
+    ))
+    return dict(rows.all())
+
+
+async def create_partition(db: AsyncSession, term: str) -> None:
+    """Create the partition of ``term``, moving in its rows from the default partition.
+
+    The partition is filled before being attached: attaching checks that the default
+    partition holds no row of the term.
+    """
+    term, start, end = term_bounds(term)
+    name = partition_name(term)
+    await db.execute(text(f"CREATE TABLE {name} (LIKE attendances INCLUDING DEFAULTS)"))
+    await db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING id, date, student_id, course_id) "
+            f"INSERT INTO {name} (id, date, student_id, course_id) SELECT id, date, student_id, course_id FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+    # Bounds are literals in DDL; they come from term_bounds, not from the caller
+    await db.execute(text(f"ALTER TABLE attendances ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"))
+
+
+async def ensure_partitions(db: AsyncSession, today: date | None = None) -> list[str]:
+    """Create the missing partitions of the upcoming terms; return the terms created."""
+    if not await is_partitioned(db):
+        return []
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    existing = await partitions(db)
+    created = []
+    for term in upcoming_terms(today or date.today()):
+        if partition_name(term) not in existing:
+            await create_partition(db, term)
+            created.append(term)
+    await db.commit()
+    return created
+
+
+async def keep_partitions() -> None:
+    """Run ``ensure_partitions`` now, then every ATTENDANCE_PARTITION_CHECK_HOURS."""
+    while True:
+        try:
+            async with JobSessionLocal() as db:
+                created = await ensure_partitions(db)
+            if created:
+                logger.info("created the attendance partitions of %s", ", ".join(created))
+        except (SQLAlchemyError, OSError):
+            logger.warning("attendance partition check failed", exc_info=True)
+        await asyncio.sleep(ATTENDANCE_PARTITION_CHECK_HOURS * 3600)
+
+
+async def archive_term(db: AsyncSession, term: str, directory: str = ATTENDANCE_ARCHIVE_DIR) -> AttendanceArchive:
+    """Write the attendances of a past term to a compressed CSV and remove them from the database."""
+    term, start, end = term_bounds(term)
+    if end > datetime.combine(date.today(), time.min):
+        raise HTTPException(status_code=409, detail=f"{term} is not over yet")
+    if await db.get(AttendanceArchive, term) is not None:
+        raise HTTPException(status_code=409, detail=f"{term} is already archived")
+    path = os.path.join(directory, f"{partition_name(term)}.csv.gz")
+    if os.path.exists(path):
+        raise HTTPException(status_code=409, detail=f"{path} already exists")
+    partitioned = await is_partitioned(db)
+    name = partition_name(term)
+    # Block the writes to the term while it is copied (the archive row takes SQLite's write lock)
+    if partitioned:
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    detach = partitioned and name in await partitions(db)
+    if partitioned:
+        await db.execute(text(f"LOCK TABLE {name + ', ' if detach else ''}{DEFAULT_PARTITION} IN EXCLUSIVE MODE"))
+    archive = AttendanceArchive(term=term, starts_at=start, ends_at=end, rows=0, path=path, archived_at=datetime.now())
+    db.add(archive)
+    await db.flush()
+
+    os.makedirs(directory, exist_ok=True)
+    in_term = (Attendance.date >= start, Attendance.date < end)
+    # Read in keyset batches rather than through a server-side cursor, which would keep
+    # the partition in use until the end of the transaction and block its DROP
+    query = select(*(getattr(Attendance, column) for column in COLUMNS)).where(*in_term).order_by(Attendance.date, Attendance.id).limit(EXPORT_CHUNK_SIZE)
+    after = query.where(tuple_(Attendance.date, Attendance.id) > tuple_(bindparam("after_date", type_=DateTime), bindparam("after_id", type_=Integer)))
+    try:
+        with gzip.open(f"{path}.part", "wt", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS)
+            rows = (await db.execute(query)).all()
+            while rows:
+                writer.writerows((row.id, row.date.isoformat(), row.student_id, row.course_id) for row in rows)
+                archive.rows += len(rows)
+                rows = (await db.execute(after, {"after_date": rows[-1].date, "after_id": rows[-1].id})).all()
+        removed = 0
+        if detach:
+            removed = await db.scalar(text(f"SELECT COUNT(*) FROM {name}"))
+            await db.execute(text(f"ALTER TABLE attendances DETACH PARTITION {name}"))
+            await db.execute(text(f"DROP TABLE {name}"))
+        # Rows of the term in the default partition, or every row of it without partitions
+        removed += (await db.execute(delete(Attendance).where(*in_term))).rowcount
+        if removed != archive.rows:
+            raise HTTPException(status_code=409, detail=f"{term}: {archive.rows} rows written but {removed} removed")
+        os.replace(f"{path}.part", path)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        for leftover in (f"{path}.part", path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return archive
+
+
+async def restore_term(db: AsyncSession, term: str) -> AttendanceArchive:
+    """Load an archived term back into the database and delete its file."""
+    term, _, _ = term_bounds(term)
+    archive = await db.get(AttendanceArchive, term)
+    if archive is None:
+        raise HTTPException(status_code=404, detail=f"{term} is not archived")
+    partitioned = await is_partitioned(db)
+    if partitioned:
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        if partition_name(term) not in await partitions(db):
+            await create_partition(db, term)
+    statement = insert(Attendance)
+    with gzip.open(archive.path, "rt", newline="") as file:
+        reader = csv.DictReader(file)
+        chunk = []
+        for row in reader:
+            chunk.append({
+                "id": int(row["id"]),
+                "date": datetime.fromisoformat(row["date"]),
+                "student_id": int(row["student_id"]) if row["student_id"] else None,
+                "course_id": int(row["course_id"]) if row["course_id"] else None,
+            })
+            if len(chunk) >= BULK_INSERT_CHUNK_SIZE:
+                await db.execute(statement, chunk)
+                chunk = []
+        if chunk:
+            await db.execute(statement, chunk)
+    if partitioned:
+        # Statistics for the planner, which would otherwise take the partition for empty
+        await db.execute(text(f"ANALYZE {partition_name(term)}"))
+    await db.delete(archive)
+    await db.commit()
+    os.remove(archive.path)
+    return archive
@@ -0,0 +1,151 @@
+"""
+Bulk placement of students in the classrooms of their degree.
+
+``place_students`` assigns a batch of students in one transaction. It locks the
+students, then the degree's classrooms, in id order. The student write routes also
+update a student before the counters of its classrooms, and move a seat between two
+classrooms in id order (``move_enrolment``), so they cannot deadlock with it. It then
+works from a ``SeatIndex``: the free seats (``capacity - enrolled``) of the locked
+classrooms, grouped by ``(day, time_slot)``. Every choice is made in memory, then the
+students are moved by one executemany and the counters by one more
+(``adjust_enrolled_many``). Concurrent placements for the same degree wait for each
+other's commit and then see each other's seats, so no classroom goes over capacity. On
+SQLite, which has no row locks, the first statement takes the database's write lock
+instead.
+
+A student can ask for a day, a time slot or both. It goes to the matching slot with the
+most free seats, and there to the classroom with the most free seats, so that an intake
+spreads evenly. A student already in a classroom of the degree that matches its request
+stays there. A student who moves frees its seat for the students after it in the
+batch; one who finds no free seat keeps the seat it has.
+"""
+
+import heapq
+from collections import Counter
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.changes import UPDATED, feed
+from utils.database import expect_repeats
+from utils.models import Classroom, Student
+from utils.occupancy import adjust_enrolled_many
+from utils.serialization import RowSerializer
+
+
+class SeatIndex:
+    """Free seats of a degree's classrooms, by ``(day, time_slot)``, the most free first."""
+
+    def __init__(self, classrooms):
+        # (day, time_slot) -> heap of [-free seats, classroom id]; free seats per slot
+        self.heaps: dict[tuple[str, str], list[list[int]]] = {}
+        self.free: Counter[tuple[str, str]] = Counter()
+        # classroom id -> its slot and heap entry
+        self.entries: dict[int, tuple[tuple[str, str], list[int]]] = {}
+        for classroom in classrooms:
+            slot = (classroom.day, classroom.time_slot)
+            # A classroom without a capacity takes no placement
+            entry = [-max(0, (classroom.capacity or 0) - classroom.enrolled), classroom.id]
+            self.heaps.setdefault(slot, []).append(entry)
+            self.free[slot] -= entry[0]
+            self.entries[classroom.id] = (slot, entry)
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def __contains__(self, classroom_id: int) -> bool:
+        return classroom_id in self.entries
+
+    def slot(self, classroom_id: int) -> tuple[str, str]:
+        return self.entries[classroom_id][0]
+
+    def take(self, day: str | None = None, time_slot: str | None = None) -> int | None:
+        """Take a seat in the matching slot with the most free seats; the classroom id, or None when all are full."""
+        slots = [slot for slot in self.heaps if (day is None or slot[0] == day) and (time_slot is None or slot[1] == time_slot)]
+        slot = max(slots, key=self.free.__getitem__, default=None)
+        if slot is None or self.free[slot] == 0:
+            return None
+        heap = self.heaps[slot]
+        entry = heap[0]
+        entry[0] += 1
+        heapq.heapreplace(heap, entry)
+        self.free[slot] -= 1
+        return entry[1]
+
+    def release(self, classroom_id: int) -> None:
+        """Give back the seat of a student leaving the classroom."""
+        slot, entry = self.entries[classroom_id]
+        entry[0] -= 1
+        heapq.heapify(self.heaps[slot])
+        self.free[slot] += 1
+
+
+def matches(slot: tuple[str, str], request) -> bool:
+    return (request.day is None or slot[0] == request.day) and (request.time_slot is None or slot[1] == request.time_slot)
+
+
+classrooms_of_degree = select(Classroom.id, Classroom.day, Classroom.time_slot, Classroom.capacity, Classroom.enrolled).where(Classroom.degree_id == bindparam("of_degree")).order_by(Classroom.id)
+classrooms = Classroom.__table__
+# SQLite: a no-op write taking the database's write lock, returning the same columns.
+# Not "degree_id": names of the table's columns are taken by the SET clause
+touch_classrooms = update(classrooms).where(classrooms.c.degree_id == bindparam("of_degree")).values(enrolled=classrooms.c.enrolled).returning(
+    classrooms.c.id, classrooms.c.day, classrooms.c.time_slot, classrooms.c.capacity, classrooms.c.enrolled
+)
+students = Student.__table__
+# Not "id"/"classroom_id": names of the table's columns are taken by the SET clause
+move_student = update(students).where(students.c.id == bindparam("student_id")).values(classroom_id=bindparam("new_classroom_id"))
+
+
+async def place_students(db: AsyncSession, degree_id: int, requests: list, rows: RowSerializer) -> list[dict]:
+    """Place students in the classrooms of ``degree_id`` and commit.
+
+    ``requests`` have a ``student_id`` and an optional ``day`` and ``time_slot``; ``rows``
+    encodes the moved students for their change feed events. Returns one outcome per
+    request, in request order, with its status: ``placed``, ``unchanged``, ``no_seat``,
+    ``unknown_student``, ``other_degree`` or ``duplicate``.
+    """
+    expect_repeats()
+    ids = sorted({request.student_id for request in requests})
+    selected = rows.select().where(Student.id.in_(ids)).order_by(Student.id)
+    if db.bind.dialect.name == "postgresql":
+        found = (await db.execute(selected.with_for_update())).all() if ids else []
+        index = SeatIndex((await db.execute(classrooms_of_degree.with_for_update(), {"of_degree": degree_id})).all())
+    else:
+        index = SeatIndex(sorted((await db.execute(touch_classrooms, {"of_degree": degree_id})).all()))
+        found = (await db.execute(selected)).all() if ids else []
+    found = {student.id: student for student in found}
+
+    outcomes, seen = [], set()
+    deltas, moves, events, previous = Counter(), [], [], []
+    for request in requests:
+        student = found.get(request.student_id)
+        outcome = {"student_id": request.student_id, "status": "placed", "classroom_id": None, "previous_classroom_id": student and student.classroom_id}
+        outcomes.append(outcome)
+        if student is None:
+            outcome["status"] = "unknown_student"
+        elif student.degree_id != degree_id:
+            outcome["status"] = "other_degree"
+        elif request.student_id in seen:
+            outcome["status"] = "duplicate"
+        elif student.classroom_id in index and matches(index.slot(student.classroom_id), request):
+            outcome["status"], outcome["classroom_id"] = "unchanged", student.classroom_id
+        else:
+            classroom_id = index.take(request.day, request.time_slot)
+            if classroom_id is None:
+                outcome["status"] = "no_seat"
+            else:
+                if student.classroom_id in index:
+                    index.release(student.classroom_id)
+                outcome["classroom_id"] = classroom_id
+                deltas[student.classroom_id] -= 1
+                deltas[classroom_id] += 1
+                moves.append({"student_id": student.id, "new_classroom_id": classroom_id})
+                events.append({**rows.item(student), "classroom_id": classroom_id})
+                previous.append({"classroom_id": student.classroom_id})
+        seen.add(request.student_id)
+
+    if moves:
+        await db.execute(move_student, moves)
+        await adjust_enrolled_many(db, deltas)
+        await feed.emit(db, "students", UPDATED, events, previous)
+    await db.commit()
+    return outcomes
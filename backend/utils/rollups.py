@@ -0,0 +1,95 @@
+"""
+Payment rollups behind the reporting endpoints.
+
+``PaymentRollup`` holds the total and count of payments per (quarter, mentor, method,
+state) and ``StudentPaymentBalance`` per (student, state). Every payment write applies
+its delta with an upsert in the caller's transaction, so reports run ``GROUP BY`` over
+these small tables instead of scanning payments.
+"""
+
+from sqlalchemy import Executable, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.database import dialect_insert
+from utils.models import Payment, PaymentRollup, StudentPaymentBalance
+
+
+def quarter_of(date) -> str | None:
+    """The ``YYYY-Qn`` quarter a payment date falls in."""
+    return f"{date.year}-Q{(date.month - 1) // 3 + 1}" if date else None
+
+
+# The payment columns the rollups depend on
+ROLLUP_COLUMNS = ("amount", "quarter", "mentor_id", "method", "state", "student_id")
+
+
+def payment_values(payment: Payment) -> dict:
+    """The columns of ``payment`` the rollups depend on, to diff before and after a write."""
+    return {name: getattr(payment, name) for name in ROLLUP_COLUMNS}
+
+
+async def _upsert(db: AsyncSession, model, keys: dict, amount: int, count: int) -> None:
+    statement = dialect_insert(db, model).values(**keys, total_amount=amount, payment_count=count)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            "total_amount": model.total_amount + statement.excluded.total_amount,
+            "payment_count": model.payment_count + statement.excluded.payment_count,
+        },
+    )
+    await db.execute(statement)
+
+
+async def apply_payment(db: AsyncSession, values: dict | None, sign: int) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) one payment's ``payment_values`` from the rollups."""
+    if values is None:
+        return
+    amount = sign * (values["amount"] or 0)
+    await _upsert(db, PaymentRollup, {
+        "quarter": values["quarter"] or "",
+        "mentor_id": values["mentor_id"] or 0,
+        "method": values["method"] or "",
+        "state": values["state"] or "",
+    }, amount, sign)
+    if values["student_id"] is not None:
+        await _upsert(db, StudentPaymentBalance, {"student_id": values["student_id"], "state": values["state"] or ""}, amount, sign)
+
+
+async def move_payment(db: AsyncSession, old: dict, new: dict) -> None:
+    """Move one payment's contribution after an update."""
+    if old == new:
+        return
+    await apply_payment(db, old, -1)
+    await apply_payment(db, new, 1)
+
+
+def rebuild_statements() -> list[Executable]:
+    """Statements that recompute both rollups from the payments table."""
+    amount = func.coalesce(func.sum(Payment.amount), 0)
+    dimensions = [
+        func.coalesce(Payment.quarter, "").label("quarter"),
+        func.coalesce(Payment.mentor_id, 0).label("mentor_id"),
+        func.coalesce(Payment.method, "").label("method"),
+        func.coalesce(Payment.state, "").label("state"),
+    ]
+    balance_state = func.coalesce(Payment.state, "").label("state")
+    return [
+        delete(PaymentRollup),
+        delete(StudentPaymentBalance),
+        insert(PaymentRollup).from_select(
+            ["quarter", "mentor_id", "method", "state", "total_amount", "payment_count"],
+            select(*dimensions, amount, func.count(Payment.id)).group_by(*dimensions),
+        ),
+        insert(StudentPaymentBalance).from_select(
+            ["student_id", "state", "total_amount", "payment_count"],
+            select(Payment.student_id, balance_state, amount, func.count(Payment.id))
+            .where(Payment.student_id.is_not(None))
+            .group_by(Payment.student_id, balance_state),
+        ),
+    ]
+
+
+async def rebuild_rollups(db: AsyncSession) -> None:
+    """Rebuild the rollups from scratch (repair or backfill), in the caller's transaction."""
+    for statement in rebuild_statements():
+        await db.execute(statement)
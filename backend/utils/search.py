@@ -0,0 +1,155 @@
+"""
+Fuzzy student search.
+
+On PostgreSQL, names are matched through a pg_trgm GIN index over
+``first_name || ' ' || last_name`` (see ``utils.models``): substring and prefix matches
+use ``ILIKE`` and typos use word similarity (``<%``), both served by the index, and
+results are ranked by trigram similarity with a bonus for prefix matches.
+
+Other databases (SQLite test databases) use ``TrigramIndex``, an in-process index built
+on the first search and kept current by the student write handlers, which applies the
+same trigram rules and ranking.
+"""
+
+import heapq
+import unicodedata
+from collections import Counter
+
+from sqlalchemy import case, func, literal, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.models import Student
+from utils.settings import SEARCH_MIN_SCORE, SEARCH_PREFIX_BONUS
+
+
+def normalize(text: str | None) -> str:
+    """Lowercase ``text`` and strip its accents."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of every word of ``text``, padded like pg_trgm (two spaces before, one after)."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    """pg_trgm similarity: shared trigrams over the union of both sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TrigramIndex:
+    """In-process trigram index over student names, for databases without pg_trgm."""
+
+    def __init__(self):
+        # student id -> (normalized name, trigram count of the name, trigrams of each word)
+        self.entries: dict[int, tuple[str, int, list[set[str]]]] = {}
+        self.postings: dict[str, set[int]] = {}
+        self.loaded = False
+
+    async def load(self, db: AsyncSession) -> None:
+        """Build the index from the students table."""
+        self.entries.clear()
+        self.postings.clear()
+        rows = await db.execute(select(Student.id, Student.first_name, Student.last_name))
+        for student_id, first_name, last_name in rows:
+            self.add(student_id, first_name, last_name)
+        self.loaded = True
+
+    def add(self, student_id: int, first_name: str | None, last_name: str | None) -> None:
+        """Index (or re-index) one student."""
+        self.discard(student_id)
+        name = normalize(f"{first_name or ''} {last_name or ''}")
+        name_grams = trigrams(name)
+        self.entries[student_id] = (name, len(name_grams), [trigrams(word) for word in name.split()])
+        for gram in name_grams:
+            self.postings.setdefault(gram, set()).add(student_id)
+
+    def discard(self, student_id: int) -> None:
+        """Remove one student from the index."""
+        entry = self.entries.pop(student_id, None)
+        if entry is None:
+            return
+        name = entry[0]
+        for gram in trigrams(name):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(student_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, query: str, limit: int) -> list[tuple[int, float]]:
+        """Return up to ``limit`` (student id, score) pairs, best first."""
+        query = normalize(query).strip()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        candidates = Counter()
+        for gram in query_grams:
+            candidates.update(self.postings.get(gram, ()))
+        scored = []
+        for student_id, shared in candidates.items():
+            name, name_size, word_grams = self.entries[student_id]
+            score = max([shared / (len(query_grams) + name_size - shared)] + [similarity(query_grams, grams) for grams in word_grams])
+            if any(word.startswith(query) for word in name.split()):
+                score += SEARCH_PREFIX_BONUS
+            elif query in name:
+                score = max(score, SEARCH_MIN_SCORE)
+            if score >= SEARCH_MIN_SCORE:
+                scored.append((score, -student_id))
+        return [(-negative_id, score) for score, negative_id in heapq.nlargest(limit, scored)]
+
+
+trigram_index = TrigramIndex()
+
+
+def index_student(student: Student) -> None:
+    """Keep the in-process index current after a student write."""
+    if trigram_index.loaded:
+        trigram_index.add(student.id, student.first_name, student.last_name)
+
+
+def unindex_student(student_id: int) -> None:
+    """Drop a deleted student from the in-process index."""
+    if trigram_index.loaded:
+        trigram_index.discard(student_id)
+
+
+async def search_students(db: AsyncSession, query: str, limit: int) -> list[tuple[Student, float]]:
+    """Return up to ``limit`` students matching ``query`` with their score, best first."""
+    if db.bind.dialect.name == "postgresql":
+        return await _search_postgresql(db, query, limit)
+    if not trigram_index.loaded:
+        await trigram_index.load(db)
+    hits = trigram_index.search(query, limit)
+    students = {student.id: student for student in await db.scalars(select(Student).where(Student.id.in_([student_id for student_id, _ in hits])))}
+    return [(students[student_id], score) for student_id, score in hits if student_id in students]
+
+
+async def _search_postgresql(db: AsyncSession, query: str, limit: int) -> list[tuple[Student, float]]:
+    query = query.strip()
+    # Same expression as the ix_students_full_name_trgm index (an inline ' ', not a
+    # bind parameter, so the planner can match it)
+    name = (Student.first_name + literal_column("' '") + Student.last_name).self_group()
+    term = literal(query)
+    is_prefix = or_(Student.first_name.istartswith(query, autoescape=True), Student.last_name.istartswith(query, autoescape=True))
+    score = (
+        func.greatest(func.similarity(name, term), func.word_similarity(term, name))
+        + case((is_prefix, SEARCH_PREFIX_BONUS), else_=0)
+    ).label("score")
+    statement = (
+        select(Student, score)
+        .where(or_(name.icontains(query, autoescape=True), term.op("<%")(name)))
+        .order_by(score.desc(), Student.id)
+        .limit(limit)
+    )
+    return [(student, float(rank)) for student, rank in (await db.execute(statement)).all()]
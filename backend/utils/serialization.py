@@ -0,0 +1,89 @@
+"""
+Fast JSON path for large list responses.
+
+Returning ORM objects annotated as ``Page[XResponse]`` makes FastAPI validate every row
+into a Pydantic model, dump it back to Python and hand the result to ``json.dumps``.
+``RowSerializer`` selects only the response model's columns as plain rows and encodes a
+page straight to bytes with orjson, or with the standard library encoder when orjson
+is not installed. The bytes match the model path: fields keep the response model's
+order, dates and datetimes are ISO formatted and float fields are coerced from integer
+columns. The one known difference is orjson spelling floats of 1e16 and above without
+the exponent sign (``1e16`` instead of ``1e+16``).
+"""
+
+import json
+import types
+from datetime import date, datetime
+from typing import Any, Callable, Union, get_args, get_origin
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import Select, select
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """Encode ``value`` as compact UTF-8 JSON, like FastAPI's JSONResponse."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_isoformat).encode()
+
+
+def _isoformat(value: date) -> str:
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _as_date(value: date) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _converter(annotation: Any) -> Callable[[Any], Any] | None:
+    """How to turn a column value into what the field serializes as, None if it already is."""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    if annotation is date:
+        return _as_date
+    if annotation is float:
+        return float
+    return None
+
+
+class RowSerializer:
+    """Encode rows of an entity's columns as the JSON of a flat response model."""
+
+    def __init__(self, response_model: type[BaseModel], entity: Any):
+        self.fields = tuple(response_model.model_fields)
+        self.columns = tuple(getattr(entity, name) for name in self.fields)
+        self.converters = tuple(_converter(field.annotation) for field in response_model.model_fields.values())
+
+    def select(self) -> Select:
+        """SELECT of the response model's columns, to filter and paginate like ``select(entity)``."""
+        return select(*self.columns)
+
+    def items(self, rows) -> list[dict]:
+        fields = self.fields
+        if not any(self.converters):
+            return [dict(zip(fields, row)) for row in rows]
+        converters = self.converters
+        return [
+            dict(zip(fields, [value if convert is None or value is None else convert(value) for convert, value in zip(converters, row)]))
+            for row in rows
+        ]
+
+    def item(self, row) -> dict:
+        """One row holding at least the model's columns (``RETURNING`` every column), as ``items`` gives it."""
+        return self.items([tuple(getattr(row, name) for name in self.fields)])[0]
+
+    def encode_page(self, page: dict) -> bytes:
+        return dumps({"items": self.items(page["items"]), "next_cursor": page["next_cursor"]})
+
+    def page_response(self, page: dict) -> Response:
+        """JSON response of a page returned by ``paginate(..., rows=True)``."""
+        return Response(content=self.encode_page(page), media_type="application/json")
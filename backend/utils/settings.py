@@ -1,5 +1,108 @@
+import os
+import tempfile
+
 # Allow requests from the frontend
 ORIGINS = [
     "http://localhost:3000",
     "localhost:3000"
-]
\ No newline at end of file
+]
+
+# Pagination of list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per server-side cursor round trip when streaming exports
+EXPORT_CHUNK_SIZE = 1000
+
+# Rows per multi-row INSERT statement for bulk writes
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# CSV imports: rows validated and written per transaction, and most row errors listed
+# in the report (the others are only counted)
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Student search: minimum trigram score of a hit, bonus for prefix matches, result limits
+SEARCH_MIN_SCORE = 0.3
+SEARCH_PREFIX_BONUS = 0.5
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Reference data response cache (degrees, courses, classrooms)
+CACHE_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 256
+
+# Payment states counted as still owed by the outstanding-amounts report
+OUTSTANDING_PAYMENT_STATES = ("pending", "late")
+
+# Largest id list accepted by the batch get-by-ids endpoints
+MAX_BATCH_IDS = 1000
+
+# Most students placed by one request of the bulk placement endpoint
+MAX_PLACEMENT_STUDENTS = 20000
+
+# Upper bounds (seconds) of the request latency histogram buckets exposed on /metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Query diagnostics: log statements slower than SLOW_QUERY_MS (with their parameters and
+# route), and requests repeating one statement N_PLUS_ONE_THRESHOLD times or more.
+# Set either to 0 to turn it off.
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Production server: port, and worker processes sharing the database (main.py --production
+# starts one per CPU unless WEB_WORKERS is set)
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
+# Connection pools of the request path (PostgreSQL). Each worker gets an equal share of
+# DB_MAX_CONNECTIONS (the server's max_connections) minus DB_RESERVED_CONNECTIONS kept
+# for migrations, scripts and administration, unless DB_POOL_SIZE / DB_MAX_OVERFLOW are set.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+DB_POOL_SIZE = int(os.environ["DB_POOL_SIZE"]) if "DB_POOL_SIZE" in os.environ else None
+DB_MAX_OVERFLOW = int(os.environ["DB_MAX_OVERFLOW"]) if "DB_MAX_OVERFLOW" in os.environ else None
+# Seconds to wait for a free connection, and age after which a connection is replaced
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Check connections with a round trip when they leave the pool (survives database restarts)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Server-side limits of one statement and of one lock wait (milliseconds, 0 for none)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "5000"))
+
+# Startup warm-up: open the request pool and run the hot read routes before /health/ready
+# reports ready; retried every WARMUP_RETRY_SECONDS while the database is unreachable
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+WARMUP_RETRY_SECONDS = 5
+
+# Background jobs (utils/jobs.py): jobs run at once per worker (each holds one connection of
+# the job pool, outside the request pool), seconds between progress writes, seconds between
+# heartbeats (a job whose worker missed JOB_HEARTBEAT_MISSES of them is marked failed),
+# directory of the result files and hours a finished job's file is kept, and largest CSV
+# upload accepted by an import job
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_PROGRESS_INTERVAL = 1.0
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_HEARTBEAT_MISSES = 3
+JOB_RESULTS_DIR = os.getenv("JOB_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "islah-jobs"))
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+JOB_UPLOAD_MAX_BYTES = int(os.getenv("JOB_UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Attendance partitions (PostgreSQL, utils/partitions.py): one per term, created up to
+# ATTENDANCE_PARTITIONS_AHEAD terms after the current one at startup and every
+# ATTENDANCE_PARTITION_CHECK_HOURS; archived terms are written to ATTENDANCE_ARCHIVE_DIR
+ATTENDANCE_PARTITIONS_AHEAD = 2
+ATTENDANCE_PARTITION_CHECK_HOURS = 24
+ATTENDANCE_ARCHIVE_DIR = os.getenv("ATTENDANCE_ARCHIVE_DIR", "archives")
+
+# Change feed (utils/changes.py): events each worker keeps for the clients resuming from a
+# sequence number, events queued per subscriber before it is caught up from them instead,
+# seconds between keep-alive messages of an idle stream, and seconds before the listener
+# (PostgreSQL) reconnects. On PostgreSQL, an event received above a missing number waits
+# at most CHANGE_FEED_REORDER_MS for it (the write holding it has yet to commit, or rolled back)
+CHANGE_FEED_BUFFER = int(os.getenv("CHANGE_FEED_BUFFER", "10000"))
+CHANGE_FEED_REORDER_MS = int(os.getenv("CHANGE_FEED_REORDER_MS", "500"))
+CHANGE_FEED_QUEUE_SIZE = 1000
+CHANGE_FEED_KEEPALIVE_SECONDS = 15
+CHANGE_FEED_RETRY_SECONDS = 5
@@ -0,0 +1,60 @@
+"""
+Query budget assertions for tests.
+
+``assert_max_queries(n)`` fails when the code under it runs more than ``n`` SQL
+statements, listing them, so a route that starts fetching per item fails its test
+instead of slowing down in production::
+
+    import httpx
+    from app.api import app
+    from utils.testing import assert_max_queries
+
+    async def test_students_page_budget():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            with assert_max_queries(1):
+                response = await client.get("/students", params={"include": "degree,classroom", "limit": 100})
+        assert response.status_code == 200
+
+Statements are counted on the application engines whatever task runs them, so the
+block should not overlap with unrelated database work.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+
+from utils.database import async_engine, engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def count_queries() -> Iterator[list[str]]:
+    """Collect the SQL text of the statements executed in the block."""
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = (engine, async_engine.sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", record)
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[list[str]]:
+    """Fail with ``QueryBudgetExceeded`` (an ``AssertionError``) if the block runs more than ``n`` statements."""
+    __tracebackhide__ = True  # pytest shows the caller's line
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > n:
+        listing = "\n".join(f"  {index}. {' '.join(statement.split())}" for index, statement in enumerate(statements, 1))
+        raise QueryBudgetExceeded(f"{len(statements)} SQL statements executed, budget is {n}:\n{listing}")
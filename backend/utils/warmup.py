@@ -0,0 +1,75 @@
+"""
+Startup warm-up behind the readiness probe.
+
+Otherwise a new worker opens its database connections, compiles its SQL and builds its
+serializers on the first requests it serves, which shows as a latency spike on every
+deploy. ``warm_up`` opens the request pool's connections up front, then sends the hot
+read routes of each router, as many at once as the pool holds connections, so that
+each connection runs (and asyncpg prepares) each statement. Requests go straight to
+the app's router: the middleware is skipped, so metrics only count real traffic.
+``/health/ready`` answers 503 until the warm-up has finished.
+"""
+
+import asyncio
+import logging
+
+import httpx
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from utils.settings import WARMUP_RETRY_SECONDS
+
+logger = logging.getLogger("app.warmup")
+
+# Hot read routes of each router, with an id of the seeded data where one is needed
+WARM_PATHS = [
+    "/students?limit=1",
+    "/students?limit=1&include=degree,classroom,mentor",
+    "/students/1",
+    "/students/filter?state=active&limit=1",
+    "/mentors?limit=1",
+    "/mentors/1",
+    "/degrees",
+    "/degrees/1",
+    "/classrooms?limit=1",
+    "/classrooms/availability",
+    "/courses?limit=1",
+    "/attendances?limit=1",
+    "/attendances/rates/students/1",
+    "/payments?limit=1",
+    "/payments/report",
+]
+
+
+async def prefill_pool(engine: AsyncEngine) -> int:
+    """Open the pool's connections at once, then return them to it; returns how many."""
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    connections = await asyncio.gather(*(engine.connect().start() for _ in range(size)))
+    for connection in connections:
+        await connection.close()
+    return size
+
+
+async def warm_routes(router, concurrency: int) -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=router), base_url="http://warmup") as client:
+        for path in WARM_PATHS:
+            responses = await asyncio.gather(*(client.get(path) for _ in range(concurrency)))
+            if responses[0].status_code >= 500:
+                raise RuntimeError(f"GET {path} answered {responses[0].status_code}")
+
+
+async def warm_up(app, engine: AsyncEngine) -> None:
+    """Warm the pool and the hot routes, retrying until the database answers, then mark ``app`` ready."""
+    while True:
+        try:
+            size = await prefill_pool(engine)
+            await warm_routes(app.router, size)
+            break
+        except (SQLAlchemyError, OSError, RuntimeError) as error:
+            logger.warning("warm-up failed, retrying in %ss: %s", WARMUP_RETRY_SECONDS, error)
+        except Exception:
+            # A bug in a warmed route would otherwise end the task and leave the worker unready
+            logger.exception("warm-up failed unexpectedly, retrying in %ss", WARMUP_RETRY_SECONDS)
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    app.state.ready = True
+    logger.info("warm-up done: %d connections, %d routes", size, len(WARM_PATHS))
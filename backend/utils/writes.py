@@ -0,0 +1,106 @@
+"""
+Single-statement writes for the POST, PUT, PATCH and DELETE routes.
+
+``insert_returning``, ``update_returning`` and ``delete_returning`` run one
+``INSERT``/``UPDATE``/``DELETE ... RETURNING`` and return the written row, or None when
+no row has the id (the routes answer 404), instead of loading the row, changing it and
+reading it back. Side effects such as classroom occupancy or payment rollups need some
+previous values of the row: on PostgreSQL they come back from the same statement,
+joined from a locked read of the row (``UPDATE ... FROM (SELECT ... FOR UPDATE) AS
+old``). SQLite's RETURNING only sees the new row, so there they are read by a SELECT
+first, a cheap call on an in-process database.
+
+Statements are built once per table (and set of previous columns) with the row id as a
+bind parameter, and the written values are passed as execution parameters: SQLAlchemy
+derives the SET clause from their keys and serves each shape from its compiled cache.
+"""
+
+import functools
+
+from pydantic import BaseModel, create_model
+from sqlalchemy import Row, Table, bindparam, delete, insert, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ONETOMANY
+
+
+def partial(model: type[BaseModel]) -> type[BaseModel]:
+    """``model`` with every field optional, for PATCH bodies dumped with ``exclude_unset``.
+
+    Fields keep their type, so an explicit null is still rejected where the full model
+    rejects it.
+    """
+    fields = {name: (field.annotation, None) for name, field in model.model_fields.items()}
+    return create_model(f"{model.__name__.removesuffix('Model')}Patch", **fields)
+
+
+def _row_id(table: Table):
+    # Not "id": names of the table's columns are taken by the SET clause
+    return bindparam("row_id", type_=table.c.id.type)
+
+
+@functools.cache
+def _select(table: Table, columns: tuple[str, ...] | None = None):
+    selected = table.c if columns is None else (table.c[name] for name in columns)
+    return select(*selected).where(table.c.id == _row_id(table))
+
+
+@functools.cache
+def _insert(table: Table):
+    return insert(table).returning(*table.c)
+
+
+@functools.cache
+def _update(table: Table, old: tuple[str, ...] = (), postgresql: bool = False):
+    if not postgresql or not old:
+        return update(table).where(table.c.id == _row_id(table)).returning(*table.c)
+    previous = select(table.c.id, *(table.c[name] for name in old)).where(table.c.id == _row_id(table)).with_for_update().subquery("old")
+    return update(table).where(table.c.id == previous.c.id).returning(*table.c, *(previous.c[name].label(f"old_{name}") for name in old))
+
+
+@functools.cache
+def _delete(entity) -> tuple:
+    """DELETE RETURNING of ``entity``'s table, after the UPDATEs detaching its one-to-many children."""
+    detach = []
+    for relationship in inspect(entity).relationships:
+        if relationship.direction is ONETOMANY:
+            for _, remote in relationship.local_remote_pairs:
+                detach.append(update(remote.table).where(remote == bindparam("row_id")).values({remote.name: None}))
+    table = entity.__table__
+    return tuple(detach), delete(table).where(table.c.id == _row_id(table)).returning(*table.c)
+
+
+async def insert_returning(db: AsyncSession, entity, values: dict) -> Row:
+    """Insert a row of ``entity`` with ``values`` and return it, defaults included."""
+    return (await db.execute(_insert(entity.__table__), values)).one()
+
+
+async def update_returning(db: AsyncSession, entity, id: int, values: dict, old: tuple[str, ...] = ()) -> tuple[Row, dict] | None:
+    """Set ``values`` on the row ``id`` of ``entity``; return the new row and the previous values of the ``old`` columns."""
+    table = entity.__table__
+    if not values:
+        row = (await db.execute(_select(table), {"row_id": id})).first()
+        return None if row is None else (row, {name: getattr(row, name) for name in old})
+    params = {**values, "row_id": id}
+    if not old:
+        row = (await db.execute(_update(table), params)).first()
+        return None if row is None else (row, {})
+    if db.bind.dialect.name == "postgresql":
+        row = (await db.execute(_update(table, old, True), params)).first()
+        return None if row is None else (row, {name: getattr(row, f"old_{name}") for name in old})
+    previous = (await db.execute(_select(table, old), {"row_id": id})).first()
+    if previous is None:
+        return None
+    row = (await db.execute(_update(table), params)).first()
+    return row, previous._asdict()
+
+
+async def delete_returning(db: AsyncSession, entity, id: int) -> Row | None:
+    """Delete the row ``id`` of ``entity`` and return it.
+
+    Rows referencing it through a one-to-many relationship are detached first (their
+    foreign key set to NULL), as the ORM did when deleting a loaded object.
+    """
+    detach, statement = _delete(entity)
+    for child in detach:
+        await db.execute(child, {"row_id": id})
+    return (await db.execute(statement, {"row_id": id})).first()